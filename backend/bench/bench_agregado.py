@@ -0,0 +1,59 @@
+"""
+Modo 'merge' x 'agregado' do comparar() quando a mesma gaveta/produto aparece em
+vários lotes dos dois lados (o merge gera lotes² linhas por chave).
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_agregado.py
+    python backend/bench/bench_agregado.py --chaves 20000 --lotes 1 4 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+
+
+def gerar_par_lotes(chaves: int, lotes: int, seed: int = 0):
+    """`chaves` gavetas/produtos com `lotes` linhas cada; o físico troca a ordem e altera ~10% das quantidades."""
+    rng = np.random.default_rng(seed)
+    n = chaves * lotes
+    k = np.repeat(np.arange(chaves), lotes)
+    oficial = pd.DataFrame({
+        "gaveta": np.char.add("A", (k % 500).astype(str)),
+        "cod": (100000 + k).astype(str),
+        "produto": np.char.add("PRODUTO ", k.astype(str)),
+        "lote": np.char.add("L", np.tile(np.arange(lotes), chaves).astype(str)),
+        "quantidade": rng.integers(0, 500, n).astype(str),
+        "observacao": "",
+    })
+    fisico = oficial.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    div = rng.random(n) < 0.10
+    fisico.loc[div, "quantidade"] = rng.integers(0, 500, div.sum()).astype(str)
+    return oficial, fisico
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chaves", type=int, default=20_000)
+    ap.add_argument("--lotes", type=int, nargs="+", default=[1, 4, 16])
+    args = ap.parse_args()
+
+    print(f"{'lotes':>6} {'linhas':>9} {'modo':>18} {'saída':>10} {'tempo (s)':>10}")
+    for lotes in args.lotes:
+        oficial, fisico = gerar_par_lotes(args.chaves, lotes)
+        for modo, por_lote in (("merge", False), ("agregado", False), ("merge", True), ("agregado", True)):
+            t0 = time.perf_counter()
+            out = compare.comparar(oficial, fisico, modo=modo, por_lote=por_lote)
+            dt = time.perf_counter() - t0
+            nome = modo + (" +lote" if por_lote else "")
+            print(f"{lotes:>6} {len(oficial):>9} {nome:>18} {len(out):>10} {dt:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark das sugestões entre linhas órfãs (aproximado.sugerir_pares): planta erros de
+digitação na descrição de parte do físico, compara e mede tempo e acerto (par sugerido
+com o mesmo código dos dois lados) do índice de trigramas x todos os pares da gaveta
+com difflib (só nos tamanhos até --max-ingenuo, é quadrático).
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_aproximado.py
+    python backend/bench/bench_aproximado.py --tamanhos 50000 200000 --fracao 0.1
+"""
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from aproximado import LIMIAR, _normalizar, _texto, sugerir_pares  # noqa: E402
+from bench_comparar import gerar_par  # noqa: E402
+from compare import comparar  # noqa: E402
+
+
+def _digitar_errado(fisico: pd.DataFrame, fracao: float, seed: int) -> pd.DataFrame:
+    """Troca um caractere da descrição em `fracao` das linhas (vira órfã dos dois lados)."""
+    rng = random.Random(seed)
+    prods = fisico["produto"].astype(object).to_numpy().copy()
+    for i in rng.sample(range(len(prods)), int(len(prods) * fracao)):
+        p = list(str(prods[i]))
+        p[rng.randrange(len(p))] = rng.choice("XYZ0")
+        prods[i] = "".join(p)
+    return fisico.assign(produto=prods)
+
+
+def _ingenuo(df_out: pd.DataFrame) -> pd.DataFrame:
+    """Todos os pares da mesma gaveta com difflib, guloso do mais parecido para o menos."""
+    merge = df_out["_merge"].astype(str)
+    orfas = df_out.assign(_texto=_texto(df_out).map(_normalizar))
+    esq, dir_ = orfas[merge == "left_only"], orfas[merge == "right_only"]
+    cand = []
+    for gaveta, l in esq.groupby("gaveta", observed=True):
+        r = dir_[dir_["gaveta"] == gaveta]
+        for il, tl in zip(l.index, l["_texto"]):
+            for ir, tr in zip(r.index, r["_texto"]):
+                nota = difflib.SequenceMatcher(None, tl, tr).ratio()
+                if nota >= LIMIAR:
+                    cand.append((-nota, il, ir))
+    usados_l, usados_r, pares = set(), set(), []
+    for _, il, ir in sorted(cand):
+        if il not in usados_l and ir not in usados_r:
+            usados_l.add(il)
+            usados_r.add(ir)
+            pares.append((df_out.at[il, "cod"], df_out.at[ir, "cod"]))
+    return pd.DataFrame(pares, columns=["cod_wms", "cod_fisico"])
+
+
+def _acerto(pares: pd.DataFrame, plantados: int) -> float:
+    certos = (pares["cod_wms"].astype(str) == pares["cod_fisico"].astype(str)).sum()
+    return certos / plantados if plantados else float("nan")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[5_000, 50_000, 200_000])
+    ap.add_argument("--fracao", type=float, default=0.1, help="fração do físico com erro de digitação")
+    ap.add_argument("--max-ingenuo", type=int, default=5_000)
+    args = ap.parse_args()
+
+    print(f"{'linhas':>10} {'órfãs':>8} {'índice (s)':>11} {'acerto':>7} {'todos os pares (s)':>19} {'acerto':>7}")
+    for n in args.tamanhos:
+        oficial, fisico = gerar_par(n, seed=n)
+        fisico = _digitar_errado(fisico, args.fracao, seed=n)
+        plantados = int(len(fisico) * args.fracao)
+        df_out = comparar(oficial, fisico)
+        orfas = int(np.isin(df_out["_merge"].astype(str), ["left_only", "right_only"]).sum())
+
+        t0 = time.perf_counter()
+        pares = sugerir_pares(df_out)
+        t_indice = time.perf_counter() - t0
+        linha = f"{n:>10} {orfas:>8} {t_indice:>11.3f} {_acerto(pares, plantados):>7.1%}"
+        if n <= args.max_ingenuo:
+            t0 = time.perf_counter()
+            pares_ing = _ingenuo(df_out)
+            t_ing = time.perf_counter() - t0
+            linha += f" {t_ing:>19.3f} {_acerto(pares_ing, plantados):>7.1%}"
+        print(linha)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Teste de carga do /compare com uploads concorrentes, comparando os modos do executor.
+
+Sobe um uvicorn por modo (EXECUTOR_TIPO=inline|thread|process, cache desligado),
+dispara N uploads simultâneos e, em paralelo, uma requisição leve de sonda
+(GET /executor/stats) a cada 50 ms. A latência da sonda mostra quanto o event loop
+fica travado: no modo inline (comportamento antigo) ela sobe junto com o /compare.
+
+Uso (a partir da raiz do repositório; requer httpx):
+    python backend/bench/bench_carga.py
+    python backend/bench/bench_carga.py --linhas 5000 --concorrencia 16 --modos inline process
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from bench_comparar import gerar_par  # noqa: E402
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _xlsx(df) -> bytes:
+    buf = BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _percentis(xs):
+    if not xs:
+        return "-", "-"
+    return f"{np.percentile(xs, 50) * 1000:.0f}", f"{np.percentile(xs, 99) * 1000:.0f}"
+
+
+async def _rodada(url: str, pares, concorrencia: int):
+    lat, status, sonda = [], [], []
+    fim = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=url, timeout=600) as c:
+        async def um(i):
+            of, fis = pares[i % len(pares)]
+            t0 = time.perf_counter()
+            r = await c.post("/compare", files={
+                "planilha_oficial": ("of.xlsx", of), "planilha_divergente": ("fis.xlsx", fis)})
+            lat.append(time.perf_counter() - t0)
+            status.append(r.status_code)
+
+        async def sondar():
+            while not fim.is_set():
+                t0 = time.perf_counter()
+                await c.get("/executor/stats")
+                sonda.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.05)
+
+        tarefa_sonda = asyncio.create_task(sondar())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(um(i) for i in range(concorrencia)))
+        total = time.perf_counter() - t0
+        fim.set()
+        await tarefa_sonda
+    return lat, status, sonda, total
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, default=2000)
+    ap.add_argument("--concorrencia", type=int, default=8)
+    ap.add_argument("--modos", nargs="+", default=["inline", "thread", "process"])
+    args = ap.parse_args()
+
+    # um par de arquivos distinto por requisição (nada de cache entre elas)
+    pares = []
+    for i in range(args.concorrencia):
+        of, fis = gerar_par(args.linhas, seed=i)
+        pares.append((_xlsx(of), _xlsx(fis)))
+
+    print(f"{args.concorrencia} uploads simultâneos de {args.linhas} linhas")
+    print(f"{'modo':>8} {'total (s)':>10} {'p50 ms':>8} {'p99 ms':>8} {'sonda p50':>10} {'sonda p99':>10} {'status':>14}")
+    for modo in args.modos:
+        porta = _porta_livre()
+        env = dict(os.environ, EXECUTOR_TIPO=modo, CACHE_PLANILHAS_MB="0", EXECUTOR_FILA=str(3 * args.concorrencia))  # 3 jobs por /compare
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(porta), "--log-level", "warning"],
+            cwd=SRC, env=env,
+        )
+        url = f"http://127.0.0.1:{porta}"
+        try:
+            for _ in range(200):
+                try:
+                    httpx.get(url + "/executor/stats", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+            lat, status, sonda, total = asyncio.run(_rodada(url, pares, args.concorrencia))
+        finally:
+            proc.terminate()
+            proc.wait()
+        p50, p99 = _percentis(lat)
+        s50, s99 = _percentis(sonda)
+        codigos = ",".join(f"{c}x{status.count(c)}" for c in sorted(set(status)))
+        print(f"{modo:>8} {total:>10.2f} {p50:>8} {p99:>8} {s50:>10} {s99:>10} {codigos:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark do carregador: cada engine de compare.carregar_planilha em relatórios
+oficiais (3 linhas de preâmbulo) de vários tamanhos, contra o pd.read_excel antigo.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_carregar.py
+    python backend/bench/bench_carregar.py --tamanhos 1000 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from gerador import escrever_oficial, gerar_inventario  # noqa: E402
+
+
+def gerar_relatorio_oficial(path: str, n: int, seed: int = 0) -> None:
+    """Grava um relatório oficial sintético com ~n linhas de dados (ver gerador.py)."""
+    escrever_oficial(gerar_inventario(n, seed=seed)[0], path)
+
+
+def _cronometra(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = ap.parse_args()
+
+    engines = ["xlsx_xml", "openpyxl", "pandas"]
+    print(f"{'linhas':>10} {'read_excel':>11} " + " ".join(f"{e:>10}" for e in engines) + f" {'csv':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.tamanhos:
+            xlsx = os.path.join(tmp, f"oficial_{n}.xlsx")
+            gerar_relatorio_oficial(xlsx, n)
+
+            # o que carregar_planilha fazia antes: lê a aba inteira via TextParser do pandas
+            t_ref, _ = _cronometra(pd.read_excel, xlsx, dtype=str)
+
+            tempos, base = [], None
+            for eng in engines:
+                t, df = _cronometra(compare.carregar_planilha, xlsx, engine=eng)
+                if base is None:
+                    base = df
+                pd.testing.assert_frame_equal(base, df, check_exact=True)
+                tempos.append(t)
+
+            csv_path = os.path.join(tmp, f"limpa_{n}.csv")
+            base.to_csv(csv_path, sep=";", index=False)
+            t_csv, _ = _cronometra(compare.carregar_planilha, csv_path)
+
+            print(f"{n:>10} {t_ref:>11.3f} " + " ".join(f"{t:>10.3f}" for t in tempos) + f" {t_csv:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
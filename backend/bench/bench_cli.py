@@ -0,0 +1,82 @@
+"""
+Benchmark do cold start: tempo de import (python -X importtime) de main e server
+contra um orçamento, `main.py --help` e N pares pelo CLI em N processos x um
+processo só com --manifesto. Sai com código 1 se algum import passar do orçamento.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_cli.py
+    python backend/bench/bench_cli.py --pares 10 --linhas 5000 --orcamento-main 50 --orcamento-server 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, SRC)
+
+from gerador import escrever_fisico, escrever_oficial, gerar_inventario  # noqa: E402
+
+
+def _import_ms(modulo: str, repeticoes: int) -> float:
+    """Mediana do tempo cumulativo do import de `modulo` num processo novo (-X importtime)."""
+    tempos = []
+    for _ in range(repeticoes):
+        r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                           cwd=SRC, capture_output=True, text=True, check=True)
+        linha = next(l for l in reversed(r.stderr.splitlines()) if l.rstrip().endswith(f"| {modulo}"))
+        tempos.append(int(linha.split("|")[1]) / 1000)
+    return statistics.median(tempos)
+
+
+def _processo(args) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=SRC, capture_output=True, check=True)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pares", type=int, default=5)
+    ap.add_argument("--linhas", type=int, default=2_000)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    ap.add_argument("--orcamento-main", type=float, default=50, help="ms para import main")
+    ap.add_argument("--orcamento-server", type=float, default=1500, help="ms para import server")
+    args = ap.parse_args()
+
+    estourou = False
+    print(f"{'import':>8} {'ms':>8} {'orçamento':>10}")
+    for modulo, orcamento in (("main", args.orcamento_main), ("server", args.orcamento_server)):
+        ms = _import_ms(modulo, args.repeticoes)
+        estourou |= ms > orcamento
+        print(f"{modulo:>8} {ms:>8.1f} {orcamento:>10.0f}{'  ESTOUROU' if ms > orcamento else ''}")
+    print(f"main.py --help: {_processo(['main.py', '--help']):.2f}s")
+
+    with tempfile.TemporaryDirectory() as d:
+        oficial = os.path.join(d, "wms.xlsx")
+        linhas_manifesto = ["oficial,divergente,saida"]
+        for i in range(args.pares):
+            wms, fisico = gerar_inventario(args.linhas, seed=0 if i == 0 else i)
+            if i == 0:
+                escrever_oficial(wms, oficial)
+            escrever_fisico(fisico, os.path.join(d, f"fisico{i}.xlsx"))
+            linhas_manifesto.append(f"wms.xlsx,fisico{i}.xlsx,lote/relatorio{i}.xlsx")
+        with open(os.path.join(d, "pares.csv"), "w") as f:
+            f.write("\n".join(linhas_manifesto) + "\n")
+
+        separados = sum(
+            _processo(["main.py", "--oficial", oficial, "--divergente", os.path.join(d, f"fisico{i}.xlsx"),
+                       "--saida", os.path.join(d, f"relatorio{i}.xlsx")])
+            for i in range(args.pares)
+        )
+        lote = _processo(["main.py", "--manifesto", os.path.join(d, "pares.csv")])
+    print(f"{args.pares} pares de {args.linhas} linhas: {args.pares} processos {separados:.2f}s"
+          f" x --manifesto {lote:.2f}s")
+    sys.exit(1 if estourou else 0)
+
+
+if __name__ == "__main__":
+    main()
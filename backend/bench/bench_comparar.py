@@ -0,0 +1,153 @@
+"""
+Benchmark do comparador: caminho vetorizado (compare.comparar) x caminho antigo
+linha a linha com df.apply(axis=1).
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_comparar.py
+    python backend/bench/bench_comparar.py --tamanhos 10000 100000 --sem-legado
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from compare import _parse_gaveta  # noqa: E402
+
+
+def gerar_par(n: int, seed: int = 0):
+    """Gera (oficial, fisico) com ~n linhas, ~10% de divergências e ~2% de órfãos de cada lado."""
+    rng = np.random.default_rng(seed)
+    letras = np.array(list("ABCDEFGH"))
+    gaveta = [f"{l}{k}{s}" for l, k, s in zip(
+        letras[rng.integers(0, len(letras), n)],
+        rng.integers(1, 99, n),
+        np.array(["", "a", "b"])[rng.integers(0, 3, n)],
+    )]
+    cod = rng.integers(100000, 999999, n).astype(str)
+    qtd = rng.integers(0, 5000, n)
+    oficial = pd.DataFrame({
+        "gaveta": gaveta,
+        "cod": cod,
+        "produto": np.char.add("PRODUTO ", cod),
+        "lote": np.char.add("L", rng.integers(1, 50, n).astype(str)),
+        "quantidade": np.char.add(qtd.astype(str), "kg"),
+        "observacao": "",
+    })
+    fisico = oficial.copy()
+    div = rng.random(n) < 0.10
+    fisico.loc[div, "quantidade"] = (qtd[div] + rng.integers(1, 20, div.sum())).astype(str)
+    lote_div = rng.random(n) < 0.02
+    fisico.loc[lote_div, "lote"] = "L0"
+    so_wms = rng.random(n) < 0.02
+    so_fis = rng.random(n) < 0.02
+    return oficial[~so_fis].reset_index(drop=True), fisico[~so_wms].reset_index(drop=True)
+
+
+def comparar_legado(oficial: pd.DataFrame, divergente: pd.DataFrame) -> pd.DataFrame:
+    """Cópia do comparador antes da vetorização (referência de tempo e de saída)."""
+    for df in (oficial, divergente):
+        for c in ["gaveta", "cod", "produto", "lote", "quantidade", "observacao"]:
+            if c not in df.columns:
+                df[c] = ""
+        for c in df.columns:
+            df[c] = df[c].astype(str).str.strip()
+
+    keys = ["gaveta", "cod", "produto"]
+    left = oficial.rename(columns={"quantidade": "quantidade_wms", "lote": "lote_wms", "observacao": "observacao_wms"})
+    right = divergente.rename(columns={"quantidade": "quantidade_fisico", "lote": "lote_fisico", "observacao": "observacao_fisico"})
+    df_out = left.merge(right, on=keys, how="outer", suffixes=("", ""), indicator=True)
+
+    def to_num(x):
+        x = str(x).strip().lower().replace(",", ".")
+        m = re.search(r'[-+]?\d*\.?\d+', x)
+        if not m:
+            return None
+        try:
+            return float(m.group())
+        except:
+            return None
+
+    df_out["diferenca"] = df_out.apply(
+        lambda r: (
+            (lambda nf, nw: (int(nf - nw) if float(nf - nw).is_integer() else float(nf - nw)))
+            (to_num(r["quantidade_fisico"]), to_num(r["quantidade_wms"]))
+            if (to_num(r["quantidade_fisico"]) is not None and to_num(r["quantidade_wms"]) is not None)
+            else ""
+        ),
+        axis=1
+    )
+
+    def status_row(r):
+        issues = []
+        if r["_merge"] == "both":
+            if to_num(r["quantidade_wms"]) != to_num(r["quantidade_fisico"]):
+                issues.append("quantidade")
+            if str(r.get("lote_wms", "")).strip().lower() != str(r.get("lote_fisico", "")).strip().lower():
+                issues.append("lote")
+            if str(r.get("observacao_wms", "")).strip().lower() != str(r.get("observacao_fisico", "")).strip().lower():
+                issues.append("observacao")
+        elif r["_merge"] == "left_only":
+            issues.append("ausente_no_fisico")
+        elif r["_merge"] == "right_only":
+            issues.append("ausente_no_wms")
+        return "OK" if not issues else ";".join(issues)
+
+    df_out["Status"] = df_out.apply(status_row, axis=1)
+
+    ordered = keys + [
+        "quantidade_wms", "quantidade_fisico", "diferenca",
+        "lote_wms", "lote_fisico",
+        "observacao_wms", "observacao_fisico",
+        "Status", "_merge"
+    ]
+    df_out = df_out[ordered]
+    return df_out.sort_values(
+        by=keys,
+        key=lambda col: col.map(_parse_gaveta) if col.name == "gaveta" else col
+    ).reset_index(drop=True)
+
+
+def _canonico(df: pd.DataFrame) -> pd.DataFrame:
+    """Texto como objeto e quantidades como Float64, para comparar saídas de esquemas diferentes."""
+    df = df.copy()
+    for c in df.columns:
+        if c.startswith("quantidade"):
+            df[c] = pd.array(compare._norm_qtd_vec(df[c]), dtype="Float64")
+        elif c not in ("diferenca", "_merge"):
+            df[c] = df[c].astype(object).where(df[c].notna(), None)
+    return df
+
+
+def _cronometra(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--sem-legado", action="store_true", help="não roda o caminho antigo (lento em 1M linhas)")
+    args = ap.parse_args()
+
+    print(f"{'linhas':>10} {'vetorizado (s)':>15} {'legado (s)':>12} {'speedup':>8}")
+    for n in args.tamanhos:
+        oficial, fisico = gerar_par(n)
+        t_vec, out_vec = _cronometra(compare.comparar, oficial.copy(), fisico.copy())
+        if args.sem_legado:
+            print(f"{n:>10} {t_vec:>15.3f} {'-':>12} {'-':>8}")
+            continue
+        t_leg, out_leg = _cronometra(comparar_legado, oficial.copy(), fisico.copy())
+        pd.testing.assert_frame_equal(_canonico(out_vec), _canonico(out_leg), check_exact=True)
+        print(f"{n:>10} {t_vec:>15.3f} {t_leg:>12.3f} {t_leg / t_vec:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark do modo fora da memória: carregar_planilha + comparar + escrever_xlsx
+(tudo em memória) x externo.comparar_externo + escrever_xlsx_blocos (sort-merge
+externo, relatório gravado em streaming). Cada variante roda num processo
+separado, para o pico de RSS (VmHWM do /proc; o ru_maxrss do Linux sobrevive ao
+exec e traria o do processo pai) ser só dela.
+
+As entradas são CSV (relatório do WMS com preâmbulo + planilha do auditor) para o
+tempo de gerar as planilhas não dominar o benchmark.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_externo.py
+    python backend/bench/bench_externo.py --tamanhos 100000 400000 --linhas-run 50000
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from gerador import CABECALHO_OFICIAL, PREAMBULO, gerar_inventario  # noqa: E402
+
+
+def _gravar_csv(oficial, fisico, pasta):
+    with open(os.path.join(pasta, "oficial.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerows(PREAMBULO + [CABECALHO_OFICIAL])
+        w.writerows(oficial[CABECALHO_OFICIAL].itertuples(index=False, name=None))
+    fisico.to_csv(os.path.join(pasta, "fisico.csv"), sep=";", index=False)
+
+
+def _pico_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith("VmHWM:"):
+                return int(linha.split()[1]) / 1024
+    return float("nan")
+
+
+def _rodar(variante: str, pasta: str, linhas_run: int) -> dict:
+    """Executado no processo filho: roda a variante e devolve tempo e pico de RSS."""
+    oficial, fisico = os.path.join(pasta, "oficial.csv"), os.path.join(pasta, "fisico.csv")
+    destino = os.path.join(pasta, f"{variante}.xlsx")
+    t0 = time.perf_counter()
+    if variante == "memoria":
+        from compare import carregar_planilha, comparar
+        from relatorio import escrever_xlsx
+        escrever_xlsx(comparar(carregar_planilha(oficial), carregar_planilha(fisico)), destino)
+    else:
+        from externo import comparar_externo
+        from relatorio import escrever_xlsx_blocos
+        escrever_xlsx_blocos(comparar_externo(oficial, fisico, linhas_run=linhas_run, pasta=pasta), destino)
+    return {
+        "segundos": time.perf_counter() - t0,
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[50_000, 200_000])
+    ap.add_argument("--linhas-run", type=int, default=50_000)
+    ap.add_argument("--filho", nargs=2, metavar=("VARIANTE", "PASTA"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.filho:
+        print(json.dumps(_rodar(args.filho[0], args.filho[1], args.linhas_run)))
+        return
+
+    print(f"{'linhas':>10} {'memória (s)':>12} {'MB':>7} {'externo (s)':>12} {'MB':>7}")
+    for n in args.tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            _gravar_csv(*gerar_inventario(n, divergencias=0.1, lotes=2, seed=n), pasta)
+            res = {}
+            for variante in ("memoria", "externo"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--filho", variante, pasta, "--linhas-run", str(args.linhas_run)],
+                    check=True, capture_output=True, text=True,
+                )
+                res[variante] = json.loads(out.stdout.strip().splitlines()[-1])
+        m, e = res["memoria"], res["externo"]
+        print(f"{n:>10} {m['segundos']:>12.2f} {m['pico_rss_mb']:>7.0f} {e['segundos']:>12.2f} {e['pico_rss_mb']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark dos formatos de saída do /compare (relatorio.escrever_blocos): tempo de
+geração e bytes transferidos de XLSX, CSV, NDJSON e Parquet, com e sem compressão,
+sobre a mesma saída do comparar (e só as divergências, como ?divergencias=true).
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_formatos.py
+    python backend/bench/bench_formatos.py --tamanhos 50000 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from bench_comparar import gerar_par  # noqa: E402
+from compare import comparar  # noqa: E402
+from relatorio import COMPRESSOES, escrever_blocos  # noqa: E402
+
+
+def _variantes():
+    yield "xlsx", None
+    for formato in ("csv", "ndjson"):
+        yield formato, None
+        for compressao in COMPRESSOES:
+            yield formato, compressao
+    yield "parquet", None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[200_000])
+    args = ap.parse_args()
+
+    print(f"{'linhas':>10} {'filtro':>12} {'formato':>14} {'tempo (s)':>10} {'bytes':>12}")
+    for n in args.tamanhos:
+        df_out = comparar(*gerar_par(n, seed=n))
+        for filtro, df in (("todas", df_out), ("divergencias", df_out[df_out["Status"] != "OK"])):
+            for formato, compressao in _variantes():
+                t0 = time.perf_counter()
+                buf = escrever_blocos([df], formato, compressao=compressao)
+                dt = time.perf_counter() - t0
+                nome = formato + (f"+{compressao}" if compressao else "")
+                print(f"{n:>10} {filtro:>12} {nome:>14} {dt:>10.2f} {buf.getbuffer().nbytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Um WMS contra várias equipes de contagem: N chamadas independentes (relê o
+relatório WMS e refaz o lado esquerdo a cada par, como N x /compare) x
+compare.comparar_many (WMS lido e preparado uma vez, equipes em paralelo).
+
+As planilhas físicas já entram carregadas nos dois casos (a leitura delas é a
+mesma); o que muda é a leitura/preparo do WMS e o paralelismo.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_lote.py
+    python backend/bench/bench_lote.py --linhas 200000 --equipes 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from gerador import escrever_oficial, gerar_inventario  # noqa: E402
+
+
+def _contagens(wms, equipes: int, seed: int = 0):
+    """Uma contagem física por equipe: cópia do WMS com ~10% das quantidades alteradas."""
+    rng = np.random.default_rng(seed)
+    base = wms.astype(str)
+    out = {}
+    for k in range(equipes):
+        f = base.copy()
+        div = rng.random(len(f)) < 0.10
+        f.loc[div, "quantidade"] = rng.integers(0, 5000, div.sum()).astype(str)
+        out[f"equipe_{k + 1}"] = f
+    return out
+
+
+def _cronometra(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, default=50_000)
+    ap.add_argument("--equipes", type=int, nargs="+", default=[2, 4, 8])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "wms.xlsx")
+        escrever_oficial(gerar_inventario(args.linhas)[0], path)
+        t_ler, wms = _cronometra(compare.carregar_planilha, path)
+        print(f"WMS com {args.linhas} linhas; leitura {t_ler:.2f} s; {os.cpu_count()} núcleo(s)")
+        print(f"{'equipes':>8} {'N x comparar (s)':>17} {'many 1 thread':>14} {'many paralelo':>14}")
+
+        for n in args.equipes:
+            fisicos = _contagens(wms, n)
+
+            def separado():
+                return {nome: compare.comparar(compare.carregar_planilha(path), f) for nome, f in fisicos.items()}
+
+            def many(workers):
+                return compare.comparar_many(compare.carregar_planilha(path), fisicos, workers=workers)
+
+            t_sep, ref = _cronometra(separado)
+            t_um, _ = _cronometra(many, 1)
+            t_par, out = _cronometra(many, None)
+            assert all(out[k].equals(ref[k]) for k in ref)
+            print(f"{n:>8} {t_sep:>17.2f} {t_um:>14.2f} {t_par:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Memória do DataFrame normalizado por esquema de tipos, em vários tamanhos.
+
+Esquemas:
+  - objeto:   todas as colunas como str do Python (dtype=object), como era antes
+  - str:      dtype str padrão do pandas, quantidade ainda como texto
+  - category / pyarrow / str+Float64: os modos de compare.TIPO_TEXTO
+    (PLANILHA_TIPO_TEXTO), com quantidade já parseada em Float64
+
+Mede o tamanho do frame (memory_usage(deep=True)) e o tempo do comparar()
+sobre o par (oficial, físico) já no esquema.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_memoria.py
+    python backend/bench/bench_memoria.py --tamanhos 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from bench_comparar import gerar_par  # noqa: E402
+
+
+def _no_esquema(df, esquema):
+    if esquema == "objeto":
+        return df.astype(object)
+    if esquema == "str":
+        return df.astype(str)
+    compare.TIPO_TEXTO = {"str+Float64": "str"}.get(esquema, esquema)
+    return compare._preparar(df)
+
+
+def _mb(df) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--esquemas", nargs="+", default=["objeto", "str", "category", "pyarrow", "str+Float64"])
+    args = ap.parse_args()
+
+    if compare._STRING_PYARROW is None and "pyarrow" in args.esquemas:
+        print("pyarrow não instalado: esquema 'pyarrow' ignorado")
+        args.esquemas.remove("pyarrow")
+
+    original = compare.TIPO_TEXTO
+    print(f"{'linhas':>10} {'esquema':>12} {'MB':>9} {'B/linha':>8} {'comparar (s)':>13}")
+    for n in args.tamanhos:
+        oficial, fisico = gerar_par(n)
+        for esquema in args.esquemas:
+            a = _no_esquema(oficial, esquema)
+            b = _no_esquema(fisico, esquema)
+            mb = _mb(a)
+            t0 = time.perf_counter()
+            compare.comparar(a, b)
+            dt = time.perf_counter() - t0
+            print(f"{n:>10} {esquema:>12} {mb:>9.1f} {mb * 2**20 / len(a):>8.0f} {dt:>13.3f}")
+        compare.TIPO_TEXTO = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark da comparação particionada: comparar() sem partições x particionado por
+rua com 1..N workers (processos do pool do compare). A 1ª rodada de cada
+configuração sobe o pool e não entra na média.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_particoes.py
+    python backend/bench/bench_particoes.py --tamanhos 200000 --workers 1 2 4 --repeticoes 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from bench_comparar import gerar_par  # noqa: E402
+from compare import _preparar, comparar  # noqa: E402
+
+
+def _medir(fn, repeticoes: int) -> float:
+    fn()  # aquecimento (pool, caches de categorias)
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return statistics.median(tempos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[50_000, 200_000])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    workers = sorted(set(args.workers))
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'linhas':>10} {'sem partição (s)':>17}" + "".join(f" {f'rua w={w} (s)':>13}" for w in workers))
+    for n in args.tamanhos:
+        oficial, fisico = (_preparar(df) for df in gerar_par(n, seed=n))
+        base = _medir(lambda: comparar(oficial, fisico), args.repeticoes)
+        linha = f"{n:>10} {base:>17.3f}"
+        for w in workers:
+            t = _medir(lambda: comparar(oficial, fisico, particoes=["rua"], workers=w), args.repeticoes)
+            linha += f" {t:>13.3f}"
+        print(linha)
+
+
+if __name__ == "__main__":
+    main()
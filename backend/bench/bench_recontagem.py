@@ -0,0 +1,56 @@
+"""
+Recontagem parcial numa sessão (sessoes.SessaoRecontagem.recontar) x comparar()
+de novo com o físico inteiro, variando quantas gavetas foram recontadas.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_recontagem.py
+    python backend/bench/bench_recontagem.py --linhas 1000000 --gavetas 1 10 100 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from bench_comparar import gerar_par  # noqa: E402
+from sessoes import SessaoRecontagem, _substituir_gavetas  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, default=1_000_000)
+    ap.add_argument("--gavetas", type=int, nargs="+", default=[1, 10, 100, 1000])
+    args = ap.parse_args()
+
+    oficial, fisico = gerar_par(args.linhas)
+    oficial, fisico = compare._preparar(oficial), compare._preparar(fisico)
+    t0 = time.perf_counter()
+    sessao = SessaoRecontagem.comparando(oficial, fisico)
+    t_inicial = time.perf_counter() - t0
+    print(f"{args.linhas} linhas, {fisico['gaveta'].nunique()} gavetas; comparação inicial {t_inicial:.2f} s")
+
+    rng = np.random.default_rng(0)
+    gavetas = fisico["gaveta"].astype(str).unique()
+    print(f"{'gavetas':>8} {'linhas':>8} {'recontar (s)':>13} {'comparar tudo (s)':>18}")
+    for n in args.gavetas:
+        escolhidas = rng.choice(gavetas, min(n, len(gavetas)), replace=False)
+        parcial = fisico[fisico["gaveta"].isin(escolhidas)].copy()
+        parcial["quantidade"] = parcial["quantidade"] + 1
+
+        t0 = time.perf_counter()
+        sessao.recontar(parcial)
+        t_rec = time.perf_counter() - t0
+
+        fisico = _substituir_gavetas(fisico, parcial)
+        t0 = time.perf_counter()
+        compare.comparar(oficial, fisico)
+        t_full = time.perf_counter() - t0
+        print(f"{n:>8} {len(parcial):>8} {t_rec:>13.3f} {t_full:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark da escrita do relatório: relatorio.escrever_xlsx (uma passada) x o
+caminho antigo do server.py (to_excel + load_workbook + estilo por célula + save).
+Mede tempo e pico de memória Python (tracemalloc).
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_relatorio.py
+    python backend/bench/bench_relatorio.py --tamanhos 10000 --sem-legado
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import Alignment
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from relatorio import escrever_xlsx  # noqa: E402
+from bench_comparar import gerar_par  # noqa: E402
+
+
+def escrever_legado(df: pd.DataFrame, sheet_name: str = "Relatorio") -> BytesIO:
+    """_df_to_xlsx_bytes + _auto_fit_and_center como eram no server.py."""
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    buf.seek(0)
+    wb = load_workbook(buf)
+    ws = wb[sheet_name]
+    center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    for row in ws.iter_rows():
+        for cell in row:
+            cell.alignment = center
+    for col in ws.columns:
+        max_len = 0
+        letter = col[0].column_letter
+        for cell in col:
+            val = "" if cell.value is None else str(cell.value)
+            max_len = max(max_len, len(val))
+        ws.column_dimensions[letter].width = min(max(12, int(max_len * 1.2)), 60)
+    out = BytesIO()
+    wb.save(out)
+    out.seek(0)
+    return out
+
+
+def _mede(fn, *args):
+    """(segundos, pico MiB, bytes); o tempo é medido sem tracemalloc, que distorce."""
+    t0 = time.perf_counter()
+    out = fn(*args)
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dt, pico / 2**20, len(out.getvalue())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--sem-legado", action="store_true")
+    args = ap.parse_args()
+
+    print(f"{'linhas':>10} {'novo (s)':>9} {'novo MiB':>9} {'legado (s)':>11} {'legado MiB':>11}")
+    for n in args.tamanhos:
+        df = compare.comparar(*gerar_par(n))
+        t, mem, _ = _mede(escrever_xlsx, df)
+        if args.sem_legado:
+            print(f"{n:>10} {t:>9.2f} {mem:>9.1f} {'-':>11} {'-':>11}")
+            continue
+        t_leg, mem_leg, _ = _mede(escrever_legado, df)
+        print(f"{n:>10} {t:>9.2f} {mem:>9.1f} {t_leg:>11.2f} {mem_leg:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
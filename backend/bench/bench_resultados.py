@@ -0,0 +1,59 @@
+"""
+Consultas paginadas sobre um resultado guardado (resultados.ResultadoStore) x
+rodar comparar() de novo e filtrar, que era a única opção antes.
+
+Uso (a partir da raiz do repositório; requer pyarrow):
+    python backend/bench/bench_resultados.py
+    python backend/bench/bench_resultados.py --linhas 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from bench_comparar import gerar_par  # noqa: E402
+from resultados import ResultadoStore  # noqa: E402
+
+CONSULTAS = {
+    "página 1, sem filtro": {},
+    "divergências": {"divergencias": True},
+    "divergências da rua G": {"divergencias": True, "rua": "G"},
+    "ausente_no_fisico, pág. 3": {"status": ["ausente_no_fisico"], "pagina": 3},
+    "busca '1234' na rua B": {"busca": "1234", "rua": "B"},
+}
+
+
+def _ms(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return (time.perf_counter() - t0) * 1000, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, default=200_000)
+    args = ap.parse_args()
+
+    oficial, fisico = gerar_par(args.linhas)
+    t_comparar, df_out = _ms(compare.comparar, oficial, fisico)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultadoStore(tmp, ttl=3600)
+        t_salvar, rid = _ms(store.salvar, df_out)
+        t_resumo, _ = _ms(store.resumo, rid)  # 1ª leitura: Parquet + índices de Status e rua
+
+        print(f"{args.linhas} linhas: comparar {t_comparar:.0f} ms, salvar {t_salvar:.0f} ms, "
+              f"1º resumo (carga + índices) {t_resumo:.0f} ms")
+        print(f"{'consulta':>28} {'1ª (ms)':>9} {'2ª (ms)':>9} {'total':>9}")
+        for nome, filtros in CONSULTAS.items():
+            t1, pag = _ms(store.consultar, rid, **filtros)
+            t2, _ = _ms(store.consultar, rid, **filtros)
+            print(f"{nome:>28} {t1:>9.1f} {t2:>9.1f} {pag['total']:>9}")
+
+
+if __name__ == "__main__":
+    main()
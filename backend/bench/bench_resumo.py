@@ -0,0 +1,50 @@
+"""
+Benchmark do resumo em JSON (compare.resumir) x o relatório XLSX (relatorio.escrever_xlsx)
+sobre a mesma saída do comparar: é a diferença entre /compare/summary e /compare depois
+da comparação.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/bench_resumo.py
+    python backend/bench/bench_resumo.py --tamanhos 50000 200000 --repeticoes 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from bench_comparar import gerar_par  # noqa: E402
+from compare import comparar, resumir  # noqa: E402
+from relatorio import escrever_xlsx  # noqa: E402
+
+
+def _medir(fn, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return statistics.median(tempos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[20_000, 200_000])
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'linhas':>10} {'resumir (ms)':>13} {'JSON (bytes)':>13} {'xlsx (ms)':>10} {'xlsx (bytes)':>13}")
+    for n in args.tamanhos:
+        df_out = comparar(*gerar_par(n, seed=n))
+        t_resumo = _medir(lambda: resumir(df_out), args.repeticoes)
+        t_xlsx = _medir(lambda: escrever_xlsx(df_out, sheet_name="Relatorio"), 1)
+        tam_json = len(json.dumps(resumir(df_out)))
+        tam_xlsx = escrever_xlsx(df_out, sheet_name="Relatorio").getbuffer().nbytes
+        print(f"{n:>10} {t_resumo * 1000:>13.1f} {tam_json:>13} {t_xlsx * 1000:>10.0f} {tam_xlsx:>13}")
+
+
+if __name__ == "__main__":
+    main()
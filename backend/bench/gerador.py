@@ -0,0 +1,168 @@
+"""
+Gerador de planilhas sintéticas de armazém para os benchmarks, nos dois formatos
+que o carregar_planilha entende:
+  - relatório oficial do WMS: 3 linhas de preâmbulo, cabeçalho ALMOXARIFADO, LOCAL,
+    GAVETA (YX-Desc.) (códigos como '2ZG-G61b'), MATERIAL, DESCRIÇÃO, LOTE, QTD.GAVETA
+  - planilha limpa do auditor: gaveta, cod, produto, lote, quantidade, observacao
+
+O físico sai do mesmo inventário, com taxa configurável de divergências, chaves
+repetidas (mesma gaveta/produto em mais de uma linha), mistura de lotes e órfãos.
+
+Uso (a partir da raiz do repositório):
+    python backend/bench/gerador.py --linhas 100000 --saida /tmp/planilhas
+    python backend/bench/gerador.py --linhas 20000 --divergencias 0.2 --lotes 4 --duplicadas 0.05
+"""
+import argparse
+import os
+import sys
+from io import BytesIO
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from relatorio import escrever_xlsx  # noqa: E402
+
+try:
+    import xlsxwriter  # type: ignore
+except Exception:
+    xlsxwriter = None  # fallback: openpyxl write_only
+
+CABECALHO_OFICIAL = ["ALMOXARIFADO", "LOCAL", "GAVETA (YX-Desc.)", "MATERIAL", "DESCRIÇÃO", "LOTE", "QTD.GAVETA"]
+PREAMBULO = [["RELATÓRIO DE OCUPAÇÃO DE ESTOQUE"], ["Emitido por", "WMS"], []]
+
+_ITENS = ["PARAFUSO", "PORCA", "ARRUELA", "LUVA", "FITA", "CABO", "CONECTOR", "FILTRO", "ROLAMENTO", "TUBO"]
+_DETALHES = ["SEXTAVADO", "INOX", "GALVANIZADO", "NITRILICA", "ISOLANTE", "FLEXIVEL", "RETO", "CURVO"]
+_MEDIDAS = ["M6", "M8", "M10", "1/2\"", "3/4\"", "10MM", "25MM", "2,5MM2", "G", "XG"]
+_OBSERVACOES = ["AVARIA", "SEM ETIQUETA", "EMBALAGEM ABERTA", "CONFERIR LOTE"]
+
+
+def gerar_inventario(
+    linhas: int,
+    divergencias: float = 0.10,
+    duplicadas: float = 0.0,
+    lotes: int = 1,
+    orfaos: float = 0.02,
+    ruas: str = "ABCDEFGH",
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (oficial, fisico): `oficial` com as colunas do relatório do WMS e ~`linhas` linhas;
+    `fisico` com as colunas da planilha limpa.
+      - divergencias: fração das linhas com quantidade (80%) ou lote (20%) diferente no físico
+      - duplicadas:   fração de linhas extras repetindo gaveta/cod/produto de outra linha
+      - lotes:        cada material tem até `lotes` lotes; cada linha usa um deles
+      - orfaos:       fração das linhas que some de cada lado (ausente_no_wms/ausente_no_fisico)
+    """
+    rng = np.random.default_rng(seed)
+    letras = np.array(list(ruas))
+
+    # materiais: um produto por código, cada um aparece em várias gavetas
+    n_mat = max(1, linhas // 3)
+    cods = rng.choice(np.arange(100000, 1000000), n_mat, replace=False)
+    descricoes = np.array([
+        f"{_ITENS[a]} {_DETALHES[b]} {_MEDIDAS[c]}"
+        for a, b, c in zip(rng.integers(0, len(_ITENS), n_mat), rng.integers(0, len(_DETALHES), n_mat),
+                           rng.integers(0, len(_MEDIDAS), n_mat))
+    ])
+
+    rua = letras[rng.integers(0, len(letras), linhas)]
+    gaveta = np.char.add(
+        np.char.add(np.char.add(np.char.add("2Z", rua), "-"), rua),
+        np.char.add(rng.integers(1, 100, linhas).astype(str), np.array(["", "a", "b"])[rng.integers(0, 3, linhas)]),
+    )
+    mat = rng.integers(0, n_mat, linhas)
+    oficial = pd.DataFrame({
+        "ALMOXARIFADO": "01",
+        "LOCAL": "CD",
+        "GAVETA (YX-Desc.)": gaveta,
+        "MATERIAL": cods[mat],
+        "DESCRIÇÃO": descricoes[mat],
+        "LOTE": np.char.add("L", (rng.integers(0, max(1, lotes), linhas) + 1).astype(str)),
+        "QTD.GAVETA": rng.integers(0, 5000, linhas),
+    })
+    if duplicadas > 0:
+        extras = oficial.sample(frac=duplicadas, random_state=seed, replace=duplicadas > 1)
+        extras = extras.assign(
+            LOTE=np.char.add("L", rng.integers(1, max(1, lotes) + 2, len(extras)).astype(str)),
+            **{"QTD.GAVETA": rng.integers(0, 5000, len(extras))},
+        )
+        oficial = pd.concat([oficial, extras], ignore_index=True)
+    # relatório do WMS sai ordenado por gaveta
+    oficial = oficial.sort_values(["GAVETA (YX-Desc.)", "MATERIAL"], kind="stable", ignore_index=True)
+
+    n = len(oficial)
+    fisico = pd.DataFrame({
+        "gaveta": oficial["GAVETA (YX-Desc.)"].str.rsplit("-", n=1).str[-1],
+        "cod": oficial["MATERIAL"].astype(str),
+        "produto": oficial["DESCRIÇÃO"],
+        "lote": oficial["LOTE"],
+        "quantidade": oficial["QTD.GAVETA"].to_numpy(),
+        "observacao": "",
+    })
+    div = rng.random(n) < divergencias
+    no_lote = div & (rng.random(n) < 0.2)
+    na_qtd = div & ~no_lote
+    fisico.loc[na_qtd, "quantidade"] += rng.integers(1, 50, int(na_qtd.sum()))
+    fisico.loc[no_lote, "lote"] = "L0"
+    obs = rng.random(n) < 0.01
+    fisico.loc[obs, "observacao"] = np.array(_OBSERVACOES)[rng.integers(0, len(_OBSERVACOES), int(obs.sum()))]
+
+    so_wms = rng.random(n) < orfaos
+    so_fisico = rng.random(n) < orfaos
+    return (oficial[~so_fisico].reset_index(drop=True), fisico[~so_wms].reset_index(drop=True))
+
+
+def escrever_oficial(oficial: pd.DataFrame, destino=None):
+    """Grava `oficial` como o XLSX do WMS (preâmbulo + cabeçalho); sem `destino` devolve os bytes."""
+    buf = BytesIO() if destino is None else destino
+    linhas = oficial[CABECALHO_OFICIAL].astype(object).itertuples(index=False, name=None)
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(buf, {"constant_memory": True})
+        ws = wb.add_worksheet("Relatorio")
+        for r, row in enumerate(PREAMBULO + [CABECALHO_OFICIAL]):
+            ws.write_row(r, 0, row)
+        for r, row in enumerate(linhas, start=len(PREAMBULO) + 1):
+            ws.write_row(r, 0, row)
+        wb.close()
+    else:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Relatorio")
+        for row in PREAMBULO + [CABECALHO_OFICIAL]:
+            ws.append(row)
+        for row in linhas:
+            ws.append(row)
+        wb.save(buf)
+    return buf.getvalue() if destino is None else None
+
+
+def escrever_fisico(fisico: pd.DataFrame, destino=None):
+    """Grava `fisico` como a planilha limpa do auditor; sem `destino` devolve os bytes."""
+    buf = escrever_xlsx(fisico, destino, sheet_name="Contagem", largura=None, centralizar=False)
+    return buf.getvalue() if destino is None else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, default=10_000)
+    ap.add_argument("--divergencias", type=float, default=0.10)
+    ap.add_argument("--duplicadas", type=float, default=0.0)
+    ap.add_argument("--lotes", type=int, default=1)
+    ap.add_argument("--orfaos", type=float, default=0.02)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--saida", default=".", help="pasta onde gravar oficial.xlsx e fisico.xlsx")
+    args = ap.parse_args()
+
+    oficial, fisico = gerar_inventario(args.linhas, args.divergencias, args.duplicadas, args.lotes,
+                                       args.orfaos, seed=args.seed)
+    os.makedirs(args.saida, exist_ok=True)
+    escrever_oficial(oficial, os.path.join(args.saida, "oficial.xlsx"))
+    escrever_fisico(fisico, os.path.join(args.saida, "fisico.xlsx"))
+    print(f"{args.saida}: oficial.xlsx ({len(oficial)} linhas), fisico.xlsx ({len(fisico)} linhas)")
+
+
+if __name__ == "__main__":
+    main()
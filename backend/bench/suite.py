@@ -0,0 +1,247 @@
+"""
+Suíte de benchmarks com registro em JSON, para comparar desempenho entre commits.
+
+Para cada tamanho gera um inventário sintético (gerador.py) e cronometra:
+  - carregar:  carregar_planilha do relatório oficial e da planilha do auditor
+  - comparar:  comparar() nos modos merge e agregado
+  - relatorio: escrita do XLSX de saída
+  - http:      cada endpoint de ponta a ponta via TestClient (no processo, sem rede),
+               com o cache de planilhas limpo antes de cada repetição
+
+Cada etapa também registra o pico de RSS acima do que o processo já usava (Linux:
+o pico é zerado via /proc/self/clear_refs antes de cada repetição). No http o
+TestClient roda no mesmo processo, então o corpo multipart montado por ele entra na conta.
+
+Uso (a partir da raiz do repositório; http requer httpx):
+    python backend/bench/suite.py
+    python backend/bench/suite.py --linhas 10000 100000 --repeticoes 5 --grupos carregar comparar
+    python backend/bench/suite.py --comparar backend/bench/resultados/A.json backend/bench/resultados/B.json
+
+Sem --saida grava em backend/bench/resultados/<data>-<commit>.json. O --comparar
+lista a razão entre as medianas e sai com código 1 se alguma etapa piorou além de --tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compare  # noqa: E402
+from gerador import escrever_fisico, escrever_oficial, gerar_inventario  # noqa: E402
+from relatorio import escrever_xlsx  # noqa: E402
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+GRUPOS = ("carregar", "comparar", "relatorio", "http")
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "alterado": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tipo_texto": compare.TIPO_TEXTO,
+        "args": {k: v for k, v in vars(args).items() if k != "comparar"},
+    }
+
+
+def _zerar_pico_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # zera o VmHWM
+        return True
+    except OSError:
+        return False
+
+
+def _rss_mb(campo: str) -> float:
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith(campo + ":"):
+                return int(linha.split()[1]) / 1024
+    raise OSError(campo)
+
+
+class _Registro:
+    def __init__(self, repeticoes: int):
+        self.repeticoes = repeticoes
+        self.itens: List[Dict[str, Any]] = []
+
+    def medir(self, grupo: str, etapa: str, linhas: int, fn: Callable[[], Any],
+              antes: Optional[Callable[[], None]] = None) -> Any:
+        """Roda fn `repeticoes` vezes (antes() fora do tempo) e guarda os tempos; devolve a última saída."""
+        tempos, picos, out = [], [], None
+        for _ in range(self.repeticoes):
+            if antes is not None:
+                antes()
+            out = None  # a saída anterior não conta no pico desta repetição
+            base = _rss_mb("VmRSS") if _zerar_pico_rss() else None
+            t0 = time.perf_counter()
+            out = fn()
+            tempos.append(time.perf_counter() - t0)
+            if base is not None:
+                picos.append(_rss_mb("VmHWM") - base)
+        item = {
+            "grupo": grupo,
+            "etapa": etapa,
+            "linhas": linhas,
+            "mediana_s": float(np.median(tempos)),
+            "min_s": float(min(tempos)),
+            "tempos_s": tempos,
+            "pico_rss_mb": round(max(picos), 1) if picos else None,
+        }
+        self.itens.append(item)
+        pico = "-" if item["pico_rss_mb"] is None else f"{item['pico_rss_mb']:.1f}"
+        print(f"{grupo:>10} {etapa:>40} {linhas:>9} {item['mediana_s'] * 1000:>10.1f} "
+              f"{item['min_s'] * 1000:>10.1f} {pico:>10}")
+        return out
+
+
+def _http(reg: _Registro, n: int, of: bytes, fis: bytes, recontagem: bytes) -> None:
+    from fastapi.testclient import TestClient
+    import server
+
+    def par():
+        return {"planilha_oficial": ("oficial.xlsx", of), "planilha_divergente": ("fisico.xlsx", fis)}
+
+    def ok(r, status: int = 200):
+        if r.status_code != status:
+            raise RuntimeError(f"{r.request.method} {r.request.url.path}: {r.status_code} {r.text[:200]}")
+        return r
+
+    frio = server.planilhas_cache.limpar
+    with TestClient(server.app) as c:
+        reg.medir("http", "POST /compare", n, lambda: ok(c.post("/compare", files=par())), frio)
+        reg.medir("http", "POST /compare?modo=agregado", n,
+                  lambda: ok(c.post("/compare?modo=agregado", files=par())), frio)
+        lote = [("planilha_oficial", ("oficial.xlsx", of)),
+                ("planilhas_divergentes", ("equipe_1.xlsx", fis)), ("planilhas_divergentes", ("equipe_2.xlsx", fis))]
+        reg.medir("http", "POST /compare/lote (2 equipes)", n, lambda: ok(c.post("/compare/lote", files=lote)), frio)
+
+        def job():
+            jid = ok(c.post("/jobs/compare", files=par()), 202).json()["id"]
+            while ok(c.get(f"/jobs/{jid}")).json()["status"] not in ("concluido", "erro"):
+                time.sleep(0.01)
+            return ok(c.get(f"/jobs/{jid}/result"))
+        reg.medir("http", "POST /jobs/compare até o resultado", n, job, frio)
+
+        rid = reg.medir("http", "POST /resultados", n, lambda: ok(c.post("/resultados", files=par())), frio).json()["id"]
+        reg.medir("http", "GET /resultados/{id}", n, lambda: ok(c.get(f"/resultados/{rid}")))
+        reg.medir("http", "GET /resultados/{id}/linhas divergências", n,
+                  lambda: ok(c.get(f"/resultados/{rid}/linhas", params={"divergencias": True})))
+
+        sid = reg.medir("http", "POST /sessoes", n, lambda: ok(c.post("/sessoes", files=par())), frio).json()["id"]
+        reg.medir("http", "POST /sessoes/{id}/recontagem", n, lambda: ok(c.post(
+            f"/sessoes/{sid}/recontagem", files={"planilha_divergente": ("recontagem.xlsx", recontagem)})))
+        reg.medir("http", "GET /sessoes/{id}/relatorio", n, lambda: ok(c.get(f"/sessoes/{sid}/relatorio")))
+
+        reg.medir("http", "POST /blind-template", n, lambda: ok(c.post(
+            "/blind-template", files={"planilha_oficial": ("oficial.xlsx", of)})), frio)
+        reg.medir("http", "POST /blank", n, lambda: ok(c.post("/blank", files={"wms": ("oficial.xlsx", of)})), frio)
+
+
+def rodar(args: argparse.Namespace) -> Dict[str, Any]:
+    reg = _Registro(args.repeticoes)
+    print(f"{'grupo':>10} {'etapa':>40} {'linhas':>9} {'med. (ms)':>10} {'mín. (ms)':>10} {'pico (MB)':>10}")
+    for n in args.linhas:
+        oficial, fisico = gerar_inventario(n, args.divergencias, args.duplicadas, args.lotes, seed=args.seed)
+        of, fis = escrever_oficial(oficial), escrever_fisico(fisico)
+        gavetas = fisico["gaveta"].drop_duplicates().head(5)
+        recontagem = escrever_fisico(fisico[fisico["gaveta"].isin(gavetas)])
+
+        def carregar(etapa: str, conteudo: bytes) -> pd.DataFrame:
+            fn = lambda: compare.carregar_planilha(BytesIO(conteudo))  # noqa: E731
+            return reg.medir("carregar", etapa, n, fn) if "carregar" in args.grupos else fn()
+
+        if set(args.grupos) & {"carregar", "comparar", "relatorio"}:
+            df_of = carregar("carregar_planilha oficial", of)
+            df_fis = carregar("carregar_planilha auditor", fis)
+        df_out = None
+        if "comparar" in args.grupos:
+            df_out = reg.medir("comparar", "comparar merge", n, lambda: compare.comparar(df_of, df_fis))
+            reg.medir("comparar", "comparar agregado", n, lambda: compare.comparar(df_of, df_fis, modo="agregado"))
+        if "relatorio" in args.grupos:
+            if df_out is None:
+                df_out = compare.comparar(df_of, df_fis)
+            reg.medir("relatorio", "escrever_xlsx", n, lambda: escrever_xlsx(df_out))
+        if "http" in args.grupos:
+            _http(reg, n, of, fis, recontagem)
+    return {"meta": _meta(args), "resultados": reg.itens}
+
+
+def comparar_execucoes(antes: Dict[str, Any], depois: Dict[str, Any], tolerancia: float) -> int:
+    """Imprime depois/antes por etapa (mediana) e devolve quantas pioraram além da tolerância."""
+    base = {(r["etapa"], r["linhas"]): r for r in antes["resultados"]}
+    print(f"antes:  {antes['meta'].get('commit')} ({antes['meta'].get('data')})")
+    print(f"depois: {depois['meta'].get('commit')} ({depois['meta'].get('data')})")
+    print(f"{'etapa':>40} {'linhas':>9} {'antes (ms)':>11} {'depois (ms)':>11} {'razão':>7} {'pico MB antes/depois':>21}")
+    piores = 0
+    for r in depois["resultados"]:
+        b = base.get((r["etapa"], r["linhas"]))
+        if b is None:
+            continue
+        razao = r["mediana_s"] / b["mediana_s"] if b["mediana_s"] else float("inf")
+        marca = ""
+        if razao > 1 + tolerancia:
+            piores += 1
+            marca = "  <- regressão"
+        picos = f"{b.get('pico_rss_mb')}/{r.get('pico_rss_mb')}"
+        print(f"{r['etapa']:>40} {r['linhas']:>9} {b['mediana_s'] * 1000:>11.1f} "
+              f"{r['mediana_s'] * 1000:>11.1f} {razao:>7.2f} {picos:>21}{marca}")
+    return piores
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--repeticoes", type=int, default=3)
+    ap.add_argument("--grupos", nargs="+", choices=GRUPOS, default=list(GRUPOS))
+    ap.add_argument("--divergencias", type=float, default=0.10)
+    ap.add_argument("--duplicadas", type=float, default=0.02)
+    ap.add_argument("--lotes", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--saida", help="arquivo JSON (padrão: backend/bench/resultados/<data>-<commit>.json)")
+    ap.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"), help="compara duas execuções gravadas")
+    ap.add_argument("--tolerancia", type=float, default=0.10, help="piora aceita no --comparar (0.10 = 10%%)")
+    args = ap.parse_args()
+
+    if args.comparar:
+        with open(args.comparar[0]) as fa, open(args.comparar[1]) as fb:
+            piores = comparar_execucoes(json.load(fa), json.load(fb), args.tolerancia)
+        sys.exit(1 if piores else 0)
+
+    saida = rodar(args)
+    destino = args.saida
+    if not destino:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        commit = (saida["meta"]["commit"] or "semgit")[:8]
+        destino = os.path.join(PASTA_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    with open(destino, "w") as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"resultados em {destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Segunda passada opcional sobre a saída do comparar: sugere pares entre as linhas
+órfãs (ausente_no_fisico x ausente_no_wms) que provavelmente são o mesmo item
+com código ou descrição digitados de outro jeito.
+
+Só se comparam órfãs da mesma gaveta (e do mesmo almoxarifado, se houver a
+coluna). O texto de cada linha (cod + produto, sem acento, minúsculo, só letras
+e números) vira o conjunto dos seus trigramas de caracteres; os candidatos saem
+de um índice invertido (gaveta, trigrama) -> linhas, em vez de todas as
+combinações, e só os melhores de cada linha do WMS são pontuados de verdade
+(coeficiente de Dice dos trigramas). Os pares são escolhidos do mais parecido
+para o menos, cada linha em no máximo um par.
+"""
+from typing import Dict, List, Optional, Tuple
+import re
+
+import numpy as np
+import pandas as pd
+
+from compare import _strip_accents
+from metricas import medir
+
+LIMIAR = 0.6          # similaridade mínima (0..1) para sugerir um par
+CANDIDATOS = 5        # melhores candidatos (por trigramas em comum) pontuados por linha do WMS
+MAX_FREQ_GRAMA = 64   # trigrama em mais linhas que isso, na mesma gaveta, não gera candidatos
+
+_NAO_ALFANUM = re.compile(r"[^0-9a-z]+")
+
+
+def _normalizar(texto: str) -> str:
+    return _NAO_ALFANUM.sub(" ", _strip_accents(texto).lower()).strip()
+
+
+def _gramas(texto: str, n: int = 3) -> frozenset:
+    """Trigramas de caracteres, com espaço nas pontas (início e fim da palavra contam)."""
+    t = f" {texto} "
+    return frozenset(t[i:i + n] for i in range(max(len(t) - n + 1, 1)))
+
+
+def _texto(df: pd.DataFrame) -> pd.Series:
+    cols = [c for c in ("cod", "produto") if c in df.columns]
+    partes = [df[c].astype(object).where(df[c].notna(), "").astype(str) for c in cols]
+    return partes[0].str.cat(partes[1:], sep=" ") if len(partes) > 1 else partes[0]
+
+
+def _bloco(df: pd.DataFrame) -> pd.Series:
+    cols = [c for c in ("almoxarifado", "gaveta") if c in df.columns]
+    partes = [df[c].astype(object).where(df[c].notna(), "").astype(str) for c in cols]
+    return partes[0].str.cat(partes[1:], sep="\x1f") if len(partes) > 1 else partes[0]
+
+
+def _explodir(textos: np.ndarray, blocos: np.ndarray, gramas: List[np.ndarray]) -> pd.DataFrame:
+    """Uma linha por (linha órfã, trigrama): linha, bloco, grama."""
+    tam = np.fromiter((len(gramas[t]) for t in textos), dtype=np.int64, count=len(textos))
+    return pd.DataFrame({
+        "linha": np.repeat(np.arange(len(textos)), tam),
+        "bloco": np.repeat(blocos, tam),
+        "grama": np.concatenate([gramas[t] for t in textos]) if len(textos) else np.array([], dtype=np.int64),
+    })
+
+
+def _sem_frequentes(ex: pd.DataFrame) -> pd.DataFrame:
+    freq = ex.groupby(["bloco", "grama"])["linha"].transform("size")
+    return ex[freq.to_numpy() <= MAX_FREQ_GRAMA]
+
+
+def sugerir_pares(df_out: pd.DataFrame, limiar: float = LIMIAR) -> pd.DataFrame:
+    """
+    Pares prováveis entre linhas só do WMS e só do físico de `df_out` (saída do comparar),
+    do mais parecido para o menos. Colunas: gaveta (e almoxarifado, se houver), cod/produto/
+    quantidade de cada lado, diferenca (fisico - wms), similaridade e linha_wms/linha_fisico
+    (linha de cada uma no Relatorio do XLSX, contando o cabeçalho).
+    """
+    with medir("sugerir_pares", linhas=len(df_out)) as m:
+        merge = df_out["_merge"].astype(str).to_numpy()
+        pos_l = np.flatnonzero(merge == "left_only")
+        pos_r = np.flatnonzero(merge == "right_only")
+        out = _montar(df_out, pos_l, pos_r, _parear(df_out, pos_l, pos_r, limiar))
+        m["linhas"] = len(pos_l) + len(pos_r)
+    return out
+
+
+def _parear(df_out: pd.DataFrame, pos_l: np.ndarray, pos_r: np.ndarray,
+            limiar: float) -> List[Tuple[int, int, float]]:
+    if not len(pos_l) or not len(pos_r):
+        return []
+    orfas = df_out.iloc[np.concatenate([pos_l, pos_r])]
+    nl = len(pos_l)
+
+    # texto e bloco por valor distinto (normalizar e gerar trigramas é o trabalho em Python)
+    codigos_texto, textos = pd.factorize(_texto(orfas))
+    codigos_bloco, _ = pd.factorize(_bloco(orfas))
+    conjuntos = [_gramas(_normalizar(t)) for t in textos]
+    ids: Dict[str, int] = {}
+    gramas = [np.fromiter((ids.setdefault(g, len(ids)) for g in c), dtype=np.int64, count=len(c)) for c in conjuntos]
+
+    # índice invertido (bloco, trigrama): só pares com algum trigrama não-frequente em comum
+    esq = _sem_frequentes(_explodir(codigos_texto[:nl], codigos_bloco[:nl], gramas))
+    dir_ = _sem_frequentes(_explodir(codigos_texto[nl:], codigos_bloco[nl:], gramas))
+    pares = esq.merge(dir_, on=["bloco", "grama"], suffixes=("_l", "_r"))
+    if pares.empty:
+        return []
+    comuns = pares.groupby(["linha_l", "linha_r"]).size().rename("comuns").reset_index()
+    comuns = comuns.sort_values(["linha_l", "comuns", "linha_r"], ascending=[True, False, True], kind="stable")
+    comuns = comuns[comuns.groupby("linha_l").cumcount() < CANDIDATOS]
+
+    # Dice exato nos candidatos, depois escolha gulosa do maior para o menor
+    tl = codigos_texto[comuns["linha_l"].to_numpy()]
+    tr = codigos_texto[nl + comuns["linha_r"].to_numpy()]
+    notas = np.fromiter(
+        (2 * len(conjuntos[a] & conjuntos[b]) / (len(conjuntos[a]) + len(conjuntos[b])) for a, b in zip(tl, tr)),
+        dtype=np.float64, count=len(tl),
+    )
+    ok = notas >= limiar
+    cand = sorted(zip(-notas[ok], comuns["linha_l"].to_numpy()[ok], comuns["linha_r"].to_numpy()[ok]))
+    usados_l, usados_r = set(), set()
+    escolhidos = []
+    for nota, l, r in cand:
+        if l in usados_l or r in usados_r:
+            continue
+        usados_l.add(l)
+        usados_r.add(r)
+        escolhidos.append((int(l), int(r), float(-nota)))
+    return escolhidos
+
+
+def _montar(df_out: pd.DataFrame, pos_l: np.ndarray, pos_r: np.ndarray,
+            escolhidos: List[Tuple[int, int, float]]) -> pd.DataFrame:
+    il = pos_l[[l for l, _, _ in escolhidos]] if escolhidos else np.array([], dtype=np.intp)
+    ir = pos_r[[r for _, r, _ in escolhidos]] if escolhidos else np.array([], dtype=np.intp)
+    wms, fis = df_out.iloc[il], df_out.iloc[ir]
+
+    def col(df: pd.DataFrame, c: str) -> Optional[np.ndarray]:
+        return df[c].astype(object).to_numpy() if c in df.columns else None
+
+    dados = {}
+    if "almoxarifado" in df_out.columns:
+        dados["almoxarifado"] = col(wms, "almoxarifado")
+    dados["gaveta"] = col(wms, "gaveta")
+    for c in ("cod", "produto"):
+        if c in df_out.columns:
+            dados[f"{c}_wms"] = col(wms, c)
+            dados[f"{c}_fisico"] = col(fis, c)
+    qw = wms["quantidade_wms"].to_numpy(dtype="float64", na_value=np.nan)
+    qf = fis["quantidade_fisico"].to_numpy(dtype="float64", na_value=np.nan)
+    dados["quantidade_wms"] = qw
+    dados["quantidade_fisico"] = qf
+    dados["diferenca"] = qf - qw
+    dados["similaridade"] = np.round([n for _, _, n in escolhidos], 3)
+    dados["linha_wms"] = il + 2
+    dados["linha_fisico"] = ir + 2
+    return pd.DataFrame(dados)
@@ -1,10 +1,15 @@
+from typing import BinaryIO, Union
 import pandas as pd
 from compare import carregar_planilha
 
 COLUMNS_OUT = ["gaveta", "cod", "produto", "lote", "quantidade", "observacao"]
 
-def gerar_em_branco(path_wms: str) -> pd.DataFrame:
-    wms = carregar_planilha(path_wms)
+def gerar_em_branco(wms: Union[str, BinaryIO]) -> pd.DataFrame:
+    """Aceita caminho ou buffer (BytesIO, UploadFile.file), como carregar_planilha."""
+    return gerar_em_branco_df(carregar_planilha(wms))
+
+def gerar_em_branco_df(wms: pd.DataFrame) -> pd.DataFrame:
+    """Mesmo que gerar_em_branco, a partir de um DataFrame já carregado."""
     out = wms.copy()
     if "quantidade" in out.columns:
         out["quantidade"] = ""  # zera para contagem às cegas
@@ -0,0 +1,398 @@
+"""
+Cache em processo das planilhas já normalizadas, indexado pelo hash do conteúdo enviado.
+
+O mesmo export do WMS costuma subir várias vezes seguidas (/blind-template, /blank,
+/compare contra cada auditor); com o cache só o primeiro upload passa pelo
+carregar_planilha. Eviction LRU limitada pelo total de memória dos DataFrames,
+TTL por entrada e, opcionalmente, cópia em Parquet no disco para sobreviver a
+restart do worker (requer pyarrow ou fastparquet), com LRU pelo total em disco.
+
+Os DataFrames guardados são devolvidos sem cópia e compartilhados entre requisições:
+são somente leitura. comparar e os jobs do server não alteram as entradas (com o
+Copy-on-Write do pandas, derivar e modificar não afeta o original); quem precisar
+alterar in-place (df[col] = ...) copia antes.
+
+CacheRelatorios guarda o passo seguinte: o relatório já pronto de uma comparação.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    return hashlib.blake2b(conteudo, digest_size=20).hexdigest()
+
+
+class CachePlanilhas:
+    def __init__(self, max_bytes: int, ttl: float, dir_disco: Optional[str] = None,
+                 max_bytes_disco: int = 2 * 2**30):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.dir_disco = dir_disco
+        self.max_bytes_disco = max_bytes_disco
+        self._itens: "OrderedDict[str, Tuple[pd.DataFrame, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evictions_disco = 0
+        self.falhas_disco = 0
+        # chave -> tamanho do .parquet, do menos para o mais recente (o que sobrou de antes do restart entra pelo mtime)
+        self._disco: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes_disco = 0
+        if dir_disco:
+            os.makedirs(dir_disco, exist_ok=True)
+            entradas = []
+            for nome in os.listdir(dir_disco):
+                path = os.path.join(dir_disco, nome)
+                try:
+                    if nome.endswith(".tmp"):  # escrita interrompida
+                        os.remove(path)
+                    elif nome.endswith(".parquet"):
+                        st = os.stat(path)
+                        entradas.append((st.st_mtime, nome[:-len(".parquet")], st.st_size))
+                except OSError:
+                    pass
+            for _, chave, tam in sorted(entradas):
+                self._disco[chave] = tam
+                self._bytes_disco += tam
+            self._podar_disco()
+
+    # ---- API ----
+
+    def buscar(self, chave: str) -> Optional[pd.DataFrame]:
+        """Frame de `chave` (memória, depois disco; somente leitura) ou None, contando hit/miss."""
+        df = self._get_memoria(chave)
+        if df is None:
+            df = self._get_disco(chave)
+            if df is not None:
+                self._put_memoria(chave, df)
+        if df is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return df
+
+    def guardar(self, chave: str, df: pd.DataFrame) -> None:
+        self._put_memoria(chave, df)
+        self._put_disco(chave, df)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "entradas": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+                "disco_entradas": len(self._disco),
+                "disco_bytes": self._bytes_disco,
+                "disco_max_bytes": self.max_bytes_disco if self.dir_disco else 0,
+                "disco_evictions": self.evictions_disco,
+                "disco_falhas": self.falhas_disco,
+            }
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    # ---- memória ----
+
+    def _get_memoria(self, chave: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            df, tam, criado = item
+            if time.monotonic() - criado > self.ttl:
+                del self._itens[chave]
+                self._bytes -= tam
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return df
+
+    def _put_memoria(self, chave: str, df: pd.DataFrame) -> None:
+        tam = int(df.memory_usage(deep=True).sum())
+        if tam > self.max_bytes:
+            return  # maior que o cache inteiro: não vale guardar
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= antigo[1]
+            self._itens[chave] = (df, tam, time.monotonic())
+            self._bytes += tam
+            while self._bytes > self.max_bytes and self._itens:
+                _, (_, t, _) = self._itens.popitem(last=False)
+                self._bytes -= t
+                self.evictions += 1
+
+    # ---- disco (opcional) ----
+
+    def _arquivo(self, chave: str) -> str:
+        return os.path.join(self.dir_disco, f"{chave}.parquet")
+
+    def _tirar_disco(self, chave: str) -> None:
+        with self._lock:
+            tam = self._disco.pop(chave, None)
+            if tam is not None:
+                self._bytes_disco -= tam
+        try:
+            os.remove(self._arquivo(chave))
+        except OSError:
+            pass
+
+    def _get_disco(self, chave: str) -> Optional[pd.DataFrame]:
+        if not self.dir_disco:
+            return None
+        path = self._arquivo(chave)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                self._tirar_disco(chave)
+                return None
+            df = pd.read_parquet(path)
+            os.utime(path)  # mtime = último uso, para a ordem LRU sobreviver a restart
+        except (OSError, ImportError, ValueError):
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            if chave in self._disco:
+                self._disco.move_to_end(chave)
+        return df
+
+    def _put_disco(self, chave: str, df: pd.DataFrame) -> None:
+        if not self.dir_disco:
+            return
+        tmp = self._arquivo(chave) + ".tmp"
+        try:
+            df.to_parquet(tmp, index=False)
+            tam = os.path.getsize(tmp)
+            if tam > self.max_bytes_disco:
+                os.remove(tmp)  # maior que o limite inteiro: fica só em memória
+                return
+            os.replace(tmp, self._arquivo(chave))
+        except ImportError as e:  # sem pyarrow/fastparquet: não há como gravar nenhuma
+            logger.warning("Cache de planilhas: cópia em disco desligada (%s)", e)
+            self.dir_disco = None
+            return
+        except Exception as e:  # disco cheio, permissão...: só esta entrada fica fora do disco
+            logger.warning("Cache de planilhas: %s não gravada em disco (%s)", chave, e)
+            with self._lock:
+                self.falhas_disco += 1
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            antigo = self._disco.pop(chave, None)
+            if antigo is not None:
+                self._bytes_disco -= antigo
+            self._disco[chave] = tam
+            self._bytes_disco += tam
+        self._podar_disco()
+
+    def _podar_disco(self) -> None:
+        """Remove do disco as entradas com TTL vencido e, acima de max_bytes_disco, as menos usadas."""
+        agora = time.time()
+        with self._lock:
+            chaves = list(self._disco)
+        for chave in chaves:
+            try:
+                vencida = agora - os.path.getmtime(self._arquivo(chave)) > self.ttl
+            except OSError:
+                vencida = True  # sumiu (outro worker podou, limpeza manual)
+            if vencida:
+                self._tirar_disco(chave)
+        while True:
+            with self._lock:
+                if self._bytes_disco <= self.max_bytes_disco or not self._disco:
+                    return
+                chave, tam = self._disco.popitem(last=False)
+                self._bytes_disco -= tam
+                self.evictions_disco += 1
+            try:
+                os.remove(self._arquivo(chave))
+            except OSError:
+                pass
+
+
+class CacheRelatorios:
+    """
+    Relatórios prontos (os bytes do arquivo devolvido) em disco, pela chave das entradas
+    + opções (ver `chave`). O mesmo /compare baixado de novo (aba fechada, link passado
+    ao supervisor) sai do disco sem ler, comparar nem escrever o XLSX; o ETag é a
+    própria chave, então um If-None-Match igual não reenvia o arquivo (304 no GET, 412 no
+    POST; ver server._relatorio_em_cache). Eviction LRU pelo total em
+    disco; max_bytes=0 desliga. Cada entrada tem um .json ao lado com media_type,
+    nome do arquivo e o que mais o server quiser guardar (ex.: id do resultado).
+    """
+
+    def __init__(self, diretorio: str, max_bytes: int):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.nao_modificados = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_hits = 0
+        self.bytes_304 = 0
+        self.segundos_economizados = 0.0
+        # chave -> tamanho, do menos para o mais recente (o que sobrou de antes do restart entra pelo mtime)
+        self._itens: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        entradas = []
+        for nome in os.listdir(diretorio):
+            if nome.endswith(".bin"):
+                try:
+                    st = os.stat(os.path.join(diretorio, nome))
+                except OSError:
+                    continue
+                entradas.append((st.st_mtime, nome[:-len(".bin")], st.st_size))
+        for _, chave, tam in sorted(entradas):
+            self._itens[chave] = tam
+            self._bytes += tam
+        self._podar()
+
+    @staticmethod
+    def chave(*partes: Any) -> str:
+        """Hash das partes (hashes dos uploads, rota, opções), em ordem."""
+        return hash_conteudo(json.dumps(partes, default=str).encode())
+
+    @staticmethod
+    def etag(chave: str) -> str:
+        return f'"{chave}"'
+
+    def _arquivo(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.bin")
+
+    def _meta(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.json")
+
+    # ---- API ----
+
+    def revalidar(self, chave: str) -> bool:
+        """If-None-Match com o ETag de `chave`: True (e conta um 304/412) se ela ainda está no cache."""
+        with self._lock:
+            tam = self._itens.get(chave)
+            if tam is None or not os.path.exists(self._arquivo(chave)):
+                return False
+            self._itens.move_to_end(chave)
+            self.nao_modificados += 1
+            self.bytes_304 += tam
+        self._tocar(chave)
+        return True
+
+    def buscar(self, chave: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(caminho do arquivo, metadados) de `chave` ou None, contando hit/miss."""
+        with self._lock:
+            tam = self._itens.get(chave)
+        meta = None
+        if tam is not None:
+            try:
+                with open(self._meta(chave)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+        with self._lock:
+            if meta is None or not os.path.exists(self._arquivo(chave)):
+                # sumiu do disco (outro worker podou, limpeza manual): vale como miss
+                if self._itens.pop(chave, None) is not None:
+                    self._bytes -= tam
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            self.bytes_hits += tam
+            self.segundos_economizados += float(meta.get("segundos") or 0)
+        self._tocar(chave)
+        return self._arquivo(chave), meta
+
+    def guardar(self, chave: str, origem: Union[bytes, memoryview, str], meta: Dict[str, Any]) -> Optional[str]:
+        """
+        Guarda o relatório (bytes, ou caminho de um arquivo já gravado, que é movido para
+        cá) e devolve o caminho no cache; None se desligado, maior que o cache ou sem disco.
+        """
+        tam = len(origem) if not isinstance(origem, str) else os.path.getsize(origem)
+        if tam > self.max_bytes:
+            return None
+        destino = self._arquivo(chave)
+        try:
+            with open(self._meta(chave), "w") as f:
+                json.dump(meta, f)
+            if isinstance(origem, str):
+                os.replace(origem, destino)
+            else:
+                tmp = destino + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(origem)
+                os.replace(tmp, destino)
+        except OSError as e:
+            logger.warning("Cache de relatórios: não foi possível gravar %s (%s)", chave, e)
+            return None
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= antigo
+            self._itens[chave] = tam
+            self._bytes += tam
+        self._podar()
+        return destino
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.nao_modificados + self.misses
+            return {
+                "entradas": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "nao_modificados": self.nao_modificados,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.nao_modificados) / total, 4) if total else 0.0,
+                "bytes_hits": self.bytes_hits,  # servidos do disco em vez de gerados
+                "bytes_304": self.bytes_304,    # nem enviados (304 ou 412)
+                "segundos_economizados": round(self.segundos_economizados, 3),
+            }
+
+    # ---- disco ----
+
+    def _tocar(self, chave: str) -> None:
+        """mtime = último uso, para a ordem LRU sobreviver a restart."""
+        try:
+            os.utime(self._arquivo(chave))
+        except OSError:
+            pass
+
+    def _podar(self) -> None:
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or not self._itens:
+                    return
+                chave, tam = self._itens.popitem(last=False)
+                self._bytes -= tam
+                self.evictions += 1
+            for path in (self._arquivo(chave), self._meta(chave)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
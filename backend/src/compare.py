@@ -1,6 +1,33 @@
-import pandas as pd
-import re
+import codecs
+import contextvars
+import csv
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
 import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gaveta import chaves_gaveta, extrai_local, extrai_local_vec, ordenar_df, parse_gaveta
+import metricas
+from metricas import medir
+
+logger = logging.getLogger("uvicorn.error")
+
+# nomes antigos, mantidos para quem importa daqui
+_extrai_local = extrai_local
+_parse_gaveta = parse_gaveta
 
 # ----------------------------
 # Helpers de normalização
@@ -19,216 +46,658 @@ def _norm_cols(df: pd.DataFrame) -> pd.DataFrame:
     ]
     return df
 
-def _norm_qtd(s: str):
-    """Extrai número tolerante (ex.: '1250kg' -> 1250.0)"""
-    s = str(s).strip().lower().replace(",", ".")
-    m = re.search(r'[-+]?\d*\.?\d+', s)
-    if not m:
-        return None
+# ----------------------------
+# Leitores (engines): cada um devolve as linhas da 1ª aba como listas de str
+# ----------------------------
+
+# mesmos valores que o pandas trata como NA por padrão em read_excel/read_csv
+_NA_STRINGS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL_DOC = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_REL_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_TAG_T = f"{_NS_MAIN}t"
+
+@contextmanager
+def _abre_binario(fonte) -> Iterator[BinaryIO]:
+    """Abre caminho ou reaproveita buffer (BytesIO/UploadFile.file) voltando ao início."""
+    if isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, "rb") as f:
+            yield f
+    else:
+        fonte.seek(0)
+        yield fonte
+
+def _tamanho(fonte) -> Optional[int]:
+    """Bytes da planilha (caminho ou buffer com seek/tell), para as métricas; None se não der para saber."""
     try:
-        return float(m.group())
-    except:
+        if isinstance(fonte, (str, os.PathLike)):
+            return os.path.getsize(fonte)
+        pos = fonte.tell()
+        fim = fonte.seek(0, io.SEEK_END)
+        fonte.seek(pos)
+        return fim
+    except (OSError, AttributeError, ValueError):
         return None
 
-def _extrai_local(ocupacao: str) -> str:
+def _valor_celula(v) -> str:
+    """Converte valor de célula para str como o read_excel(dtype=str) faz."""
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return str(int(v)) if v.is_integer() else str(v)
+    return str(v)
+
+def _numero_xml(v: str) -> str:
+    """'10' -> '10', '10.0' -> '10', '1.5' -> '1.5' (mesma regra do openpyxl + pandas)."""
+    if "." in v or "E" in v or "e" in v:
+        return _valor_celula(float(v))
+    return str(int(v))
+
+@lru_cache(maxsize=None)
+def _letras_idx(letras: str) -> int:
+    """'AB' -> 27 (0-based)."""
+    n = 0
+    for ch in letras.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+def _coluna_idx(ref: str) -> int:
+    """'AB12' -> 27 (0-based)."""
+    return _letras_idx(ref.rstrip("0123456789"))
+
+def _texto_rico(node) -> str:
+    """Texto de <si>/<is>: <t> direto + <r><t> (ignora fonética <rPh>), como o openpyxl."""
+    if len(node) == 1 and node[0].tag == _TAG_T:  # caso comum: só <t>
+        return node[0].text or ""
+    partes = [node.findtext(f"{_NS_MAIN}t") or ""]
+    partes += [r.findtext(f"{_NS_MAIN}t") or "" for r in node.iterfind(f"{_NS_MAIN}r")]
+    return "".join(partes)
+
+def _linhas_xlsx_xml(fonte) -> Iterator[List[str]]:
     """
-    Recebe strings como '2ZG-G61b' e devolve somente 'G61b'
-    (pega a parte após o último '-').
+    Leitor mais rápido para .xlsx: lê o XML da 1ª aba direto do zip com iterparse
+    (sem montar objetos de célula do openpyxl). Datas usam os helpers do openpyxl.
     """
-    s = str(ocupacao).strip()
-    if "-" in s:
-        return s.split("-")[-1].strip()
-    return s  # fallback
+    from openpyxl.styles.stylesheet import Stylesheet
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+    from openpyxl.xml.functions import fromstring
+
+    with _abre_binario(fonte) as f, zipfile.ZipFile(f) as z:
+        nomes = set(z.namelist())
+
+        # 1ª aba na ordem do workbook (mesma que sheet_name=0)
+        wb = ET.fromstring(z.read("xl/workbook.xml"))
+        pr = wb.find(f"{_NS_MAIN}workbookPr")
+        epoch = CALENDAR_MAC_1904 if (pr is not None and pr.get("date1904") in ("1", "true")) else WINDOWS_EPOCH
+        rid = wb.find(f"{_NS_MAIN}sheets/{_NS_MAIN}sheet").get(f"{_NS_REL_DOC}id")
+        rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+        alvo = next(r.get("Target") for r in rels.iter(f"{_NS_REL_PKG}Relationship") if r.get("Id") == rid)
+        sheet_path = alvo.lstrip("/") if alvo.startswith("/") else posixpath.normpath(posixpath.join("xl", alvo))
+
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in nomes:
+            with z.open("xl/sharedStrings.xml") as sx:
+                for _, node in ET.iterparse(sx):
+                    if node.tag == f"{_NS_MAIN}si":
+                        shared.append(_texto_rico(node).replace("x005F_", ""))
+                        node.clear()
+
+        date_fmts, td_fmts = set(), set()
+        if "xl/styles.xml" in nomes:
+            styles = Stylesheet.from_tree(fromstring(z.read("xl/styles.xml")))
+            date_fmts, td_fmts = styles.date_formats, styles.timedelta_formats
+
+        tag_row, tag_c = f"{_NS_MAIN}row", f"{_NS_MAIN}c"
+        tag_v, tag_is = f"{_NS_MAIN}v", f"{_NS_MAIN}is"
+        proxima = 1
+        with z.open(sheet_path) as sx:
+            for _, row in ET.iterparse(sx):
+                if row.tag != tag_row:
+                    continue
+                r = int(row.get("r") or proxima)
+                # linhas ausentes no XML são linhas vazias na planilha
+                for _ in range(proxima, r):
+                    yield []
+                proxima = r + 1
+
+                linha: List[str] = []
+                col = -1
+                for c in row.iter(tag_c):
+                    ref = c.get("r")
+                    col = _coluna_idx(ref) if ref else col + 1
+                    t = c.get("t", "n")
+                    if t == "inlineStr":
+                        node = c.find(tag_is)
+                        val = _texto_rico(node) if node is not None else ""
+                    else:
+                        v = c.findtext(tag_v)
+                        if not v:
+                            val = ""
+                        elif t == "n":
+                            s = int(c.get("s", 0))
+                            if s in date_fmts:
+                                try:
+                                    num = float(v) if ("." in v or "e" in v.lower()) else int(v)
+                                    val = str(from_excel(num, epoch, timedelta=s in td_fmts))
+                                except (OverflowError, ValueError):
+                                    val = "#VALUE!"
+                            else:
+                                val = _numero_xml(v)
+                        elif t == "s":
+                            val = shared[int(v)]
+                        elif t == "b":
+                            val = str(bool(int(v)))
+                        elif t == "e":
+                            val = ""
+                        elif t == "d":
+                            val = str(from_ISO8601(v))
+                        else:  # 'str' (resultado de fórmula)
+                            val = v
+                    if col >= len(linha):
+                        linha.extend([""] * (col - len(linha) + 1))
+                    linha[col] = val
+                row.clear()
+                yield linha
+
+def _linhas_openpyxl(fonte) -> Iterator[List[str]]:
+    """openpyxl em modo read_only (streaming), sem passar pelo TextParser do pandas."""
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import TYPE_ERROR
+
+    with _abre_binario(fonte) as f:
+        wb = load_workbook(f, read_only=True, data_only=True, keep_links=False)
+        try:
+            ws = wb.worksheets[0]
+            ws.reset_dimensions()
+            for row in ws.iter_rows():
+                yield ["" if c.data_type == TYPE_ERROR else _valor_celula(c.value) for c in row]
+        finally:
+            wb.close()
+
+def _linhas_pandas(fonte) -> Iterator[List[str]]:
+    """Caminho antigo via pd.read_excel (também cobre .xls com xlrd instalado)."""
+    with _abre_binario(fonte) as f:
+        raw = pd.read_excel(f, header=None, dtype=str, na_filter=False).fillna("")
+    yield from raw.itertuples(index=False, name=None)
+
+def _linhas_csv(fonte, delimitador: Optional[str] = None) -> Iterator[List[str]]:
+    """CSV/TSV em streaming; detecta ';' ',' '\\t' '|' e utf-8 x latin-1 pela amostra inicial."""
+    with _abre_binario(fonte) as f:
+        amostra = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(amostra, final=False)
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "latin-1"
+        texto = io.TextIOWrapper(f, encoding=encoding, newline="")
+        try:
+            if delimitador is None:
+                try:
+                    delimitador = csv.Sniffer().sniff(amostra.decode(encoding, "ignore"), ";,\t|").delimiter
+                except csv.Error:
+                    delimitador = ","
+            yield from csv.reader(texto, delimiter=delimitador)
+        finally:
+            texto.detach()  # não fecha o buffer do chamador
+
+def _linhas_parquet(fonte) -> Iterator[List[str]]:
+    """Parquet (requer pyarrow ou fastparquet); a 1ª linha devolvida é o cabeçalho."""
+    with _abre_binario(fonte) as f:
+        df = pd.read_parquet(f)
+    yield [str(c) for c in df.columns]
+    df = df.astype(object).where(df.notna(), "")
+    for row in df.itertuples(index=False, name=None):
+        yield [_valor_celula(v) for v in row]
+
+_ENGINES: Dict[str, Callable[[Any], Iterator[List[str]]]] = {
+    "xlsx_xml": _linhas_xlsx_xml,
+    "openpyxl": _linhas_openpyxl,
+    "pandas": _linhas_pandas,
+    "csv": _linhas_csv,
+    "tsv": partial(_linhas_csv, delimitador="\t"),
+    "parquet": _linhas_parquet,
+}
+
+# ordem = do mais rápido para o mais lento; o próximo é tentado se o anterior falhar
+_ENGINES_POR_FORMATO = {
+    "xlsx": ["xlsx_xml", "openpyxl", "pandas"],
+    "xls": ["pandas"],
+    "csv": ["csv"],
+    "tsv": ["tsv"],
+    "parquet": ["parquet"],
+}
+
+_EXTENSOES = {
+    ".xlsx": "xlsx", ".xlsm": "xlsx", ".xls": "xls",
+    ".csv": "csv", ".tsv": "tsv", ".tab": "tsv",
+    ".parquet": "parquet", ".pq": "parquet",
+}
+
+def _detecta_formato(fonte) -> str:
+    """Pela extensão quando há caminho; senão pelos bytes iniciais do arquivo."""
+    if isinstance(fonte, (str, os.PathLike)):
+        ext = os.path.splitext(str(fonte))[1].lower()
+        if ext in _EXTENSOES:
+            return _EXTENSOES[ext]
+    with _abre_binario(fonte) as f:
+        magic = f.read(4)
+    if magic.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if magic == b"PAR1":
+        return "parquet"
+    if magic.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xls"
+    return "csv"
+
+# ----------------------------
+# Normalização das linhas lidas
+# ----------------------------
+
+_OFICIAL_COLS = {
+    "ALMOXARIFADO": "almoxarifado",
+    "GAVETA (YX-Desc.)": "ocupacao_estoque",
+    "MATERIAL": "cod",
+    "DESCRIÇÃO": "produto",
+    "DESCRICAO": "produto",
+    "LOTE": "lote",
+    "QTD.GAVETA": "quantidade",
+    "observacao": "observacao",
+}
+
+_ALIASES = {
+    "gaveta": ["gaveta", "posicao", "posicao_estoque", "ocupacao", "ocupacao_estoque"],
+    "cod": ["cod", "codigo", "material", "sku"],
+    "produto": ["produto", "descricao", "descrição", "nome"],
+    "lote": ["lote", "batch", "lote_id"],
+    "quantidade": ["quantidade", "qtd", "qtd_gaveta", "qtd.gaveta"],
+    "observacao": ["observacao", "observação", "obs", "nota"],
+    "almoxarifado": ["almoxarifado", "armazem", "deposito"],
+}
+
+COLUNAS = ["gaveta", "cod", "produto", "lote", "quantidade", "observacao"]
+# colunas que só entram no DataFrame quando a planilha as traz (usadas por comparar(particoes=...))
+COLUNAS_OPCIONAIS = ["almoxarifado"]
+
+# ----------------------------
+# Esquema compacto do DataFrame normalizado
+# ----------------------------
+# Texto: "category" (padrão; poucos valores distintos por coluna), "pyarrow"
+# (string[pyarrow], exige pyarrow) ou "str" (string comum do pandas).
+# quantidade: Float64 (nullable; <NA> = sem número), parseada uma vez na carga.
 
-def _parse_gaveta(val):
+COLUNAS_TEXTO = ["gaveta", "cod", "produto", "lote", "observacao"]
+
+TIPO_TEXTO = os.getenv("PLANILHA_TIPO_TEXTO", "category")
+
+try:
+    import pyarrow  # noqa: F401
+    _STRING_PYARROW = pd.StringDtype("pyarrow")
+except ImportError:
+    _STRING_PYARROW = None
+
+def _tipar_texto(col: pd.Series) -> pd.Series:
+    if TIPO_TEXTO == "category":
+        return col.astype("category")
+    if TIPO_TEXTO == "pyarrow" and _STRING_PYARROW is not None:
+        return col.astype(_STRING_PYARROW)
+    return col.astype(str)
+
+def _texto_compacto(dtype) -> bool:
+    return isinstance(dtype, pd.CategoricalDtype) or (_STRING_PYARROW is not None and dtype == _STRING_PYARROW)
+
+def _ja_normalizado(df: pd.DataFrame) -> bool:
+    """True se df já está no esquema compacto (saída de carregar_planilha)."""
+    return (
+        all(c in df.columns for c in COLUNAS)
+        and df["quantidade"].dtype == "Float64"
+        and all(_texto_compacto(df[c].dtype) for c in COLUNAS_TEXTO)
+    )
+
+def _quantidade(col: pd.Series) -> pd.Series:
+    """Coluna quantidade como Float64 (número extraído do texto, <NA> quando não há)."""
+    return pd.Series(pd.array(_norm_qtd_vec(col), dtype="Float64"), index=col.index)
+
+def _tipar(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica o esquema compacto às colunas padrão (texto já limpo)."""
+    for c in COLUNAS_TEXTO + [c for c in COLUNAS_OPCIONAIS if c in df.columns]:
+        df[c] = _tipar_texto(df[c])
+    df["quantidade"] = _quantidade(df["quantidade"])
+    return df
+
+class _PlanilhaInvalida(ValueError):
+    """Conteúdo não reconhecido (não é falha da engine de leitura)."""
+
+def _eh_cabecalho_oficial(header_row: List[str]) -> bool:
+    header_norm = [_strip_accents(x).upper() for x in header_row]
+    return ("DESCRICAO" in header_norm) and ("QTD.GAVETA" in header_row or "QTD.GAVETA" in header_norm)
+
+def _nomes_cabecalho(row: List[str], largura: int) -> List[str]:
+    """Nomes de coluna como o pandas: 'Unnamed: i' para vazios e 'x.1' para repetidos."""
+    nomes, vistos = [], set()
+    for i in range(largura):
+        nome = row[i] if i < len(row) and row[i] != "" else f"Unnamed: {i}"
+        base, n = nome, 0
+        while nome in vistos:
+            n += 1
+            nome = f"{base}.{n}"
+        vistos.add(nome)
+        nomes.append(nome)
+    return nomes
+
+def _sem_vazias_no_fim(linhas: Iterable[List[str]]) -> Iterator[List[str]]:
+    """Descarta linhas vazias finais (formatação sem dado), mantendo as do meio."""
+    pendentes = []
+    for linha in linhas:
+        if any(linha):
+            yield from pendentes
+            pendentes.clear()
+            yield linha
+        else:
+            pendentes.append(linha)
+
+def _montar_base(linhas: Iterable[List[str]], posicoes: Dict[str, int]) -> pd.DataFrame:
+    """Pega só as colunas de interesse (posições no cabeçalho) e aplica a limpeza final."""
+    achadas = [c for c in COLUNAS + COLUNAS_OPCIONAIS if c in posicoes]
+    idx = [posicoes[c] for c in achadas]
+    largura = max(idx, default=-1) + 1
+    vazio = [""] * largura
+
+    def pega(linha):
+        if len(linha) < largura:
+            linha = list(linha) + vazio[len(linha):]
+        return [linha[i] for i in idx]
+
+    dados = pd.DataFrame([pega(l) for l in linhas], columns=achadas, dtype=object)
+    base = pd.DataFrame(index=dados.index)
+    for c in COLUNAS + [c for c in COLUNAS_OPCIONAIS if c in dados.columns]:
+        col = dados[c] if c in dados.columns else pd.Series("", index=dados.index, dtype=object)
+        base[c] = col.where(~col.isin(_NA_STRINGS), "")
+    base["gaveta"] = extrai_local_vec(base["gaveta"])
+    for c in base.columns:
+        base[c] = base[c].astype(str).str.strip()
+    return _tipar(base)
+
+def _cabecalho(linhas: Iterable[List[str]]):
     """
-    Converte 'A2b' -> ('A', 2, 'b') para ordenar por rua/letra, número e sufixo.
-    Se não casar, retorna fallback que mantém estável.
+    Localiza o cabeçalho nas linhas cruas da planilha (de qualquer engine) e devolve
+    (posições das colunas padrão, iterador das linhas de dados).
+    As linhas de preâmbulo do relatório oficial são só inspecionadas, nunca viram DataFrame.
     """
-    v = "" if val is None else str(val)
-    m = re.match(r"([A-Za-z]+)(\d+)([A-Za-z]*)", v)
-    if not m:
-        return (v.upper(), -1, "")
-    letra, numero, sufixo = m.groups()
-    return (letra.upper(), int(numero), sufixo.lower())
+    it = _sem_vazias_no_fim(linhas)
+    topo = list(itertools.islice(it, 4))  # cabeçalho do pandas + 3 primeiras linhas
+
+    # Heurística: 4ª linha da planilha contém os títulos do relatório oficial
+    # ['ALMOXARIFADO','LOCAL','GAVETA (YX-Desc.)','MATERIAL','DESCRIÇÃO','LOTE','QTD.GAVETA']
+    if len(topo) == 4:
+        header_row = ["" if x in _NA_STRINGS else x for x in topo[3]]
+        if _eh_cabecalho_oficial(header_row):
+            posicoes: Dict[str, int] = {}
+            for i, nome in enumerate(header_row):
+                alvo = _OFICIAL_COLS.get(nome)
+                if alvo and alvo not in posicoes:
+                    posicoes[alvo] = i
+            if "ocupacao_estoque" in posicoes:
+                posicoes["gaveta"] = posicoes.pop("ocupacao_estoque")
+            return posicoes, it
+
+    # Caminho padrão: já é “limpa” (1ª linha = cabeçalho)
+    if not topo:
+        raise _PlanilhaInvalida("Planilha vazia")
+    largura = max(len(l) for l in topo)
+    nomes = [_strip_accents(c).strip().lower().replace("  ", " ") for c in _nomes_cabecalho(topo[0], largura)]
+    posicoes = {}
+    for alvo, opcoes in _ALIASES.items():
+        for op in opcoes:
+            if op in nomes:
+                posicoes[alvo] = nomes.index(op)
+                break
+    if not posicoes:
+        raise _PlanilhaInvalida("Nenhuma coluna reconhecida na planilha")
+    return posicoes, itertools.chain(topo[1:], it)
+
+def _normalizar(linhas: Iterable[List[str]]) -> pd.DataFrame:
+    """Linhas cruas da planilha -> DataFrame padronizado."""
+    posicoes, it = _cabecalho(linhas)
+    return _montar_base(it, posicoes)
 
 # ----------------------------
 # Carregador
 # ----------------------------
 
-def carregar_planilha(path: str) -> pd.DataFrame:
+def carregar_planilha(path, engine: Optional[str] = None) -> pd.DataFrame:
     """
-    Carrega Excel em DataFrame padronizado para nosso comparador.
+    Carrega planilha em DataFrame padronizado para nosso comparador.
+    Aceita caminho ou buffer binário; formatos: .xlsx, .xls, CSV/TSV e Parquet.
     Suporta:
       - Planilhas “limpas” (colunas: gaveta, cod, produto, lote, quantidade, observacao)
       - Relatório oficial (ALMOXARIFADO, LOCAL, GAVETA (YX-Desc.), MATERIAL, DESCRIÇÃO, LOTE, QTD.GAVETA)
+    `engine` força um leitor de _ENGINES; sem ele usa o mais rápido disponível para o formato.
     Retorna SEMPRE colunas: gaveta, cod, produto, lote, quantidade, observacao
+    (texto conforme TIPO_TEXTO; quantidade em Float64), mais almoxarifado quando a
+    planilha tem a coluna (ALMOXARIFADO no relatório oficial).
     """
-    raw = pd.read_excel(path, dtype=str).fillna("")
+    engines = [engine] if engine else _ENGINES_POR_FORMATO[_detecta_formato(path)]
+    erro: Optional[Exception] = None
+    with medir("carregar", n_bytes=_tamanho(path)) as m:
+        for nome in engines:
+            try:
+                df = _normalizar(_ENGINES[nome](path))
+                m["linhas"] = len(df)
+                return df
+            except _PlanilhaInvalida:
+                raise  # conteúdo inválido: outra engine não resolveria
+            except Exception as e:
+                erro = e
+    raise erro
 
-    # Heurística: linha 2 (0-based) contém os títulos do relatório oficial
-    # ['ALMOXARIFADO','LOCAL','GAVETA (YX-Desc.)','MATERIAL','DESCRIÇÃO','LOTE','QTD.GAVETA']
-    try:
-        header_row = [str(x) for x in raw.iloc[2].tolist()]
-        header_norm = [_strip_accents(x).upper() for x in header_row]
-        if ("DESCRICAO" in header_norm) and ("QTD.GAVETA" in header_row or "QTD.GAVETA" in header_norm):
-            df = raw.iloc[3:].copy()
-            df.columns = header_row
-            df = df.fillna("")
-            # renomeia pro padrão
-            df = df.rename(columns={
-                "GAVETA (YX-Desc.)": "ocupacao_estoque",
-                "MATERIAL": "cod",
-                "DESCRIÇÃO": "produto",
-                "DESCRICAO": "produto",
-                "LOTE": "lote",
-                "QTD.GAVETA": "quantidade",
-            })
-            # extrai gaveta/local a partir da ocupacao_estoque
-            if "ocupacao_estoque" in df.columns:
-                df["gaveta"] = df["ocupacao_estoque"].apply(_extrai_local)
-            else:
-                df["gaveta"] = ""
-
-            base = pd.DataFrame({
-                "gaveta": df.get("gaveta", ""),
-                "cod": df.get("cod", ""),
-                "produto": df.get("produto", ""),
-                "lote": df.get("lote", ""),
-                "quantidade": df.get("quantidade", ""),
-                "observacao": df.get("observacao", "")
-            }).fillna("")
-            for c in base.columns:
-                base[c] = base[c].astype(str).str.strip()
-            return base
-    except Exception:
-        # se não bater a heurística, segue pro caminho padrão
-        pass
-
-    # Caminho padrão: já é “limpa”
-    df = _norm_cols(raw.fillna(""))
-    aliases = {
-        "gaveta": ["gaveta", "posicao", "posicao_estoque", "ocupacao", "ocupacao_estoque"],
-        "cod": ["cod", "codigo", "material", "sku"],
-        "produto": ["produto", "descricao", "descrição", "nome"],
-        "lote": ["lote", "batch", "lote_id"],
-        "quantidade": ["quantidade", "qtd", "qtd_gaveta", "qtd.gaveta"],
-        "observacao": ["observacao", "observação", "obs", "nota"]
-    }
-
-    norm = {}
-    for alvo, opcoes in aliases.items():
-        encontrado = ""
-        for op in opcoes:
-            if op in df.columns:
-                encontrado = op
-                break
-        norm[alvo] = df.get(encontrado, "")
-
-    base = pd.DataFrame(norm).fillna("")
-    base["gaveta"] = base["gaveta"].apply(_extrai_local)
-    for c in base.columns:
-        base[c] = base[c].astype(str).str.strip()
-    return base
+def carregar_planilha_blocos(path, linhas: int = 100_000, engine: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Como carregar_planilha, mas devolve a planilha em DataFrames de até `linhas` linhas,
+    lidos sob demanda (para entradas que não cabem inteiras na memória).
+    As engines xlsx_xml, openpyxl e csv leem em streaming; pandas e parquet leem o
+    arquivo inteiro antes do primeiro bloco. Outra engine só é tentada se a anterior
+    falhar antes de entregar o primeiro bloco.
+    """
+    engines = [engine] if engine else _ENGINES_POR_FORMATO[_detecta_formato(path)]
+    erro: Optional[Exception] = None
+    for nome in engines:
+        entregou = False
+        try:
+            posicoes, it = _cabecalho(_ENGINES[nome](path))
+            while True:
+                with medir("carregar") as m:
+                    bloco = _montar_base(itertools.islice(it, linhas), posicoes)
+                    m["linhas"] = len(bloco)
+                if bloco.empty and entregou:
+                    return
+                entregou = True
+                yield bloco
+                if len(bloco) < linhas:
+                    return
+        except _PlanilhaInvalida:
+            raise
+        except Exception as e:
+            if entregou:
+                raise  # parte da planilha já foi entregue: não dá para recomeçar com outra engine
+            erro = e
+    raise erro
 
 # ----------------------------
-# Comparador (COM MERGE OUTER, preserva todas as linhas)
+# Helpers vetorizados do comparador
 # ----------------------------
 
-def comparar(oficial: pd.DataFrame, divergente: pd.DataFrame) -> pd.DataFrame:
+_RX_QTD = r'([-+]?\d*\.?\d+)'
+
+def _norm_qtd_vec(col: pd.Series) -> np.ndarray:
+    """Extrai número tolerante (ex.: '1250kg' -> 1250.0, '1,5' -> 1.5): float64 com NaN onde não há número."""
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(dtype=float, na_value=np.nan)
+    s = col.astype(str).str.replace(",", ".", regex=False)
+    return s.str.extract(_RX_QTD, expand=False).astype(float).to_numpy()
+
+def _diferenca_vec(nf: np.ndarray, nw: np.ndarray, index) -> pd.Series:
     """
-    Compara Oficial (WMS) x Físico usando merge outer (mantém todas as linhas).
-    Chaves: ['gaveta','cod','produto'] (as que existirem em ambos).
-    Saída:
-      - quantidade_wms, quantidade_fisico, diferenca (fisico - wms)
-      - lote_wms, lote_fisico
-      - observacao_wms, observacao_fisico
-      - Status: 'OK' ou nomes das colunas divergentes ('quantidade','lote','observacao')
-                + marcações de presença via coluna _merge (left_only/right_only/both)
-      - Ordenação lógica por 'gaveta': rua/letra -> número -> sufixo
+    fisico - wms; inteiro quando o resultado é inteiro, float caso contrário,
+    e '' quando algum dos lados não tem número.
+    """
+    ambos = ~(np.isnan(nf) | np.isnan(nw))
+    with np.errstate(invalid="ignore"):
+        d = nf - nw
+    inteiro = ambos & np.isfinite(d) & (d == np.floor(d))
+
+    out = np.full(len(d), "", dtype=object)
+    out[ambos] = d[ambos].tolist()
+    out[inteiro] = list(map(int, d[inteiro].tolist()))
+    # via lista para o pandas inferir o dtype exatamente como no apply() linha a linha
+    return pd.Series(out.tolist(), index=index)
+
+# tabela de Status indexada por: quantidade=1, lote=2, observacao=4; presença=8/9
+_STATUS_TABELA = np.array(
+    [
+        ";".join(n for bit, n in ((1, "quantidade"), (2, "lote"), (4, "observacao")) if code & bit) or "OK"
+        for code in range(8)
+    ] + ["ausente_no_fisico", "ausente_no_wms"],
+    dtype=object,
+)
+
+def _status_vec(df_out: pd.DataFrame, nw: np.ndarray, nf: np.ndarray) -> pd.Series:
+    """Monta a coluna Status em bloco a partir das flags de divergência e do _merge."""
+    merge = df_out["_merge"].astype(str).to_numpy()
+
+    def _txt(c):
+        col = df_out[c]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # normaliza só as categorias e espalha pelos códigos
+            cats = col.cat.categories.astype(str).str.strip().str.lower().to_numpy(dtype=object)
+            codes = col.cat.codes.to_numpy()
+            return np.where(codes >= 0, cats[codes] if len(cats) else "nan", "nan")
+        return col.astype(str).str.strip().str.lower().to_numpy()
+
+    q = ~((np.isnan(nw) & np.isnan(nf)) | (nw == nf))
+    if "lote_wms" in df_out.columns:
+        lo = _txt("lote_wms") != _txt("lote_fisico")
+    else:  # lote é chave: só casa com o mesmo lote
+        lo = np.zeros(len(df_out), dtype=bool)
+    ob = _txt("observacao_wms") != _txt("observacao_fisico")
+
+    code = q.astype(np.int8) | (lo.astype(np.int8) << 1) | (ob.astype(np.int8) << 2)
+    code = np.where(merge == "both", code, 0)
+    code = np.where(merge == "left_only", 8, code)
+    code = np.where(merge == "right_only", 9, code)
+    return pd.Series(_STATUS_TABELA[code].tolist(), index=df_out.index)
+
+def _preparar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Entrada do comparador no esquema compacto. Frames vindos de carregar_planilha
+    passam direto; os demais são normalizados numa cópia (o original não é alterado).
     """
-    # garante colunas padrão
-    for df in (oficial, divergente):
-        for c in ["gaveta","cod","produto","lote","quantidade","observacao"]:
-            if c not in df.columns:
-                df[c] = ""
-        for c in df.columns:
+    if _ja_normalizado(df):
+        return df
+    df = df.copy()
+    for c in COLUNAS:
+        if c not in df.columns:
+            df[c] = ""
+    for c in df.columns:
+        if c != "quantidade" or not pd.api.types.is_numeric_dtype(df[c].dtype):
             df[c] = df[c].astype(str).str.strip()
+    return _tipar(df)
+
+def _alinhar_categorias(left: pd.DataFrame, right: pd.DataFrame, cols: List[str]) -> None:
+    """Mesmas categorias (ordenadas) dos dois lados: o merge usa os códigos e a ordem segue o texto."""
+    for c in cols:
+        a, b = left[c], right[c]
+        if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype):
+            cats = a.cat.categories.union(b.cat.categories)
+            left[c] = a.cat.set_categories(cats)
+            right[c] = b.cat.set_categories(cats)
+
+MODOS = ("merge", "agregado")
+
+def _distintos(df: pd.DataFrame, keys: List[str], col: str) -> pd.Series:
+    """
+    Valores não vazios distintos de `col` por chave, ordenados e juntados com ', '
+    (chave sem valor fica de fora). Só as chaves com mais de um valor passam pelo join.
+    """
+    vals = df[keys + [col]].copy()
+    vals[col] = vals[col].astype(str).str.strip()
+    vals = vals[vals[col] != ""].drop_duplicates()
+    varios = vals.duplicated(keys, keep=False)
+    unicos = vals[~varios].set_index(keys)[col]
+    # groupby().agg(", ".join) fatia uma Series por grupo; aqui é uma passada só nas listas
+    m = vals[varios]
+    m = m.assign(_g=m.groupby(keys, sort=False, observed=True).ngroup()).sort_values(["_g", col])
+    textos = [", ".join(v for _, v in grupo)
+              for _, grupo in itertools.groupby(zip(m["_g"].tolist(), m[col].tolist()), key=lambda x: x[0])]
+    indice = m.drop_duplicates("_g").set_index(keys).index
+    return pd.concat([unicos, pd.Series(textos, index=indice, dtype=object)])
+
+def _agregar(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Uma linha por chave: quantidade somada (<NA> se nenhuma linha tem número), lote/observacao distintos."""
+    g = df.groupby(keys, sort=False, observed=True)
+    out = g["quantidade"].sum(min_count=1).to_frame()
+    for c in ("lote", "observacao"):
+        if c not in keys:
+            out[c] = _distintos(df, keys, c).reindex(out.index).fillna("")
+    return out.reset_index()
+
+# ----------------------------
+# Comparador (COM MERGE OUTER, preserva todas as linhas)
+# ----------------------------
 
-    # chaves
-    keys_all = ["gaveta", "cod", "produto"]
+def _chaves(oficial: pd.DataFrame, divergente: pd.DataFrame, por_lote: bool) -> List[str]:
+    keys_all = ["gaveta", "cod", "produto"] + (["lote"] if por_lote else [])
     keys = [k for k in keys_all if k in oficial.columns and k in divergente.columns]
-    if not keys:
-        # fallback: usa só 'cod' se nada mais existir
-        keys = ["cod"]
-
-    # renomeia colunas de valor antes do merge para forçar sufixos
-    left = oficial.rename(columns={
-        "quantidade": "quantidade_wms",
-        "lote": "lote_wms",
-        "observacao": "observacao_wms",
-    })
-    right = divergente.rename(columns={
-        "quantidade": "quantidade_fisico",
-        "lote": "lote_fisico",
-        "observacao": "observacao_fisico",
-    })
+    # fallback: usa só 'cod' se nada mais existir
+    return keys or ["cod"]
+
+def _lado(df: pd.DataFrame, keys: List[str], modo: str, sufixo: str) -> pd.DataFrame:
+    """Um lado do merge: agregado (se for o modo) e com as colunas de valor já sufixadas."""
+    if modo == "agregado":
+        with medir("agregar", linhas=len(df)):
+            df = _agregar(df, keys)
+    # renomeia colunas de valor antes do merge para forçar sufixos; as demais
+    # (ex.: almoxarifado dos dois lados) ficam fora para não colidirem no merge
+    valores = [c for c in ("quantidade", "lote", "observacao") if c not in keys]
+    df = df[keys + [c for c in valores if c in df.columns]]
+    return df.rename(columns={c: f"{c}_{sufixo}" for c in valores})
+
+def _reconciliar(left: pd.DataFrame, right: pd.DataFrame, keys: List[str],
+                 avisa: Callable[[str], None]) -> pd.DataFrame:
+    """Merge outer dos dois lados prontos (ver _lado) + diferença, Status e ordenação."""
+    # cópias rasas: alinhar as categorias não mexe no lado WMS compartilhado (comparar_many)
+    left, right = left.copy(deep=False), right.copy(deep=False)
+    _alinhar_categorias(left, right, keys)
 
     # merge outer preservando todas as linhas (inclusive duplicadas por chave)
-    df_out = left.merge(
-        right,
-        on=keys,
-        how="outer",
-        suffixes=("", ""),  # já renomeamos acima
-        indicator=True
-    )
+    avisa("merge")
+    with medir("merge") as m:
+        df_out = left.merge(
+            right,
+            on=keys,
+            how="outer",
+            suffixes=("", ""),  # já renomeamos em _lado
+            indicator=True
+        )
+        m["linhas"] = len(df_out)
 
-    # helpers numéricos
-    def to_num(x):
-        x = str(x).strip().lower().replace(",", ".")
-        m = re.search(r'[-+]?\d*\.?\d+', x)
-        if not m:
-            return None
-        try:
-            return float(m.group())
-        except:
-            return None
-
-    # diferenca (fisico - wms)
-    if "quantidade_wms" not in df_out: df_out["quantidade_wms"] = ""
-    if "quantidade_fisico" not in df_out: df_out["quantidade_fisico"] = ""
-    df_out["diferenca"] = df_out.apply(
-        lambda r: (
-            (lambda nf, nw: (int(nf - nw) if float(nf - nw).is_integer() else float(nf - nw)))
-            (to_num(r["quantidade_fisico"]), to_num(r["quantidade_wms"]))
-            if (to_num(r["quantidade_fisico"]) is not None and to_num(r["quantidade_wms"]) is not None)
-            else ""
-        ),
-        axis=1
-    )
+    # quantidades parseadas uma única vez por coluna (NaN = sem número)
+    avisa("status")
+    with medir("status", linhas=len(df_out)):
+        if "quantidade_wms" not in df_out: df_out["quantidade_wms"] = ""
+        if "quantidade_fisico" not in df_out: df_out["quantidade_fisico"] = ""
+        nw = _norm_qtd_vec(df_out["quantidade_wms"])
+        nf = _norm_qtd_vec(df_out["quantidade_fisico"])
+
+        # diferenca (fisico - wms)
+        df_out["diferenca"] = _diferenca_vec(nf, nw, df_out.index)
 
-    # Status
-    def status_row(r):
-        issues = []
-        # divergências quando linha existe nos dois lados
-        if r["_merge"] == "both":
-            if to_num(r["quantidade_wms"]) != to_num(r["quantidade_fisico"]):
-                issues.append("quantidade")
-            lw = str(r.get("lote_wms","")).strip().lower()
-            lf = str(r.get("lote_fisico","")).strip().lower()
-            if lw != lf:
-                issues.append("lote")
-            ow = str(r.get("observacao_wms","")).strip().lower()
-            of_ = str(r.get("observacao_fisico","")).strip().lower()
-            if ow != of_:
-                issues.append("observacao")
-        elif r["_merge"] == "left_only":
-            issues.append("ausente_no_fisico")
-        elif r["_merge"] == "right_only":
-            issues.append("ausente_no_wms")
-        return "OK" if not issues else ";".join(issues)
-
-    df_out["Status"] = df_out.apply(status_row, axis=1)
+        # Status
+        df_out["Status"] = _status_vec(df_out, nw, nf)
 
     # ordenação de colunas
     ordered = keys + [
@@ -237,18 +706,377 @@ def comparar(oficial: pd.DataFrame, divergente: pd.DataFrame) -> pd.DataFrame:
         "observacao_wms","observacao_fisico",
         "Status","_merge"
     ]
+    if "lote" in keys:
+        ordered = [c for c in ordered if c not in ("lote_wms", "lote_fisico")]
     for c in ordered:
         if c not in df_out.columns:
             df_out[c] = ""
     df_out = df_out[ordered]
 
     # >>> Ordenação lógica por 'gaveta': rua/letra -> número -> sufixo
-    if "gaveta" in df_out.columns:
-        df_out = df_out.sort_values(
-            by=keys,  # mantém ordenação também por cod/produto após gaveta
-            key=lambda col: col.map(_parse_gaveta) if col.name == "gaveta" else col
-        ).reset_index(drop=True)
+    # (chave canônica de gaveta.py, calculada uma vez por gaveta distinta)
+    avisa("ordenando")
+    with medir("ordenar", linhas=len(df_out)):
+        return ordenar_df(df_out, keys)  # mantém ordenação também por cod/produto após gaveta
+
+def _validar_modo(modo: str) -> None:
+    if modo not in MODOS:
+        raise ValueError(f"modo inválido: {modo} (use {', '.join(MODOS)})")
+
+def comparar(
+    oficial: pd.DataFrame,
+    divergente: pd.DataFrame,
+    progresso: Optional[Callable[[str], None]] = None,
+    modo: str = "merge",
+    por_lote: bool = False,
+    particoes: Sequence[str] = (),
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Compara Oficial (WMS) x Físico usando merge outer (mantém todas as linhas).
+    Chaves: ['gaveta','cod','produto'] (as que existirem em ambos), + 'lote' se `por_lote`.
+    Modos (ver MODOS):
+      - 'merge':    linha a linha; chave repetida dos dois lados gera o produto cartesiano
+      - 'agregado': agrega cada lado por chave antes (quantidades somadas, lotes e
+                    observações distintos juntados) e casa 1:1, com a diferença real por chave
+    Saída:
+      - quantidade_wms, quantidade_fisico, diferenca (fisico - wms)
+      - lote_wms, lote_fisico (ausentes quando o lote faz parte da chave)
+      - observacao_wms, observacao_fisico
+      - Status: 'OK' ou nomes das colunas divergentes ('quantidade','lote','observacao')
+                + marcações de presença via coluna _merge (left_only/right_only/both)
+      - Ordenação lógica por 'gaveta': rua/letra -> número -> sufixo
+    `progresso`, se informado, é chamado com a etapa atual ('merge', 'status', 'ordenando').
+    `particoes` (subconjunto de PARTICOES) divide as duas entradas por almoxarifado e/ou
+    rua e reconcilia as partes em paralelo em `workers` processos (ver _comparar_particionado).
+    """
+    avisa = progresso or (lambda etapa: None)
+
+    # garante colunas padrão e o esquema compacto (sem alterar os frames recebidos)
+    with medir("preparar"):
+        oficial = _preparar(oficial)
+        divergente = _preparar(divergente)
+    _validar_modo(modo)
+
+    keys = _chaves(oficial, divergente, por_lote)
+    if particoes:
+        return _comparar_particionado(oficial, divergente, keys, modo, particoes, workers, avisa)
+    return _reconciliar(_lado(oficial, keys, modo, "wms"), _lado(divergente, keys, modo, "fisico"), keys, avisa)
+
+# ----------------------------
+# Resumo (KPIs sem relatório)
+# ----------------------------
+
+def _numero_json(v: float) -> Any:
+    return int(v) if float(v).is_integer() else round(float(v), 4)
+
+
+def _codigos(col: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """(código por linha, valores distintos); categorias já vêm fatoradas. Ausente = -1."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), col.cat.categories.astype(object).to_numpy()
+    codigos, valores = pd.factorize(col.astype(object))
+    return codigos, np.asarray(valores, dtype=object)
+
+
+def resumir(df_out: pd.DataFrame, top: int = 10) -> Dict[str, Any]:
+    """
+    KPIs da saída do comparar, sem escrever relatório:
+      - linhas, divergencias (Status diferente de OK) e contagem por Status
+      - diferenca_abs (soma de |fisico - wms| nas linhas com os dois lados) e diferenca (líquida)
+      - ruas: as `top` com mais divergências (almoxarifado + rua, se houver a coluna)
+      - produtos: os `top` com maior soma de |diferenca| (cod + produto, somando as gavetas)
+    Um único groupby por (almoxarifado,) rua, cod, produto sobre o resultado; ruas e
+    produtos saem desse agrupado, que é pequeno.
+    """
+    with medir("resumir", linhas=len(df_out)):
+        status_cod, status_nomes = pd.factorize(df_out["Status"].astype(object))
+        contagem = np.bincount(status_cod[status_cod >= 0], minlength=len(status_nomes))
+        ok = np.flatnonzero(np.asarray(status_nomes, dtype=object) == "OK")
+        divergente = status_cod != (ok[0] if len(ok) else -2)
+
+        nw = _norm_qtd_vec(df_out["quantidade_wms"])
+        nf = _norm_qtd_vec(df_out["quantidade_fisico"])
+        with np.errstate(invalid="ignore"):
+            d = np.nan_to_num(nf - nw, nan=0.0)
+
+        # agrupa por códigos inteiros (texto só nas poucas linhas do resultado)
+        valores: Dict[str, np.ndarray] = {}
+        base: Dict[str, np.ndarray] = {}
+        ruas = ["almoxarifado", "rua"] if "almoxarifado" in df_out.columns else ["rua"]
+        for c in ruas[:-1] + ["cod", "produto"]:
+            base[c], valores[c] = _codigos(df_out[c])
+        gav, gavetas = _codigos(df_out["gaveta"])
+        rua_por_gaveta, valores["rua"] = pd.factorize(chaves_gaveta(pd.Series(gavetas, dtype=object))["letra"])
+        base["rua"] = np.where(gav >= 0, rua_por_gaveta[gav] if len(gavetas) else -1, -1)
+        base.update(
+            linhas=np.ones(len(df_out), dtype=np.int64),
+            divergencias=divergente.astype(np.int64),
+            diferenca=d,
+            diferenca_abs=np.abs(d),
+        )
+        g = pd.DataFrame(base).groupby(ruas + ["cod", "produto"], sort=False).sum().reset_index()
+
+        por_rua = g.groupby(ruas, sort=False)[["linhas", "divergencias", "diferenca_abs"]].sum().reset_index()
+        por_rua = por_rua[por_rua["divergencias"] > 0].sort_values(
+            ["divergencias", "diferenca_abs"], ascending=False, kind="stable").head(top)
+        por_produto = g.groupby(["cod", "produto"], sort=False)[
+            ["divergencias", "diferenca", "diferenca_abs"]].sum().reset_index()
+        por_produto = por_produto[por_produto["diferenca_abs"] > 0].nlargest(top, "diferenca_abs", keep="first")
+
+    def registros(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        return [
+            {k: (None if v < 0 else str(valores[k][v])) if k in valores else
+                (_numero_json(v) if isinstance(v, float) else int(v))
+             for k, v in linha.items()}
+            for linha in df.to_dict("records")
+        ]
+
+    return {
+        "linhas": int(len(df_out)),
+        "divergencias": int(divergente.sum()),
+        "status": {str(s): int(n) for s, n in sorted(zip(status_nomes, contagem), key=lambda x: -x[1])},
+        "diferenca_abs": _numero_json(np.abs(d).sum()),
+        "diferenca": _numero_json(d.sum()),
+        "ruas": registros(por_rua),
+        "produtos": registros(por_produto),
+    }
+
+# ----------------------------
+# Comparação particionada (almoxarifado / rua)
+# ----------------------------
+# Rua = letra de parse_gaveta, que só depende da gaveta: linhas que podem casar ficam na
+# mesma parte e o resultado é o mesmo do comparar() sem partições. Como a rua é o 1º
+# critério da ordem do relatório, juntar as partes em ordem de rua já dá a ordem final.
+#
+# Almoxarifado: a gaveta vem sem o prefixo do almoxarifado (2ZG-G61b -> G61b), então o
+# mesmo código aparece em almoxarifados diferentes e é o almoxarifado que separa um local
+# do outro. Cada linha vai para o almoxarifado da própria planilha; as que não o trazem
+# (em geral o físico inteiro) vão para o almoxarifado do outro lado com a mesma gaveta e
+# produto (ou, sem ele, a mesma gaveta), ver _rotear_almoxarifado. Na prática o
+# almoxarifado entra na chave: gaveta repetida em dois almoxarifados não casa entre eles.
+
+PARTICOES = ("almoxarifado", "rua")
+
+# PARTICOES_EXECUTOR=process (padrão) | thread; o pool é criado na 1ª comparação
+# particionada e reaproveitado (processos aquecidos, como no executor do server)
+PARTICOES_EXECUTOR = os.getenv("PARTICOES_EXECUTOR", "process")
+
+_pools_particoes: Dict[Tuple[str, int], Executor] = {}
+_pool_lock = threading.Lock()
+
+def _tipo_pool() -> str:
+    """
+    Dentro de um processo filho (worker do executor com EXECUTOR_TIPO=process) as partes
+    rodam em threads: um pool de processos aninhado deixa filhos vivos e o worker nunca sai.
+    """
+    if PARTICOES_EXECUTOR == "thread" or multiprocessing.parent_process() is not None:
+        return "thread"
+    return "process"
+
+def _pool(tipo: str, workers: int) -> Executor:
+    with _pool_lock:
+        pool = _pools_particoes.get((tipo, workers))
+        if pool is None:
+            if tipo == "thread":
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="particoes")
+            else:
+                # forkserver: o server tem threads (um fork copiaria locks presos) e o
+                # processo-modelo já sobe com este módulo (e o pandas) importado
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(["compare"])
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _pools_particoes[(tipo, workers)] = pool
+        return pool
+
+def _texto(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].astype(object).where(df[col].notna(), "").astype(str)
+
+def _rotear_almoxarifado(oficial: pd.DataFrame, divergente: pd.DataFrame) -> Tuple[pd.Series, pd.Series, int]:
+    """
+    Almoxarifado de cada linha dos dois lados: o da própria linha ou, sem ele, o do outro
+    lado com a mesma gaveta e produto (senão a mesma gaveta; havendo mais de um, o menor).
+    Devolve também quantas linhas ficaram sem almoxarifado nenhum (parte '').
+    """
+    proprios = [_texto(oficial, "almoxarifado"), _texto(divergente, "almoxarifado")]
+    gavetas = [_texto(oficial, "gaveta"), _texto(divergente, "gaveta")]
+    cods = [_texto(oficial, "cod"), _texto(divergente, "cod")]
+    out = []
+    for i in (0, 1):
+        almox = proprios[i]
+        sem = almox == ""
+        if sem.any():
+            # referência: linhas do outro lado com almoxarifado (o lado WMS primeiro)
+            outro = 1 - i
+            ref = pd.DataFrame({"gaveta": gavetas[outro], "cod": cods[outro], "almox": proprios[outro]})
+            ref = ref[ref["almox"] != ""].drop_duplicates().sort_values("almox")
+            por_produto = ref.drop_duplicates(["gaveta", "cod"]).set_index(["gaveta", "cod"])["almox"]
+            por_gaveta = ref.drop_duplicates("gaveta").set_index("gaveta")["almox"]
+            # por par distinto (gaveta, cod), não por linha
+            pares = pd.DataFrame({"gaveta": gavetas[i][sem], "cod": cods[i][sem]})
+            distintos = pares.drop_duplicates()
+            idx = pd.MultiIndex.from_frame(distintos)
+            achado = pd.Series(por_produto.reindex(idx).to_numpy(), index=idx)
+            faltam = achado.isna().to_numpy()
+            achado[faltam] = por_gaveta.reindex(distintos["gaveta"][faltam]).to_numpy()
+            rota = achado.fillna("")
+            almox = almox.copy()
+            almox[sem] = rota.reindex(pd.MultiIndex.from_frame(pares)).to_numpy()
+        out.append(almox)
+    sem_almox = int((out[0] == "").sum() + (out[1] == "").sum())
+    return out[0], out[1], sem_almox
+
+def _rotulos(df: pd.DataFrame, por: Sequence[str], almox: Optional[pd.Series]) -> List[pd.Series]:
+    """Colunas de partição de cada linha, na ordem de `por` (a rua calculada por gaveta distinta)."""
+    out = []
+    for p in por:
+        if p == "almoxarifado":
+            out.append(almox.rename(p))
+            continue
+        codigos, unicos = pd.factorize(df["gaveta"].astype(str))
+        valores = chaves_gaveta(pd.Series(unicos, dtype=object))["letra"].to_numpy(dtype=object)
+        out.append(pd.Series(valores[codigos] if len(unicos) else [], index=df.index, dtype=object, name=p))
+    return out
+
+def _so_usadas(df: pd.DataFrame) -> pd.DataFrame:
+    """Só as categorias usadas: a parte vai serializada para outro processo sem as do armazém todo."""
+    return df.apply(lambda s: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s)
+
+def _reconciliar_particao(left: pd.DataFrame, right: pd.DataFrame, keys: List[str], modo: str) -> pd.DataFrame:
+    """Uma tarefa do _comparar_particionado (função de módulo: roda num processo do pool)."""
+    return _reconciliar(_lado(left, keys, modo, "wms"), _lado(right, keys, modo, "fisico"), keys, lambda etapa: None)
+
+def _comparar_particionado(
+    oficial: pd.DataFrame,
+    divergente: pd.DataFrame,
+    keys: List[str],
+    modo: str,
+    por: Sequence[str],
+    workers: Optional[int],
+    avisa: Callable[[str], None],
+) -> pd.DataFrame:
+    """
+    comparar() dividido por almoxarifado e/ou rua. As partes (em ordem) são agrupadas em
+    tarefas contíguas de tamanho parecido, reconciliadas no pool e concatenadas. Com
+    'almoxarifado' o relatório sai agrupado por ele, com a coluna almoxarifado na frente.
+    """
+    desconhecidas = [p for p in por if p not in PARTICOES]
+    if desconhecidas:
+        raise ValueError(f"partição inválida: {', '.join(desconhecidas)} (use {', '.join(PARTICOES)})")
+    por = [p for p in PARTICOES if p in por]  # almoxarifado sempre por fora da rua
+    workers = max(1, workers or os.cpu_count() or 1)
+    tipo = _tipo_pool()
+
+    avisa("particionando")
+    with medir("particionar", linhas=len(oficial) + len(divergente)):
+        almox: List[Optional[pd.Series]] = [None, None]
+        if "almoxarifado" in por:
+            *almox, sem_almox = _rotear_almoxarifado(oficial, divergente)
+            if sem_almox:
+                logger.warning("Comparação particionada: %d linha(s) sem almoxarifado (parte '')", sem_almox)
+        grupos = []
+        for df, a in zip((oficial, divergente), almox):
+            g = df.groupby(_rotulos(df, por, a), sort=False).indices if len(df) else {}
+            grupos.append({k if isinstance(k, tuple) else (k,): v for k, v in g.items()})
+        partes = sorted(set(grupos[0]) | set(grupos[1]))
+        vazio = np.array([], dtype=np.intp)
+        tamanho = {k: len(grupos[0].get(k, vazio)) + len(grupos[1].get(k, vazio)) for k in partes}
+
+        # tarefas: partes contíguas até ~1/4 do que cabe a cada worker (equilibra ruas grandes
+        # e pequenas; com 1 worker, uma só); com almoxarifado, uma tarefa não mistura almoxarifados
+        total = sum(tamanho.values())
+        alvo = max(1, total // (workers * 4) if workers > 1 else total)
+        tarefas: List[List[Tuple[str, ...]]] = []
+        for k in partes:
+            if tarefas and tarefas[-1] and sum(tamanho[p] for p in tarefas[-1]) < alvo \
+                    and ("almoxarifado" not in por or tarefas[-1][-1][0] == k[0]):
+                tarefas[-1].append(k)
+            else:
+                tarefas.append([k])
+
+        colunas = keys + [c for c in ("quantidade", "lote", "observacao") if c not in keys]
+        enviar = _so_usadas if tipo == "process" and workers > 1 else (lambda df: df)
+        args = []
+        for tarefa in tarefas:
+            lados = []
+            for df, g in zip((oficial, divergente), grupos):
+                pos = np.concatenate([g.get(k, vazio) for k in tarefa])
+                lados.append(enviar(df[colunas].iloc[np.sort(pos)]))
+            args.append((lados[0], lados[1], keys, modo))
+
+    avisa("merge")
+    if workers == 1 or len(args) == 1:
+        saidas = [_reconciliar_particao(*a) for a in args]
     else:
-        df_out = df_out.sort_values(by=keys).reset_index(drop=True)
+        pool = _pool(tipo, workers)
+        if tipo == "thread":
+            saidas = [f.result() for f in [pool.submit(contextvars.copy_context().run, _reconciliar_particao, *a)
+                                           for a in args]]
+        else:
+            saidas = []
+            # medições feitas nos processos voltam com o resultado e entram no job atual
+            for f in [pool.submit(metricas.executar, _reconciliar_particao, a) for a in args]:
+                out, eventos = f.result()
+                for evento in eventos:
+                    metricas.registrar(evento)
+                saidas.append(out)
+
+    with medir("juntar_particoes", linhas=sum(len(s) for s in saidas)):
+        if "almoxarifado" in por:
+            saidas = [s.assign(almoxarifado=t[0][0]) for s, t in zip(saidas, tarefas)]
+        out = pd.concat(saidas, ignore_index=True) if saidas else _reconciliar_particao(
+            oficial[colunas].iloc[:0], divergente[colunas].iloc[:0], keys, modo)
+        # categorias diferentes em cada parte viram texto no concat: volta ao esquema compacto
+        for c in saidas[0].columns if saidas else []:
+            if isinstance(saidas[0][c].dtype, pd.CategoricalDtype) and not isinstance(out[c].dtype, pd.CategoricalDtype):
+                out[c] = out[c].astype("category")
+        if "almoxarifado" in por:
+            out = out[["almoxarifado"] + [c for c in out.columns if c != "almoxarifado"]]
+            out["almoxarifado"] = out["almoxarifado"].astype("category")
+        return out
+
+def comparar_many(
+    oficial: pd.DataFrame,
+    divergentes: Mapping[str, pd.DataFrame],
+    modo: str = "merge",
+    por_lote: bool = False,
+    workers: Optional[int] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Um WMS contra várias contagens físicas (ex.: uma por equipe): {nome: comparar(oficial, fisico)}.
+    O lado WMS é normalizado, agregado e renomeado uma vez só e compartilhado entre as
+    comparações, que rodam em paralelo em `workers` threads (padrão: uma por núcleo).
+    Threads e não processos: assim o WMS preparado não é serializado para cada contagem.
+    """
+    with medir("preparar"):
+        oficial = _preparar(oficial)
+    _validar_modo(modo)
+    # depois de _preparar todos os frames têm COLUNAS, então as chaves valem para todas as contagens
+    keys = _chaves(oficial, oficial, por_lote)
+    left = _lado(oficial, keys, modo, "wms")
+
+    def um(divergente: pd.DataFrame) -> pd.DataFrame:
+        with medir("preparar"):
+            divergente = _preparar(divergente)
+        right = _lado(divergente, keys, modo, "fisico")
+        return _reconciliar(left, right, keys, lambda etapa: None)
+
+    nomes = list(divergentes)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(nomes)))
+    if workers == 1:
+        return {n: um(divergentes[n]) for n in nomes}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="comparar") as pool:
+        # cada thread herda o contexto de quem chamou (as medições de metricas vão para o mesmo job)
+        futuros = [pool.submit(contextvars.copy_context().run, um, divergentes[n]) for n in nomes]
+        return {n: f.result() for n, f in zip(nomes, futuros)}
 
-    return df_out
\ No newline at end of file
+def consolidar(resultados: Mapping[str, pd.DataFrame], coluna: str = "equipe") -> pd.DataFrame:
+    """Saídas de comparar_many numa tabela só, com o nome de cada contagem na 1ª coluna."""
+    if not resultados:
+        return pd.DataFrame(columns=[coluna])
+    partes = [df.assign(**{coluna: nome}) for nome, df in resultados.items()]
+    out = pd.concat(partes, ignore_index=True)
+    out[coluna] = pd.Categorical(out[coluna], categories=list(resultados))
+    return out[[coluna] + [c for c in out.columns if c != coluna]]
@@ -0,0 +1,133 @@
+"""
+Camada de execução para o trabalho pesado (leitura, comparação, escrita do XLSX),
+fora do event loop do uvicorn.
+
+Tipos (EXECUTOR_TIPO):
+  - "thread":  ThreadPoolExecutor (padrão; sem custo de serialização)
+  - "process": ProcessPoolExecutor com workers aquecidos (pandas/openpyxl já importados)
+  - "inline":  roda no próprio event loop, como antes (útil para comparação/depuração)
+
+Admissão limitada: no máximo `workers + max_fila` jobs em andamento; acima disso
+`rodar` levanta Saturado (o server responde 503). Cada job tem timeout próprio.
+As medições por etapa feitas dentro do job (metricas.medir) voltam com o resultado
+e são publicadas no processo do server.
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+import asyncio
+import os
+import threading
+
+import metricas
+
+
+class Saturado(Exception):
+    """Fila de jobs cheia."""
+
+
+class JobTimeout(Exception):
+    """Job passou do tempo limite."""
+
+
+def _aquecer() -> None:
+    """Initializer dos processos: importa as dependências pesadas uma vez só."""
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    import compare  # noqa: F401
+    import relatorio  # noqa: F401
+
+
+def _nada() -> None:
+    return None
+
+
+class ExecutorPlanilhas:
+    def __init__(self, tipo: str = "thread", workers: Optional[int] = None,
+                 max_fila: int = 8, timeout: float = 300.0):
+        if tipo not in ("thread", "process", "inline"):
+            raise ValueError(f"EXECUTOR_TIPO inválido: {tipo}")
+        self.tipo = tipo
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_fila = max_fila
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        self._ativos = 0
+        self._lock = threading.Lock()
+        self.rejeitados = 0
+        self.timeouts = 0
+
+    @classmethod
+    def do_ambiente(cls) -> "ExecutorPlanilhas":
+        workers = os.getenv("EXECUTOR_WORKERS")
+        return cls(
+            tipo=os.getenv("EXECUTOR_TIPO", "thread"),
+            workers=int(workers) if workers else None,
+            max_fila=int(os.getenv("EXECUTOR_FILA", "8")),
+            timeout=float(os.getenv("EXECUTOR_TIMEOUT", "300")),
+        )
+
+    # ---- ciclo de vida ----
+
+    def iniciar(self) -> None:
+        """
+        Cria o pool; no modo process já sobe todos os workers, que se aquecem em segundo
+        plano (o startup do uvicorn, e cada restart do --reload, não espera os imports deles).
+        """
+        if self._pool is not None or self.tipo == "inline":
+            return
+        if self.tipo == "process":
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_aquecer)
+            for _ in range(self.workers):
+                self._pool.submit(_nada)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="planilhas")
+
+    def encerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ---- execução ----
+
+    def _liberar(self, _fut: Future) -> None:
+        with self._lock:
+            self._ativos -= 1
+
+    async def rodar(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Executa fn(*args) no pool respeitando fila e timeout."""
+        perfil = metricas.arquivo_perfil()
+        if self.tipo == "inline":
+            return self._publicar(metricas.executar(fn, args, perfil))
+        self.iniciar()
+        with self._lock:
+            if self._ativos >= self.workers + self.max_fila:
+                self.rejeitados += 1
+                raise Saturado()
+            self._ativos += 1
+        fut = self._pool.submit(metricas.executar, fn, args, perfil)
+        # o slot só é liberado quando o job termina de fato (thread/processo não é interrompido)
+        fut.add_done_callback(self._liberar)
+        try:
+            return self._publicar(await asyncio.wait_for(asyncio.wrap_future(fut), self.timeout))
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise JobTimeout()
+
+    @staticmethod
+    def _publicar(saida: Tuple[Any, List[metricas.Evento]]) -> Any:
+        out, eventos = saida
+        for evento in eventos:
+            metricas.publicar(evento)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tipo": self.tipo,
+                "workers": self.workers,
+                "max_fila": self.max_fila,
+                "ativos": self._ativos,
+                "rejeitados": self.rejeitados,
+                "timeouts": self.timeouts,
+            }
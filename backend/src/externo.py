@@ -0,0 +1,278 @@
+"""
+Comparação fora da memória (out-of-core), para entradas maiores que a RAM do worker.
+
+comparar() precisa dos dois DataFrames inteiros, do resultado do merge e da cópia
+ordenada ao mesmo tempo. comparar_externo() faz um sort-merge externo:
+
+  1. cada planilha é lida em blocos (carregar_planilha_blocos); cada bloco é
+     ordenado pela ordem do relatório (gaveta canônica de gaveta.py, cod, produto
+     [, lote]) e gravado em disco como um "run" (DataFrames pickle em sequência);
+  2. com runs demais, os de um mesmo lado são intercalados antes, no máximo
+     `fan_in` abertos de cada vez;
+  3. os runs dos dois lados são lidos juntos, em blocos pequenos, e cortados na
+     menor "última chave" dos buffers: o que fica abaixo dela já está completo em
+     todos os runs, então esse pedaço passa pelo mesmo _reconciliar do comparar()
+     e sai pronto, já na ordem final.
+
+A memória fica em torno de `linhas_run` linhas em cada fase, qualquer que seja o
+tamanho das entradas; só uma chave repetida em muitas linhas (que no modo merge
+gera o produto cartesiano) obriga a segurar o grupo inteiro.
+
+A saída tem as mesmas linhas e colunas do comparar(), em blocos e na mesma ordem;
+linhas empatadas na chave de ordenação podem trocar de lugar entre si (o
+sort_values do comparar também não fixa a ordem delas).
+"""
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from compare import COLUNAS, _chaves, _lado, _preparar, _reconciliar, _validar_modo, carregar_planilha_blocos
+from gaveta import chaves_gaveta
+from metricas import medir
+
+# linhas por run (memória de cada fase) e quantos runs ficam abertos ao mesmo tempo
+LINHAS_RUN = 200_000
+FAN_IN = 16
+
+
+def _vazio() -> pd.DataFrame:
+    return _preparar(pd.DataFrame({c: pd.Series([], dtype=object) for c in COLUNAS}))
+
+
+def _ordem(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Colunas que definem a ordem do relatório: (letra, número, sufixo) da gaveta, as
+    demais chaves como texto e a gaveta crua no fim ('A01' e 'A1' têm a mesma chave
+    canônica, mas não casam no merge: o desempate mantém cada uma contígua).
+    """
+    g = chaves_gaveta(df["gaveta"])
+    cols = {"_letra": g["letra"], "_numero": g["numero"], "_sufixo": g["sufixo"]}
+    for k in keys:
+        if k != "gaveta":
+            cols[k] = df[k].astype(str)
+    cols["_gaveta"] = df["gaveta"].astype(str)
+    return pd.DataFrame(cols, index=df.index)
+
+
+def _tuplas(ordem: pd.DataFrame) -> List[Tuple[Any, ...]]:
+    return list(zip(*(ordem[c].tolist() for c in ordem.columns)))
+
+
+def _ordenado(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    ordem = _ordem(df, keys).reset_index(drop=True)
+    pos = ordem.sort_values(list(ordem.columns), kind="stable").index.to_numpy()
+    return df.iloc[pos].reset_index(drop=True)
+
+
+def _juntar(partes: List[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat que mantém as colunas categóricas (união das categorias) em vez de virar object."""
+    if len(partes) == 1:
+        return partes[0]
+    dados = {}
+    for c in partes[0].columns:
+        cols = [p[c] for p in partes]
+        if all(isinstance(s.dtype, pd.CategoricalDtype) for s in cols):
+            dados[c] = union_categoricals(cols, ignore_order=True)
+        else:
+            dados[c] = pd.concat(cols, ignore_index=True)
+    return pd.DataFrame(dados)
+
+
+def _enxuto(df: pd.DataFrame) -> pd.DataFrame:
+    """Bloco com só as categorias usadas (senão cada bloco do run levaria as do run inteiro)."""
+    df = df.reset_index(drop=True)
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].cat.remove_unused_categories()
+    return df
+
+
+class _Run:
+    """Run ordenado em disco, lido bloco a bloco durante a intercalação."""
+
+    def __init__(self, caminho: str, lado: str, blocos: int):
+        self.caminho = caminho
+        self.lado = lado
+        self.blocos = blocos
+        self.buf: Optional[pd.DataFrame] = None
+        self.chaves: List[Tuple[Any, ...]] = []  # ordem de cada linha do buf
+        self._f = None
+        self._lidos = 0
+
+    @property
+    def fim(self) -> bool:
+        """Nada mais a ler do disco (o que restou está no buf)."""
+        return self._lidos == self.blocos
+
+    def abrir(self, keys: List[str]) -> None:
+        self._keys = keys
+        self._f = open(self.caminho, "rb")
+
+    def ler(self, minimo: int = 1) -> None:
+        """Acrescenta ao buf blocos do disco até ter `minimo` linhas a mais (ou acabar o run)."""
+        novos: List[pd.DataFrame] = []
+        lidas = 0
+        while lidas < minimo and not self.fim:
+            bloco = pickle.load(self._f)
+            self._lidos += 1
+            novos.append(bloco)
+            lidas += len(bloco)
+        if not novos:
+            return
+        novo = _juntar(novos)
+        # o resto do buf ainda leva as categorias das linhas já tiradas: sem enxugar, cresceriam com o run
+        self.buf = novo if not self.chaves else _juntar([_enxuto(self.buf), novo])
+        self.chaves += _tuplas(_ordem(novo, self._keys))
+
+    def tirar(self, n: int) -> pd.DataFrame:
+        parte, self.buf = self.buf.iloc[:n], self.buf.iloc[n:].reset_index(drop=True)
+        del self.chaves[:n]
+        return parte
+
+    def fechar(self, apagar: bool = False) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if apagar:
+            os.remove(self.caminho)
+
+
+def _gravar_run(blocos: Iterable[pd.DataFrame], pasta: str, lado: str, linhas_bloco: int) -> _Run:
+    """Grava DataFrames já em ordem como um run, em blocos de até `linhas_bloco` linhas."""
+    fd, caminho = tempfile.mkstemp(suffix=".run", dir=pasta)
+    n = 0
+    with os.fdopen(fd, "wb") as f:
+        for df in blocos:
+            for i in range(0, len(df), linhas_bloco):
+                pickle.dump(_enxuto(df.iloc[i:i + linhas_bloco]), f, pickle.HIGHEST_PROTOCOL)
+                n += 1
+    return _Run(caminho, lado, n)
+
+
+def _intercalar(runs: List[_Run], keys: List[str], linhas: int) -> Iterator[List[Tuple[str, pd.DataFrame]]]:
+    """
+    Fatias sucessivas dos runs em ordem crescente: cada uma é [(lado, linhas), ...] com
+    todas as linhas de todos os runs cujas chaves caem entre o corte anterior e o atual.
+    Cada run lê do disco `linhas` / len(runs) linhas por vez; fatias de até ~`linhas` linhas.
+    """
+    por_run = max(1, linhas // max(1, len(runs)))
+    for r in runs:
+        r.abrir(keys)
+    try:
+        while True:
+            for r in runs:
+                if not r.chaves and not r.fim:
+                    r.ler(por_run)
+            vivos = [r for r in runs if r.chaves]
+            if not vivos:
+                return
+            # entradas já ordenadas (o relatório do WMS vem por gaveta) dão runs de faixas
+            # disjuntas e só o de menor faixa avançaria: ele lê mais até a fatia ter ~`linhas`
+            while sum(len(r.chaves) for r in vivos) < linhas:
+                abertos = [r for r in vivos if not r.fim]
+                if not abertos:
+                    break
+                min(abertos, key=lambda r: r.chaves[-1]).ler(por_run)
+            # runs ainda com blocos no disco limitam o corte: acima da última chave
+            # lida de cada um pode haver mais linhas por vir
+            ultimas = [r.chaves[-1] for r in vivos if not r.fim]
+            if not ultimas:
+                yield [(r.lado, r.tirar(len(r.chaves))) for r in vivos]
+                continue
+            corte = min(ultimas)
+            n = [bisect_left(r.chaves, corte) for r in vivos]
+            if not any(n):
+                # o buffer que define o corte é todo da mesma chave: lê mais para achar o fim do grupo
+                for r in vivos:
+                    if not r.fim and r.chaves[-1] == corte:
+                        r.ler(por_run)
+                continue
+            yield [(r.lado, r.tirar(k)) for r, k in zip(vivos, n) if k]
+    finally:
+        for r in runs:
+            r.fechar()
+
+
+def _reduzir(runs: List[_Run], keys: List[str], pasta: str, fan_in: int, linhas_run: int,
+             linhas_bloco: int) -> List[_Run]:
+    """Intercala runs de um mesmo lado, `fan_in` por vez, até no máximo `fan_in` no total."""
+    lados = {"wms": [r for r in runs if r.lado == "wms"], "fisico": [r for r in runs if r.lado == "fisico"]}
+    while len(lados["wms"]) + len(lados["fisico"]) > fan_in:
+        lado = max(lados, key=lambda k: len(lados[k]))
+        grupo, lados[lado] = lados[lado][:fan_in], lados[lado][fan_in:]
+        with medir("intercalar") as m:
+            fatias = (_ordenado(_juntar([p for _, p in fatia]), keys) for fatia in _intercalar(grupo, keys, linhas_run))
+            novo = _gravar_run(fatias, pasta, lado, linhas_bloco)
+            m["bytes"] = os.path.getsize(novo.caminho)
+        for r in grupo:
+            r.fechar(apagar=True)
+        lados[lado].append(novo)
+    return lados["wms"] + lados["fisico"]
+
+
+def _blocos(fonte, linhas: int) -> Iterator[pd.DataFrame]:
+    """Planilha (caminho/buffer, lida em blocos) ou DataFrame já carregado, em pedaços de `linhas`."""
+    if isinstance(fonte, pd.DataFrame):
+        df = _preparar(fonte)
+        for i in range(0, len(df), linhas):
+            yield df.iloc[i:i + linhas]
+    else:
+        yield from carregar_planilha_blocos(fonte, linhas)
+
+
+def comparar_externo(
+    oficial,
+    divergente,
+    modo: str = "merge",
+    por_lote: bool = False,
+    progresso: Optional[Callable[[str], None]] = None,
+    linhas_run: int = LINHAS_RUN,
+    fan_in: int = FAN_IN,
+    pasta: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    comparar() em memória limitada: devolve o relatório em DataFrames sucessivos, já
+    na ordem final, para ir direto a um escritor em streaming (relatorio.escrever_xlsx_blocos).
+    `oficial`/`divergente` são caminhos ou buffers de planilha (ou DataFrames).
+    Os runs ficam num diretório temporário em `pasta`, apagado no fim (ou se o consumo parar antes).
+    `progresso` recebe 'runs' (lendo e gravando os runs) e 'intercalando' (merge e escrita).
+    """
+    _validar_modo(modo)
+    avisa = progresso or (lambda etapa: None)
+    fan_in = max(2, fan_in)
+    linhas_bloco = max(1000, linhas_run // fan_in)
+    vazio = _vazio()
+    keys = _chaves(vazio, vazio, por_lote)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="externo-", dir=pasta) as tmp:
+        avisa("runs")
+        runs: List[_Run] = []
+        for fonte, lado in ((oficial, "wms"), (divergente, "fisico")):
+            for bloco in _blocos(fonte, linhas_run):
+                if len(bloco):
+                    with medir("run", linhas=len(bloco)) as m:
+                        runs.append(_gravar_run([_ordenado(bloco, keys)], tmp, lado, linhas_bloco))
+                        m["bytes"] = os.path.getsize(runs[-1].caminho)
+        runs = _reduzir(runs, keys, tmp, fan_in, linhas_run, linhas_bloco)
+
+        avisa("intercalando")
+        saiu = False
+        for fatia in _intercalar(runs, keys, linhas_run):
+            left = [p for lado, p in fatia if lado == "wms"]
+            right = [p for lado, p in fatia if lado == "fisico"]
+            saiu = True
+            yield _reconciliar(
+                _lado(_juntar(left) if left else vazio, keys, modo, "wms"),
+                _lado(_juntar(right) if right else vazio, keys, modo, "fisico"),
+                keys, lambda etapa: None,
+            )
+        if not saiu:  # entradas vazias: ainda assim um bloco, para o relatório ter cabeçalho
+            yield _reconciliar(_lado(vazio, keys, modo, "wms"), _lado(vazio, keys, modo, "fisico"),
+                               keys, lambda etapa: None)
@@ -0,0 +1,101 @@
+"""
+Parser único de localização de gaveta ('2ZG-G61b' -> 'G61b' -> ('G', 61, 'b')).
+
+Usado pelo carregador (extração do local), pela ordenação do relatório em
+comparar() e pela lista do /blind-template, para que todos concordem na ordem.
+As versões vetorizadas trabalham sobre os códigos distintos (um armazém tem bem
+menos gavetas que linhas) e espalham o resultado de volta pelas linhas.
+"""
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+import re
+
+import numpy as np
+import pandas as pd
+
+_RX_GAVETA = re.compile(r"([A-Za-z]+)(\d+)([A-Za-z]*)")
+
+
+def extrai_local(ocupacao: str) -> str:
+    """
+    Recebe strings como '2ZG-G61b' e devolve somente 'G61b'
+    (pega a parte após o último '-').
+    """
+    s = str(ocupacao).strip()
+    if "-" in s:
+        return s.split("-")[-1].strip()
+    return s  # fallback
+
+
+def extrai_local_vec(col: pd.Series) -> pd.Series:
+    """extrai_local para a coluna inteira."""
+    return col.astype(str).str.strip().str.rsplit("-", n=1).str[-1].str.strip()
+
+
+@lru_cache(maxsize=65536)
+def parse_gaveta(val) -> Tuple[str, int, str]:
+    """
+    Converte 'A2b' -> ('A', 2, 'b') para ordenar por rua/letra, número e sufixo.
+    Se não casar, retorna fallback que mantém estável.
+    """
+    v = "" if val is None else str(val)
+    m = _RX_GAVETA.match(v)
+    if not m:
+        return (v.upper(), -1, "")
+    letra, numero, sufixo = m.groups()
+    return (letra.upper(), int(numero), sufixo.lower())
+
+
+def chaves_gaveta(col: pd.Series) -> pd.DataFrame:
+    """
+    Colunas tipadas (letra, numero, sufixo) equivalentes a parse_gaveta, uma por linha.
+    O parse roda só nos valores distintos.
+    """
+    codigos, unicos = pd.factorize(col.astype(object).where(col.notna(), "nan"))
+    u = pd.Series(unicos, dtype=object).astype(str)
+    m = u.str.extract(r"^([A-Za-z]+)(\d+)([A-Za-z]*)")
+    ok = m[0].notna().to_numpy()
+
+    letra = np.where(ok, m[0].str.upper(), u.str.upper()).astype(object)
+    numero = np.full(len(u), -1, dtype=np.int64)
+    if ok.any():
+        # int() do Python para manter exatamente a regra de parse_gaveta
+        numero[ok] = [int(x) for x in m.loc[ok, 1]]
+    sufixo = np.where(ok, m[2].fillna("").str.lower(), "").astype(object)
+
+    return pd.DataFrame({
+        "letra": letra[codigos],
+        "numero": numero[codigos],
+        "sufixo": sufixo[codigos],
+    }, index=col.index)
+
+
+def rank_gaveta(col: pd.Series) -> np.ndarray:
+    """
+    Posição (densa) de cada gaveta na ordem rua/letra -> número -> sufixo.
+    Gavetas com a mesma chave (ex.: 'A01' e 'A1') recebem o mesmo rank.
+    """
+    codigos, unicos = pd.factorize(col.astype(object).where(col.notna(), "nan"))
+    chaves = chaves_gaveta(pd.Series(unicos, dtype=object))
+    rank = chaves.groupby(["letra", "numero", "sufixo"], sort=True).ngroup().to_numpy()
+    return rank[codigos]
+
+
+def ordenar_df(df: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    """
+    sort_values(by) com 'gaveta' ordenada pela chave canônica (rank pré-calculado),
+    mantendo as demais colunas de `by` como desempate.
+    """
+    if "gaveta" not in by:
+        return df.sort_values(by=list(by)).reset_index(drop=True)
+    tmp = df.assign(_rank_gaveta=rank_gaveta(df["gaveta"]))
+    ordem = ["_rank_gaveta" if c == "gaveta" else c for c in by]
+    return tmp.sort_values(by=ordem).drop(columns="_rank_gaveta").reset_index(drop=True)
+
+
+def ordenar_gavetas(gavetas: Iterable[str]) -> List[str]:
+    """Lista de gavetas na ordem canônica (estável para chaves iguais)."""
+    s = pd.Series(list(gavetas), dtype=object)
+    if s.empty:
+        return []
+    return s.iloc[np.argsort(rank_gaveta(s), kind="stable")].tolist()
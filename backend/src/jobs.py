@@ -0,0 +1,141 @@
+"""
+Store local dos jobs assíncronos de comparação (SQLite + arquivos em DATA_DIR/jobs).
+
+Cada job guarda status, etapa atual e progresso; o resultado (XLSX) fica em disco
+até `expira`. O acesso abre uma conexão por operação, então pode ser usado tanto
+pelo event loop quanto pelos workers do executor (threads ou processos).
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+# etapa -> progresso aproximado (0..1)
+ETAPAS = {
+    "na_fila": 0.0,
+    "lendo": 0.1,
+    "runs": 0.2,           # modo externo: leitura em blocos e runs ordenados
+    "intercalando": 0.5,   # modo externo: merge dos runs já gravando o XLSX
+    "particionando": 0.3,
+    "merge": 0.4,
+    "status": 0.55,
+    "ordenando": 0.65,
+    "sugerindo": 0.7,     # ?sugestoes=1: pares aproximados entre as órfãs
+    "escrevendo": 0.75,
+    "concluido": 1.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    status TEXT NOT NULL,          -- pendente | rodando | concluido | erro
+    etapa TEXT NOT NULL,
+    progresso REAL NOT NULL,
+    entradas TEXT,                 -- json: nomes dos arquivos enviados
+    resumo TEXT,                   -- json: linhas e contagem por Status
+    erro TEXT,
+    arquivo TEXT,
+    criado REAL NOT NULL,
+    atualizado REAL NOT NULL,
+    expira REAL NOT NULL
+)
+"""
+
+
+class JobStore:
+    def __init__(self, diretorio: str, ttl: float):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.db = os.path.join(diretorio, "jobs.sqlite3")
+        os.makedirs(diretorio, exist_ok=True)
+        with self._con() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(_SCHEMA)
+
+    @contextmanager
+    def _con(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.db, timeout=30)
+        con.row_factory = sqlite3.Row
+        try:
+            with con:  # commit/rollback
+                yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _dict(row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        d["entradas"] = json.loads(d["entradas"]) if d["entradas"] else []
+        d["resumo"] = json.loads(d["resumo"]) if d["resumo"] else None
+        d.pop("arquivo", None)
+        return d
+
+    def caminho_resultado(self, job_id: str) -> str:
+        return os.path.join(self.diretorio, f"{job_id}.xlsx")
+
+    def criar(self, tipo: str, entradas: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        agora = time.time()
+        with self._con() as con:
+            con.execute(
+                "INSERT INTO jobs (id, tipo, status, etapa, progresso, entradas, criado, atualizado, expira)"
+                " VALUES (?, ?, 'pendente', 'na_fila', 0, ?, ?, ?, ?)",
+                (job_id, tipo, json.dumps(entradas), agora, agora, agora + self.ttl),
+            )
+        return job_id
+
+    def etapa(self, job_id: str, etapa: str) -> None:
+        with self._con() as con:
+            con.execute(
+                "UPDATE jobs SET status='rodando', etapa=?, progresso=?, atualizado=? WHERE id=?",
+                (etapa, ETAPAS.get(etapa, 0.0), time.time(), job_id),
+            )
+
+    def concluir(self, job_id: str, arquivo: str, resumo: Optional[Dict[str, Any]] = None) -> None:
+        with self._con() as con:
+            con.execute(
+                "UPDATE jobs SET status='concluido', etapa='concluido', progresso=1, arquivo=?, resumo=?,"
+                " atualizado=? WHERE id=?",
+                (arquivo, json.dumps(resumo) if resumo else None, time.time(), job_id),
+            )
+
+    def falhar(self, job_id: str, erro: str) -> None:
+        with self._con() as con:
+            con.execute(
+                "UPDATE jobs SET status='erro', erro=?, atualizado=? WHERE id=?",
+                (erro, time.time(), job_id),
+            )
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._con() as con:
+            row = con.execute("SELECT * FROM jobs WHERE id=? AND expira > ?", (job_id, time.time())).fetchone()
+        return self._dict(row) if row else None
+
+    def arquivo(self, job_id: str) -> Optional[str]:
+        with self._con() as con:
+            row = con.execute(
+                "SELECT arquivo FROM jobs WHERE id=? AND status='concluido' AND expira > ?", (job_id, time.time())
+            ).fetchone()
+        return row["arquivo"] if row and row["arquivo"] and os.path.exists(row["arquivo"]) else None
+
+    def listar(self, limite: int = 50) -> List[Dict[str, Any]]:
+        with self._con() as con:
+            rows = con.execute(
+                "SELECT * FROM jobs WHERE expira > ? ORDER BY criado DESC LIMIT ?", (time.time(), limite)
+            ).fetchall()
+        return [self._dict(r) for r in rows]
+
+    def expirar(self) -> int:
+        """Apaga jobs vencidos e seus arquivos; devolve quantos saíram."""
+        agora = time.time()
+        with self._con() as con:
+            rows = con.execute("SELECT id, arquivo FROM jobs WHERE expira <= ?", (agora,)).fetchall()
+            for r in rows:
+                if r["arquivo"] and os.path.exists(r["arquivo"]):
+                    os.remove(r["arquivo"])
+            con.execute("DELETE FROM jobs WHERE expira <= ?", (agora,))
+        return len(rows)
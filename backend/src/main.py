@@ -1,98 +1,223 @@
-import os
+"""
+CLI da comparação (e a API antiga, em main:app).
+
+    python main.py                                  # data/planilha_oficial.xlsx x data/planilha_divergente.xlsx
+    python main.py --oficial wms.xlsx --divergente fisico.xlsx --saida relatorio.xlsx
+    python main.py --manifesto pares.csv            # vários pares num processo só
+
+pandas, openpyxl e FastAPI só são importados quando usados: `--help` e erro de
+argumento respondem na hora e o CLI não paga o import do FastAPI. Com --manifesto
+o import e a leitura de cada planilha (ex.: o mesmo WMS para vários locais) são
+pagos uma vez para o lote inteiro.
+
+Manifesto: CSV (vírgula, ponto e vírgula ou tab) com cabeçalho oficial,divergente
+e, opcional, saida; caminhos relativos ao próprio manifesto ("-" lê da entrada
+padrão, relativos à pasta atual). Sem saida, o relatório vai ao lado do divergente
+(<nome>_comparacao.xlsx). A extensão da saída escolhe o formato (xlsx, csv, ndjson
+ou parquet, ver relatorio.escrever_blocos).
+"""
+import argparse
+import csv
 import io
-from openpyxl import load_workbook
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
-import pandas as pd
-from compare import carregar_planilha, comparar
-from blank import gerar_em_branco
-
-app = FastAPI(title="InventoryAutomation API")
-
-DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def df_to_xlsx_bytes(df: pd.DataFrame) -> bytes:
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as w:
-        df.to_excel(w, index=False, sheet_name="relatorio")
-    buf.seek(0)
-    return buf.read()
-
-@app.post("/compare")
-async def compare_endpoint(wms: UploadFile = File(...), fisico: UploadFile = File(...)):
-    if not (wms.filename and fisico.filename):
-        raise HTTPException(status_code=400, detail="Arquivos inválidos")
-
-    wms_path   = os.path.join(DATA_DIR, "wms_upload.xlsx")
-    fis_path   = os.path.join(DATA_DIR, "fisico_upload.xlsx")
-
-    with open(wms_path, "wb") as f:
-        f.write(await wms.read())
-    with open(fis_path, "wb") as f:
-        f.write(await fisico.read())
-
-    df_wms  = carregar_planilha(wms_path)
-    df_fis  = carregar_planilha(fis_path)
-    result  = comparar(df_wms, df_fis)
-
-    bytes_xlsx = df_to_xlsx_bytes(result)
-    return StreamingResponse(
-        io.BytesIO(bytes_xlsx),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": 'attachment; filename="relatorio_comparacao.xlsx"'}
-    )
-    
-@app.post("/blank")
-async def blank_endpoint(wms: UploadFile = File(...)):
-    if not wms.filename:
-        raise HTTPException(status_code=400, detail="Arquivo inválido")
-    wms_path = os.path.join(DATA_DIR, "wms_upload.xlsx")
-    with open(wms_path, "wb") as f:
-        f.write(await wms.read())
-
-    df_blank = gerar_em_branco(wms_path)
-    bytes_xlsx = df_to_xlsx_bytes(df_blank)
-    return StreamingResponse(
-        io.BytesIO(bytes_xlsx),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": 'attachment; filename="relatorio_em_branco.xlsx"'}
-    )
-
-def ajustar_largura_colunas(path_xlsx):
-    wb = load_workbook(path_xlsx)
-    ws = wb.active
-    for col in ws.columns:
-        max_len = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            val = "" if cell.value is None else str(cell.value)
-            max_len = max(max_len, len(val))
-        ws.column_dimensions[col_letter].width = max_len + 2
-    wb.save(path_xlsx)
-
-def load_data():
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
-    # >>> ajuste os nomes dos arquivos aqui <<<
-    oficial_path  = os.path.join(base_dir, 'planilha_oficial.xlsx')      # a sua planilha oficial (relatório)
-    fisico_path   = os.path.join(base_dir, 'planilha_divergente.xlsx')   # contagem física
-    oficial = carregar_planilha(oficial_path)
-    fisico  = carregar_planilha(fisico_path)
-    return oficial, fisico
-
-def main():
-    oficial, fisico = load_data()
-    resultado = comparar(oficial, fisico)
-
-    out_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
-    os.makedirs(out_dir, exist_ok=True)
-    out_xlsx = os.path.join(out_dir, 'relatorio_auditoria_comparacao.xlsx')
-
-    with pd.ExcelWriter(out_xlsx, engine='openpyxl', mode='w') as writer:
-        resultado.to_excel(writer, index=False, sheet_name='comparacao')
-
-    ajustar_largura_colunas(out_xlsx)
-    print(f"Relatório gerado: {out_xlsx}")
+import os
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+
+
+def df_to_xlsx_bytes(df: "pd.DataFrame") -> bytes:
+    from relatorio import escrever_xlsx
+
+    return escrever_xlsx(df, sheet_name="relatorio", largura=None, centralizar=False).getvalue()
+
+
+def _criar_app():
+    from fastapi import FastAPI, UploadFile, File, HTTPException
+    from fastapi.responses import StreamingResponse
+    from compare import carregar_planilha, comparar
+    from blank import gerar_em_branco
+
+    app = FastAPI(title="InventoryAutomation API")
+
+    @app.post("/compare")
+    async def compare_endpoint(wms: UploadFile = File(...), fisico: UploadFile = File(...)):
+        if not (wms.filename and fisico.filename):
+            raise HTTPException(status_code=400, detail="Arquivos inválidos")
+
+        # UploadFile.file já é um SpooledTemporaryFile da própria requisição (memória até
+        # o limite do Starlette, depois disco): lido direto, sem caminho compartilhado
+        df_wms  = carregar_planilha(wms.file)
+        df_fis  = carregar_planilha(fisico.file)
+        result  = comparar(df_wms, df_fis)
+
+        bytes_xlsx = df_to_xlsx_bytes(result)
+        return StreamingResponse(
+            io.BytesIO(bytes_xlsx),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="relatorio_comparacao.xlsx"'}
+        )
+
+    @app.post("/blank")
+    async def blank_endpoint(wms: UploadFile = File(...)):
+        if not wms.filename:
+            raise HTTPException(status_code=400, detail="Arquivo inválido")
+        df_blank = gerar_em_branco(wms.file)
+        bytes_xlsx = df_to_xlsx_bytes(df_blank)
+        return StreamingResponse(
+            io.BytesIO(bytes_xlsx),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="relatorio_em_branco.xlsx"'}
+        )
+
+    return app
+
+
+def __getattr__(nome: str):
+    # main:app (uvicorn) monta a API na 1ª vez que é pedida, não no import do CLI
+    if nome == "app":
+        app = globals()["app"] = _criar_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+# ----------------------------
+# Lote (--manifesto)
+# ----------------------------
+
+Par = Tuple[str, str, str]  # oficial, divergente, saida
+
+
+def _saida_padrao(divergente: str) -> str:
+    return os.path.splitext(divergente)[0] + "_comparacao.xlsx"
+
+
+def ler_manifesto(caminho: str) -> List[Par]:
+    """Pares (oficial, divergente, saida) do manifesto, com caminhos absolutos."""
+    if caminho == "-":
+        texto, base = sys.stdin.read(), os.getcwd()
+    else:
+        with open(caminho, encoding="utf-8-sig", newline="") as f:
+            texto = f.read()
+        base = os.path.dirname(os.path.abspath(caminho))
+    try:
+        dialeto = csv.Sniffer().sniff(texto.split("\n", 1)[0], delimiters=",;\t")
+    except csv.Error:
+        dialeto = csv.excel
+    linhas = csv.DictReader(io.StringIO(texto), dialect=dialeto)
+    colunas = [c.strip().lower() for c in (linhas.fieldnames or [])]
+    if not {"oficial", "divergente"} <= set(colunas):
+        raise ValueError(f"manifesto sem as colunas oficial e divergente: {caminho}")
+    linhas.fieldnames = colunas
+
+    pares: List[Par] = []
+    for linha in linhas:
+        oficial, divergente = (linha.get("oficial") or "").strip(), (linha.get("divergente") or "").strip()
+        if not oficial and not divergente:
+            continue
+        if not (oficial and divergente):
+            raise ValueError(f"manifesto, linha {linhas.line_num}: oficial e divergente são obrigatórios")
+        oficial, divergente = (os.path.join(base, p) for p in (oficial, divergente))
+        saida = (linha.get("saida") or "").strip()
+        pares.append((oficial, divergente, os.path.join(base, saida) if saida else _saida_padrao(divergente)))
+    return pares
+
+
+def _formato(saida: str) -> str:
+    from relatorio import FORMATOS
+
+    formato = os.path.splitext(saida)[1].lstrip(".").lower() or "xlsx"
+    if formato not in FORMATOS:
+        raise ValueError(f"extensão de saída não suportada: {saida} (use {', '.join(FORMATOS)})")
+    return formato
+
+
+def _escrever(df: "pd.DataFrame", saida: str) -> None:
+    from relatorio import escrever_blocos, escrever_xlsx, largura_justa
+
+    formato = _formato(saida)
+    pasta = os.path.dirname(saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    if formato == "xlsx":
+        # largura das colunas calculada na própria escrita (sem reabrir o arquivo)
+        escrever_xlsx(df, saida, sheet_name='comparacao', largura=largura_justa, centralizar=False)
+    else:
+        escrever_blocos([df], formato, saida)
+
+
+def comparar_lote(pares: Sequence[Par], modo: str = "merge", por_lote: bool = False) -> int:
+    """
+    Compara e grava cada par, imprimindo uma linha por par; devolve quantos falharam
+    (um par com erro não interrompe os demais). Cada planilha oficial é lida uma vez
+    e fica em memória só enquanto algum par restante ainda a usa.
+    """
+    from compare import carregar_planilha, comparar
+
+    restantes: Dict[str, int] = {}
+    for oficial, _, _ in pares:
+        restantes[oficial] = restantes.get(oficial, 0) + 1
+    lidas: Dict[str, "pd.DataFrame"] = {}
+    falhas = 0
+    t_lote = time.perf_counter()
+    for i, (oficial, divergente, saida) in enumerate(pares, start=1):
+        t0 = time.perf_counter()
+        try:
+            _formato(saida)  # extensão errada falha antes de ler e comparar
+            if oficial not in lidas:
+                lidas[oficial] = carregar_planilha(oficial)
+            resultado = comparar(lidas[oficial], carregar_planilha(divergente), modo=modo, por_lote=por_lote)
+            _escrever(resultado, saida)
+            divergencias = int((resultado["Status"] != "OK").sum())
+            print(f"[{i}/{len(pares)}] ok     {saida}  ({len(resultado)} linhas, {divergencias} divergências, "
+                  f"{time.perf_counter() - t0:.2f}s)")
+        except Exception as e:
+            falhas += 1
+            print(f"[{i}/{len(pares)}] ERRO   {divergente}: {e}", file=sys.stderr)
+        finally:
+            restantes[oficial] -= 1
+            if not restantes[oficial]:
+                lidas.pop(oficial, None)
+    print(f"{len(pares) - falhas}/{len(pares)} pares em {time.perf_counter() - t_lote:.2f}s")
+    return falhas
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--oficial", default=os.path.join(DATA_DIR, "planilha_oficial.xlsx"),
+                    help="relatório do WMS (padrão: data/planilha_oficial.xlsx)")
+    ap.add_argument("--divergente", default=os.path.join(DATA_DIR, "planilha_divergente.xlsx"),
+                    help="contagem física (padrão: data/planilha_divergente.xlsx)")
+    ap.add_argument("--saida", default=os.path.join(DATA_DIR, "relatorio_auditoria_comparacao.xlsx"),
+                    help="relatório gerado; a extensão escolhe o formato")
+    ap.add_argument("--manifesto", help="CSV com oficial,divergente[,saida]: vários pares de uma vez ('-' = stdin)")
+    ap.add_argument("--modo", choices=("merge", "agregado"), default="merge")
+    ap.add_argument("--por-lote", action="store_true", help="inclui o lote na chave de comparação")
+    args = ap.parse_args(argv)
+
+    if args.manifesto:
+        try:
+            pares = ler_manifesto(args.manifesto)
+        except (OSError, ValueError) as e:
+            ap.error(str(e))
+        return 1 if comparar_lote(pares, args.modo, args.por_lote) else 0
+
+    try:
+        _formato(args.saida)
+    except ValueError as e:
+        ap.error(str(e))
+    from compare import carregar_planilha, comparar
+
+    resultado = comparar(carregar_planilha(args.oficial), carregar_planilha(args.divergente),
+                         modo=args.modo, por_lote=args.por_lote)
+    _escrever(resultado, args.saida)
+    print(f"Relatório gerado: {args.saida}")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
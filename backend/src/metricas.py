@@ -0,0 +1,193 @@
+"""
+Instrumentação leve por etapa (upload, carregar, merge, status, ordenar, xlsx...).
+
+`medir("etapa")` cronometra um bloco e registra, se informados, linhas e bytes.
+Cada medição vai para histogramas em memória (expostos em formato Prometheus
+pelo /metrics) e para a lista da requisição atual, de onde o server monta o
+header Server-Timing.
+
+Jobs no executor rodam em outra thread ou processo: `executar` coleta as medições
+no worker e as devolve junto com o resultado, e quem chamou as publica aqui
+(no modo process os histogramas do filho nunca seriam lidos). Com `perfil`,
+o job roda sob cProfile e as estatísticas vão para esse arquivo.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import cProfile
+import io
+import os
+import pstats
+import shutil
+import threading
+import time
+import uuid
+
+Evento = Dict[str, Any]  # {"etapa", "segundos", "linhas"?, "bytes"?}
+
+# medições do job em andamento num worker (devolvidas por `executar`)
+_worker: ContextVar[Optional[List[Evento]]] = ContextVar("metricas_worker", default=None)
+# medições da requisição HTTP atual (Server-Timing)
+_requisicao: ContextVar[Optional[List[Evento]]] = ContextVar("metricas_requisicao", default=None)
+# pasta onde os jobs da requisição atual gravam o cProfile (None = sem perfil)
+_perfil: ContextVar[Optional[str]] = ContextVar("metricas_perfil", default=None)
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, limites: Sequence[float], rotulos: Tuple[str, ...]):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = list(limites)
+        self.rotulos = rotulos
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # rótulos -> [contagem por faixa..., soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *rotulos: str) -> None:
+        i = bisect_left(self.limites, valor)  # faixa "le" = primeiro limite >= valor
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [0.0] * (len(self.limites) + 2)
+            serie[i] += 1
+            serie[-1] += valor
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for rotulos, serie in series:
+            base = ",".join(f'{n}="{v}"' for n, v in zip(self.rotulos, rotulos))
+            sep = "," if base else ""
+            acumulado = 0.0
+            for limite, n in zip(self.limites + [float("inf")], serie[:-1]):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else repr(float(limite))
+                linhas.append(f'{self.nome}_bucket{{{base}{sep}le="{le}"}} {acumulado:.0f}')
+            linhas.append(f"{self.nome}_sum{{{base}}} {serie[-1]!r}")
+            linhas.append(f"{self.nome}_count{{{base}}} {acumulado:.0f}")
+        return linhas
+
+
+ETAPA_SEGUNDOS = Histograma(
+    "planilhas_etapa_segundos", "Duração de cada etapa do processamento",
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120], ("etapa",),
+)
+ETAPA_LINHAS = Histograma(
+    "planilhas_etapa_linhas", "Linhas processadas por etapa",
+    [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000], ("etapa",),
+)
+ETAPA_BYTES = Histograma(
+    "planilhas_etapa_bytes", "Bytes lidos ou gravados por etapa",
+    [10**4, 10**5, 10**6, 10**7, 10**8, 10**9], ("etapa",),
+)
+HTTP_SEGUNDOS = Histograma(
+    "http_requisicao_segundos", "Duração das requisições HTTP",
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120], ("metodo", "rota", "status"),
+)
+HISTOGRAMAS = [ETAPA_SEGUNDOS, ETAPA_LINHAS, ETAPA_BYTES, HTTP_SEGUNDOS]
+
+
+def publicar(evento: Evento) -> None:
+    """Registra uma medição nos histogramas e na requisição atual (se houver)."""
+    ETAPA_SEGUNDOS.observar(evento["segundos"], evento["etapa"])
+    if evento.get("linhas") is not None:
+        ETAPA_LINHAS.observar(evento["linhas"], evento["etapa"])
+    if evento.get("bytes") is not None:
+        ETAPA_BYTES.observar(evento["bytes"], evento["etapa"])
+    eventos = _requisicao.get()
+    if eventos is not None:
+        eventos.append(evento)
+
+
+@contextmanager
+def medir(etapa: str, linhas: Optional[int] = None, n_bytes: Optional[int] = None) -> Iterator[Evento]:
+    """
+    Cronometra o bloco como `etapa`. Linhas/bytes conhecidos só no fim podem ser
+    preenchidos no dicionário devolvido: `with medir("carregar") as m: ...; m["linhas"] = len(df)`.
+    """
+    evento: Evento = {"etapa": etapa, "linhas": linhas, "bytes": n_bytes}
+    t0 = time.perf_counter()
+    try:
+        yield evento
+    finally:
+        evento["segundos"] = time.perf_counter() - t0
+        registrar(evento)
+
+
+def registrar(evento: Evento) -> None:
+    """Medição já feita (ex.: devolvida por `executar` de outro processo) no contexto atual."""
+    eventos = _worker.get()
+    if eventos is not None:
+        eventos.append(evento)
+    else:
+        publicar(evento)
+
+
+def executar(fn: Callable[..., Any], args: Tuple[Any, ...], perfil: Optional[str] = None) -> Tuple[Any, List[Evento]]:
+    """Roda fn(*args) no worker coletando as medições; devolve (saída, medições)."""
+    eventos: List[Evento] = []
+    token = _worker.set(eventos)
+    prof = cProfile.Profile() if perfil else None
+    try:
+        if prof is not None:
+            prof.enable()
+        out = fn(*args)
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(perfil)
+        _worker.reset(token)
+    return out, eventos
+
+
+def iniciar_requisicao(pasta_perfil: Optional[str] = None) -> List[Evento]:
+    """Começa a coletar as medições (e, com `pasta_perfil`, o cProfile dos jobs) da requisição atual."""
+    eventos: List[Evento] = []
+    _requisicao.set(eventos)
+    if pasta_perfil:
+        os.makedirs(pasta_perfil, exist_ok=True)
+    _perfil.set(pasta_perfil)
+    return eventos
+
+
+def arquivo_perfil() -> Optional[str]:
+    """Arquivo para o cProfile de um job da requisição atual (None se ela não pediu perfil)."""
+    pasta = _perfil.get()
+    return os.path.join(pasta, f"{uuid.uuid4().hex}.prof") if pasta else None
+
+
+def juntar_perfis(pasta: str, linhas: int = 60) -> Optional[str]:
+    """
+    Junta os cProfile dos jobs gravados em `pasta` em <pasta>.prof (pstats, para
+    snakeviz etc.) e <pasta>.txt (top por tempo acumulado); apaga a pasta.
+    Devolve o caminho do .txt ou None se nenhum job rodou.
+    """
+    arquivos = sorted(os.path.join(pasta, n) for n in os.listdir(pasta)) if os.path.isdir(pasta) else []
+    try:
+        if not arquivos:
+            return None
+        texto = io.StringIO()
+        stats = pstats.Stats(*arquivos, stream=texto)
+        stats.dump_stats(pasta + ".prof")
+        stats.sort_stats("cumulative").print_stats(linhas)
+        with open(pasta + ".txt", "w") as f:
+            f.write(texto.getvalue())
+        return pasta + ".txt"
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def server_timing(eventos: List[Evento], total: float) -> str:
+    """Header Server-Timing: duração somada por etapa (ms), na ordem em que apareceram."""
+    somas: Dict[str, float] = {}
+    for e in eventos:
+        somas[e["etapa"]] = somas.get(e["etapa"], 0.0) + e["segundos"]
+    partes = [f"{nome};dur={s * 1000:.1f}" for nome, s in somas.items()]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+def exportar() -> str:
+    """Todos os histogramas no formato texto do Prometheus."""
+    return "\n".join(linha for h in HISTOGRAMAS for linha in h.exportar()) + "\n"
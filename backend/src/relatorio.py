@@ -0,0 +1,399 @@
+"""
+Escrita dos relatórios XLSX em uma única passada.
+
+Larguras de coluna são calculadas direto do DataFrame (comprimento dos textos,
+vetorizado) e o alinhamento centralizado vai no formato da coluna, então não é
+preciso reabrir o arquivo com load_workbook para estilizar célula por célula.
+Usa xlsxwriter em modo constant_memory; sem ele cai para o openpyxl write_only.
+
+Para scripts e cargas de BI há também CSV, NDJSON e Parquet (escrever_blocos),
+gravados bloco a bloco; CSV e NDJSON podem sair comprimidos (gzip ou zstd).
+"""
+from io import BytesIO
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional, Union
+import itertools
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from metricas import medir
+
+try:
+    import xlsxwriter  # type: ignore
+except Exception:
+    xlsxwriter = None  # fallback: openpyxl write_only
+
+try:
+    import zstandard  # type: ignore
+except Exception:
+    zstandard = None  # sem zstd: só gzip
+
+
+def largura_padrao(max_len: int) -> int:
+    """Regra usada pela API: 1.2 x maior texto, entre 12 e 60."""
+    return min(max(12, int(max_len * 1.2)), 60)
+
+
+def largura_justa(max_len: int) -> int:
+    """Regra usada pelo CLI (main.py): maior texto + 2."""
+    return max_len + 2
+
+
+def _max_len_colunas(df: pd.DataFrame) -> List[int]:
+    """Maior comprimento de texto por coluna (inclui o cabeçalho), sem iterar célula a célula."""
+    out = []
+    for i, c in enumerate(df.columns):
+        s = df.iloc[:, i]
+        n = s.astype(object).where(s.notna(), "").astype(str).str.len().max() if len(s) else 0
+        out.append(max(len(str(c)), 0 if pd.isna(n) else int(n)))
+    return out
+
+
+LINHAS_CONVERSAO = 10_000  # linhas convertidas para objetos Python por vez na escrita do XLSX
+
+
+def _linhas(df: pd.DataFrame) -> Iterator[tuple]:
+    """
+    Linhas como tuplas de valores Python (NaN/NA -> None = célula vazia), convertidas
+    LINHAS_CONVERSAO por vez: a cópia em object fica do tamanho de um bloco, não do frame.
+    """
+    for i in range(0, len(df), LINHAS_CONVERSAO):
+        obj = df.iloc[i:i + LINHAS_CONVERSAO].astype(object)
+        yield from obj.where(obj.notna(), None).itertuples(index=False, name=None)
+
+
+def _tamanho_arquivo(destino) -> Optional[int]:
+    try:
+        return os.path.getsize(destino)
+    except (OSError, TypeError):
+        return None
+
+
+_PROIBIDOS_ABA = re.compile(r"[\[\]:*?/\\]")
+
+
+def nomes_abas(nomes: Iterable[str]) -> List[str]:
+    """Nomes válidos de aba do Excel: sem []:*?/\\, até 31 caracteres e únicos (sem caixa)."""
+    out: List[str] = []
+    usados = set()
+    for nome in nomes:
+        base = _PROIBIDOS_ABA.sub("_", str(nome)).strip("' ") or "Planilha"
+        candidato, n = base[:31], 2
+        while candidato.lower() in usados:
+            sufixo = f" ({n})"
+            candidato, n = base[:31 - len(sufixo)] + sufixo, n + 1
+        usados.add(candidato.lower())
+        out.append(candidato)
+    return out
+
+
+def _escrever_xlsxwriter(abas, destino, centralizar):
+    wb = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "vcenter", "text_wrap": True})
+    col_fmt = wb.add_format({"align": "center", "valign": "vcenter", "text_wrap": True}) if centralizar else None
+
+    # constant_memory: cada aba é escrita inteira antes de abrir a próxima
+    for sheet_name, df, larguras in abas:
+        ws = wb.add_worksheet(sheet_name)
+        for i, w in enumerate(larguras):
+            ws.set_column(i, i, w, col_fmt)
+        if centralizar and not larguras:
+            ws.set_column(0, max(len(df.columns) - 1, 0), None, col_fmt)
+
+        ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+        for r, row in enumerate(_linhas(df), start=1):
+            ws.write_row(r, 0, row)
+    wb.close()
+
+
+def _cabecalho_openpyxl(ws, colunas, center):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Border, Font, Side
+
+    fina = Side(style="thin")
+    header = []
+    for c in colunas:
+        cell = WriteOnlyCell(ws, value=str(c))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=fina, right=fina, top=fina, bottom=fina)
+        cell.alignment = center
+        header.append(cell)
+    ws.append(header)
+
+
+def _linhas_openpyxl(ws, df, center):
+    from openpyxl.cell import WriteOnlyCell
+
+    for row in _linhas(df):
+        if center is not None:
+            # write_only não herda estilo da coluna: estilo compartilhado por célula
+            cells = []
+            for v in row:
+                cell = WriteOnlyCell(ws, value=v)
+                cell.alignment = center
+                cells.append(cell)
+            ws.append(cells)
+        else:
+            ws.append(row)
+
+
+def _abrir_openpyxl(centralizar):
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment
+
+    center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    return Workbook(write_only=True), center, (center if centralizar else None)
+
+
+def _larguras_openpyxl(ws, larguras):
+    from openpyxl.utils import get_column_letter
+
+    for i, w in enumerate(larguras, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+
+
+def _escrever_openpyxl(abas, destino, centralizar):
+    wb, center, center_linhas = _abrir_openpyxl(centralizar)
+    for sheet_name, df, larguras in abas:
+        ws = wb.create_sheet(sheet_name)
+        _larguras_openpyxl(ws, larguras)
+        _cabecalho_openpyxl(ws, df.columns, center)
+        _linhas_openpyxl(ws, df, center_linhas)
+    wb.save(destino)
+
+
+def escrever_xlsx(
+    df: pd.DataFrame,
+    destino: Union[str, os.PathLike, BytesIO, None] = None,
+    sheet_name: str = "Relatorio",
+    largura: Optional[Callable[[int], int]] = largura_padrao,
+    centralizar: bool = True,
+) -> Optional[BytesIO]:
+    """
+    Grava df como XLSX em uma passada, com cabeçalho em negrito, colunas
+    centralizadas e largura ajustada ao conteúdo (largura=None não ajusta).
+    Sem `destino` devolve um BytesIO posicionado no início.
+    """
+    return escrever_xlsx_abas({sheet_name: df}, destino, largura, centralizar)
+
+
+def escrever_xlsx_abas(
+    abas: Mapping[str, pd.DataFrame],
+    destino: Union[str, os.PathLike, BytesIO, None] = None,
+    largura: Optional[Callable[[int], int]] = largura_padrao,
+    centralizar: bool = True,
+) -> Optional[BytesIO]:
+    """Como escrever_xlsx, com uma aba por item de `abas` (nomes ajustados por nomes_abas)."""
+    buf = BytesIO() if destino is None else destino
+    with medir("xlsx", linhas=sum(len(df) for df in abas.values())) as m:
+        lista = [
+            (nome, df, [largura(n) for n in _max_len_colunas(df)] if largura else [])
+            for nome, df in zip(nomes_abas(abas), abas.values())
+        ]
+        if xlsxwriter is not None:
+            _escrever_xlsxwriter(lista, buf, centralizar)
+        else:
+            _escrever_openpyxl(lista, buf, centralizar)
+        m["bytes"] = buf.getbuffer().nbytes if isinstance(buf, BytesIO) else _tamanho_arquivo(buf)
+    if destino is None:
+        buf.seek(0)
+        return buf
+    return None
+
+
+def escrever_xlsx_blocos(
+    blocos: Iterable[pd.DataFrame],
+    destino: Union[str, os.PathLike, BytesIO, None] = None,
+    sheet_name: str = "Relatorio",
+    largura: Optional[Callable[[int], int]] = largura_padrao,
+    centralizar: bool = True,
+) -> Optional[BytesIO]:
+    """
+    Como escrever_xlsx, para um relatório que chega em DataFrames sucessivos (ex.:
+    externo.comparar_externo): cada bloco é gravado e descartado, então a memória
+    não depende do tamanho total. As colunas vêm do 1º bloco. Com xlsxwriter a
+    largura considera todos os blocos; no openpyxl (write_only grava a largura
+    antes das linhas) só o 1º.
+    """
+    buf = BytesIO() if destino is None else destino
+    it = iter(blocos)
+    primeiro = next(it, None)
+    if primeiro is None:
+        primeiro = pd.DataFrame()
+    colunas = [str(c) for c in primeiro.columns]
+    nome = nomes_abas([sheet_name])[0]
+    blocos = itertools.chain([primeiro], it)
+
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(buf, {"constant_memory": True})
+        header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "vcenter", "text_wrap": True})
+        col_fmt = wb.add_format({"align": "center", "valign": "vcenter", "text_wrap": True}) if centralizar else None
+        ws = wb.add_worksheet(nome)
+        ws.write_row(0, 0, colunas, header_fmt)
+        maiores = [len(c) for c in colunas]
+        r = 1
+        for df in blocos:
+            with medir("xlsx", linhas=len(df)):
+                if largura:
+                    maiores = [max(a, b) for a, b in zip(maiores, _max_len_colunas(df))]
+                for row in _linhas(df):
+                    ws.write_row(r, 0, row)
+                    r += 1
+        # o xlsxwriter só monta as colunas no close(): a largura pode vir depois das linhas
+        if largura:
+            for i, n in enumerate(maiores):
+                ws.set_column(i, i, largura(n), col_fmt)
+        elif centralizar:
+            ws.set_column(0, max(len(colunas) - 1, 0), None, col_fmt)
+        with medir("xlsx") as m:
+            wb.close()
+            m["bytes"] = buf.getbuffer().nbytes if isinstance(buf, BytesIO) else _tamanho_arquivo(buf)
+    else:
+        wb, center, center_linhas = _abrir_openpyxl(centralizar)
+        ws = wb.create_sheet(nome)
+        _larguras_openpyxl(ws, [largura(n) for n in _max_len_colunas(primeiro)] if largura else [])
+        _cabecalho_openpyxl(ws, colunas, center)
+        for df in blocos:
+            with medir("xlsx", linhas=len(df)):
+                _linhas_openpyxl(ws, df, center_linhas)
+        with medir("xlsx") as m:
+            wb.save(buf)
+            m["bytes"] = buf.getbuffer().nbytes if isinstance(buf, BytesIO) else _tamanho_arquivo(buf)
+    if destino is None:
+        buf.seek(0)
+        return buf
+    return None
+
+
+# ----------------------------
+# Outros formatos (CSV, NDJSON, Parquet)
+# ----------------------------
+
+FORMATOS = ("xlsx", "csv", "ndjson", "parquet")
+MIDIA = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+# formatos de texto; xlsx (zip) e parquet (páginas comprimidas) já saem comprimidos
+COMPRIMIVEIS = ("csv", "ndjson")
+COMPRESSOES = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+LINHAS_BLOCO = 50_000  # linhas serializadas por vez em CSV/NDJSON
+
+
+class _SemCompressao:
+    def compress(self, dados: bytes) -> bytes:
+        return dados
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _compressor(compressao: Optional[str]):
+    if not compressao:
+        return _SemCompressao()
+    if compressao == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+    if compressao == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f"compressão indisponível: {compressao} (use {', '.join(COMPRESSOES)})")
+
+
+def _sem_vazio(df: pd.DataFrame) -> pd.DataFrame:
+    """diferenca mistura int/float/'' (formato do XLSX); em NDJSON/Parquet vira número ou nulo."""
+    if "diferenca" in df.columns and df["diferenca"].dtype == object:
+        df = df.assign(diferenca=pd.to_numeric(df["diferenca"].replace("", np.nan), errors="coerce").astype("Float64"))
+    return df
+
+
+def _texto_blocos(blocos: Iterable[pd.DataFrame], formato: str) -> Iterator[str]:
+    """CSV (cabeçalho no 1º bloco) ou NDJSON, LINHAS_BLOCO linhas por vez."""
+    cabecalho = formato == "csv"
+    for df in blocos:
+        if formato == "ndjson":
+            df = _sem_vazio(df)
+        if cabecalho and not len(df):
+            yield df.to_csv(index=False, lineterminator="\n")
+            cabecalho = False
+        for i in range(0, len(df), LINHAS_BLOCO):
+            parte = df.iloc[i:i + LINHAS_BLOCO]
+            if formato == "csv":
+                yield parte.to_csv(index=False, header=cabecalho, lineterminator="\n")
+                cabecalho = False
+            else:
+                yield parte.to_json(orient="records", lines=True, force_ascii=False, date_format="iso") + "\n"
+
+
+def _escrever_parquet(blocos: Iterable[pd.DataFrame], destino) -> None:
+    """Um row group por bloco; o esquema (categorias viram texto) sai do 1º bloco."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for df in blocos:
+            tabela = pa.Table.from_pandas(_sem_vazio(df), preserve_index=False)
+            if writer is None:
+                esquema = pa.schema([
+                    f.with_type(f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in tabela.schema
+                ]).remove_metadata()
+                writer = pq.ParquetWriter(destino, esquema)
+            writer.write_table(tabela.cast(esquema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def escrever_blocos(
+    blocos: Iterable[pd.DataFrame],
+    formato: str = "xlsx",
+    destino: Union[str, os.PathLike, BytesIO, None] = None,
+    compressao: Optional[str] = None,
+    sheet_name: str = "Relatorio",
+) -> Optional[BytesIO]:
+    """
+    Grava o relatório que chega em DataFrames sucessivos no `formato` (ver FORMATOS):
+    xlsx como escrever_xlsx_blocos; csv/ndjson serializados LINHAS_BLOCO linhas por vez
+    direto no compressor (`compressao`: gzip, zstd ou None; só para COMPRIMIVEIS);
+    parquet com um row group por bloco. Sem `destino` devolve um BytesIO no início.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    if compressao and formato not in COMPRIMIVEIS:
+        raise ValueError(f"{formato} não aceita compressão")
+    if formato == "xlsx":
+        return escrever_xlsx_blocos(blocos, destino, sheet_name)
+
+    buf = BytesIO() if destino is None else destino
+    with medir(formato) as m:
+        linhas = 0
+
+        def contados():
+            nonlocal linhas
+            for df in blocos:
+                linhas += len(df)
+                yield df
+
+        if formato == "parquet":
+            _escrever_parquet(contados(), buf)
+        else:
+            comp = _compressor(compressao)
+            f = buf if isinstance(buf, BytesIO) else open(buf, "wb")
+            try:
+                for texto in _texto_blocos(contados(), formato):
+                    f.write(comp.compress(texto.encode("utf-8")))
+                f.write(comp.flush())
+            finally:
+                if f is not buf:
+                    f.close()
+        m["linhas"] = linhas
+        m["bytes"] = buf.getbuffer().nbytes if isinstance(buf, BytesIO) else _tamanho_arquivo(buf)
+    if destino is None:
+        buf.seek(0)
+        return buf
+    return None
@@ -0,0 +1,251 @@
+"""
+Resultados de comparação guardados por execução (Parquet em DATA_DIR/resultados),
+para navegar no navegador sem baixar o XLSX nem rodar comparar() de novo.
+
+Cada resultado carregado fica em memória (LRU pequeno) com índices invertidos
+(valor -> posições das linhas) em Status, gaveta, rua e cod, montados na primeira
+consulta que usa a coluna. Um filtro como "divergências da rua G" cruza as
+posições dos índices e só materializa as linhas da página pedida.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from gaveta import chaves_gaveta
+from metricas import medir
+
+logger = logging.getLogger("uvicorn.error")
+
+POR_PAGINA_MAX = 1000
+
+
+class _Indice:
+    """Índice invertido de uma coluna: valor -> posições (crescentes) das linhas."""
+
+    def __init__(self, valores: pd.Series):
+        codigos, unicos = pd.factorize(valores.astype(object).where(valores.notna(), ""))
+        self.valores = pd.Index(unicos)
+        self._ordem = np.argsort(codigos, kind="stable")
+        self._inicio = np.searchsorted(codigos[self._ordem], np.arange(len(unicos) + 1))
+
+    def posicoes(self, valores: Sequence[Any]) -> np.ndarray:
+        idx = self.valores.get_indexer(list(valores))
+        partes = [self._ordem[self._inicio[i]:self._inicio[i + 1]] for i in idx if i >= 0]
+        if not partes:
+            return np.empty(0, dtype=np.intp)
+        return partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+    def contagem(self) -> Dict[str, int]:
+        return {str(v): int(n) for v, n in zip(self.valores, np.diff(self._inicio))}
+
+
+class _Resultado:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._indices: Dict[str, _Indice] = {}
+        self._lock = threading.Lock()
+
+    def indice(self, nome: str) -> _Indice:
+        with self._lock:
+            if nome not in self._indices:
+                if nome == "rua":
+                    col = chaves_gaveta(self.df["gaveta"])["letra"]
+                else:
+                    col = self.df[nome]
+                self._indices[nome] = _Indice(col)
+            return self._indices[nome]
+
+
+def _contem(col: pd.Series, pos: Optional[np.ndarray], texto: str) -> np.ndarray:
+    """Máscara (sobre `pos`, ou a coluna toda) das linhas cujo valor contém `texto`, sem caixa."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # busca só nas categorias e espalha pelos códigos
+        achou = np.asarray(col.cat.categories.astype(str).str.lower().str.contains(texto, regex=False), dtype=bool)
+        codigos = col.cat.codes.to_numpy()
+        if pos is not None:
+            codigos = codigos[pos]
+        return (codigos >= 0) & achou[np.maximum(codigos, 0)] if len(achou) else np.zeros(len(codigos), bool)
+    valores = col if pos is None else col.iloc[pos]
+    return valores.astype(str).str.lower().str.contains(texto, regex=False).to_numpy()
+
+
+def _para_json(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # categoria -> texto só nas linhas da página (astype(object) converteria todas as categorias)
+    df = df.apply(lambda s: s.astype(s.cat.categories.dtype) if isinstance(s.dtype, pd.CategoricalDtype) else s)
+    obj = df.astype(object)
+    return obj.where(obj.notna(), None).to_dict("records")
+
+
+class ResultadoStore:
+    def __init__(self, diretorio: str, ttl: float, max_memoria: int = 8):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.max_memoria = max_memoria
+        os.makedirs(diretorio, exist_ok=True)
+        self._memoria: "OrderedDict[str, _Resultado]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # vai para os workers do executor no modo process, que só gravam: sem o LRU e o lock
+        estado = self.__dict__.copy()
+        del estado["_memoria"], estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado: Dict[str, Any]) -> None:
+        self.__dict__.update(estado)
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _arquivo(self, rid: str) -> str:
+        return os.path.join(self.diretorio, f"{rid}.parquet")
+
+    # ---- gravação ----
+
+    def salvar(self, df_out: pd.DataFrame, rid: Optional[str] = None) -> Optional[str]:
+        """
+        Grava a saída de comparar() e devolve o id do resultado
+        (None se não foi possível gravar, ex.: sem pyarrow).
+        """
+        rid = rid or uuid.uuid4().hex
+        df = df_out.copy()
+        # diferenca mistura int/float/'' (formato do XLSX); aqui vira número com <NA>
+        if "diferenca" in df.columns:
+            df["diferenca"] = pd.to_numeric(df["diferenca"].replace("", np.nan), errors="coerce").astype("Float64")
+        if "_merge" in df.columns:
+            df["_merge"] = df["_merge"].astype(str).astype("category")
+        tmp = self._arquivo(rid) + ".tmp"
+        try:
+            with medir("salvar_resultado", linhas=len(df)) as m:
+                df.to_parquet(tmp, index=False)
+                m["bytes"] = os.path.getsize(tmp)
+            os.replace(tmp, self._arquivo(rid))
+        except Exception as e:  # sem pyarrow/fastparquet ou disco cheio: segue sem resultado navegável
+            logger.warning("Resultados: não foi possível gravar %s (%s)", rid, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        return rid
+
+    # ---- leitura ----
+
+    def _obter(self, rid: str) -> Optional[_Resultado]:
+        with self._lock:
+            res = self._memoria.get(rid)
+            if res is not None:
+                self._memoria.move_to_end(rid)
+                return res
+        path = self._arquivo(rid)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            df = pd.read_parquet(path)
+        except (OSError, ImportError, ValueError):
+            return None
+        res = _Resultado(df)
+        with self._lock:
+            self._memoria[rid] = res
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+        return res
+
+    def existe(self, rid: str) -> bool:
+        """Se o resultado ainda está guardado (não expirou)."""
+        try:
+            return time.time() - os.path.getmtime(self._arquivo(rid)) <= self.ttl
+        except OSError:
+            return False
+
+    def resumo(self, rid: str) -> Optional[Dict[str, Any]]:
+        res = self._obter(rid)
+        if res is None:
+            return None
+        return {
+            "id": rid,
+            "linhas": int(len(res.df)),
+            "colunas": [str(c) for c in res.df.columns],
+            "status": res.indice("Status").contagem(),
+            "ruas": res.indice("rua").contagem(),
+        }
+
+    def consultar(
+        self,
+        rid: str,
+        status: Optional[Sequence[str]] = None,
+        divergencias: bool = False,
+        rua: Optional[str] = None,
+        gaveta: Optional[str] = None,
+        cod: Optional[str] = None,
+        busca: Optional[str] = None,
+        pagina: int = 1,
+        por_pagina: int = 100,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Página `pagina` (1..) das linhas que atendem a todos os filtros.
+        `divergencias` = qualquer Status diferente de 'OK'; `busca` procura em produto e cod.
+        """
+        res = self._obter(rid)
+        if res is None:
+            return None
+        por_pagina = max(1, min(por_pagina, POR_PAGINA_MAX))
+        pagina = max(1, pagina)
+
+        pos: Optional[np.ndarray] = None
+
+        def cruza(novas: np.ndarray) -> np.ndarray:
+            return novas if pos is None else np.intersect1d(pos, novas, assume_unique=True)
+
+        if status:
+            pos = cruza(res.indice("Status").posicoes(status))
+        if divergencias:
+            ind = res.indice("Status")
+            pos = cruza(ind.posicoes([v for v in ind.valores if v != "OK"]))
+        if rua:
+            pos = cruza(res.indice("rua").posicoes([rua.upper()]))
+        if gaveta:
+            pos = cruza(res.indice("gaveta").posicoes([gaveta]))
+        if cod:
+            pos = cruza(res.indice("cod").posicoes([cod]))
+        if busca:
+            texto = busca.strip().lower()
+            mask = np.zeros(len(res.df) if pos is None else len(pos), dtype=bool)
+            for c in ("produto", "cod"):
+                if c in res.df.columns:
+                    mask |= _contem(res.df[c], pos, texto)
+            pos = np.flatnonzero(mask) if pos is None else pos[mask]
+
+        total = len(res.df) if pos is None else len(pos)
+        inicio = (pagina - 1) * por_pagina
+        if pos is None:
+            fatia = res.df.iloc[inicio:inicio + por_pagina]
+        else:
+            fatia = res.df.iloc[pos[inicio:inicio + por_pagina]]
+        return {
+            "id": rid,
+            "total": int(total),
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "paginas": int(-(-total // por_pagina)),
+            "linhas": _para_json(fatia),
+        }
+
+    def expirar(self) -> int:
+        """Apaga do disco os resultados vencidos; devolve quantos saíram."""
+        agora, n = time.time(), 0
+        for nome in os.listdir(self.diretorio):
+            path = os.path.join(self.diretorio, nome)
+            try:
+                if nome.endswith(".parquet") and agora - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    n += 1
+                    with self._lock:
+                        self._memoria.pop(nome[:-len(".parquet")], None)
+            except OSError:
+                pass
+        return n
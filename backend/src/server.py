@@ -1,33 +1,96 @@
 # backend/src/server.py
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
 from io import BytesIO
+import asyncio
 import os
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment
 import re
-from typing import List, Tuple, Optional, Any
+import time
+import tempfile
+import uuid
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 import logging
+import zipfile
 
 # IMPORTA suas funções já existentes do módulo compare.py
-from compare import carregar_planilha, comparar, _extrai_local
+from compare import MODOS, PARTICOES, carregar_planilha, comparar, comparar_many, consolidar, resumir
+from aproximado import sugerir_pares
+from externo import comparar_externo
+from gaveta import extrai_local_vec, ordenar_gavetas
+from relatorio import COMPRESSOES, COMPRIMIVEIS, FORMATOS, MIDIA, escrever_blocos, escrever_xlsx, escrever_xlsx_abas, nomes_abas
+from cache import CachePlanilhas, CacheRelatorios
+from executor import ExecutorPlanilhas, JobTimeout, Saturado
+from jobs import JobStore
+import metricas
+from resultados import ResultadoStore, _para_json
+from sessoes import SessaoRecontagem, SessaoStore
+from uploads import Upload, UploadGrande, receber
+import uploads
 
 # Importa a função gerar_em_branco caso exista em blank.py (opcional)
 try:
-    from blank import gerar_em_branco  # type: ignore
+    from blank import gerar_em_branco, gerar_em_branco_df  # type: ignore
 except Exception:
-    gerar_em_branco = None  # pode não existir; /blank ficará disponível só se presente
+    gerar_em_branco = gerar_em_branco_df = None  # pode não existir; /blank ficará disponível só se presente
 
 logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI(title="InventoryAutomation API")
+# trabalho pesado (leitura/comparação/XLSX) fora do event loop; ver executor.py
+# EXECUTOR_TIPO=thread|process|inline, EXECUTOR_WORKERS, EXECUTOR_FILA, EXECUTOR_TIMEOUT (s)
+executor = ExecutorPlanilhas.do_ambiente()
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    executor.iniciar()
+    yield
+    executor.encerrar()
+
+
+app = FastAPI(title="InventoryAutomation API", lifespan=_lifespan)
 
-# cria DATA_DIR para arquivos temporários (compatível com outras versões)
+# DATA_DIR: cache em disco, jobs, resultados e sessões (uploads não passam mais por arquivos aqui)
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# cache das planilhas já normalizadas, por hash do upload (ver cache.py)
+# CACHE_PLANILHAS_MB: limite de memória; CACHE_PLANILHAS_TTL: segundos;
+# CACHE_PLANILHAS_DISCO=1 grava cópia em Parquet em DATA_DIR/cache (sobrevive a restart),
+# limitada por CACHE_PLANILHAS_DISCO_MB (LRU)
+planilhas_cache = CachePlanilhas(
+    max_bytes=int(float(os.getenv("CACHE_PLANILHAS_MB", "512")) * 2**20),
+    ttl=float(os.getenv("CACHE_PLANILHAS_TTL", "3600")),
+    dir_disco=os.path.join(DATA_DIR, "cache") if os.getenv("CACHE_PLANILHAS_DISCO") == "1" else None,
+    max_bytes_disco=int(float(os.getenv("CACHE_PLANILHAS_DISCO_MB", "2048")) * 2**20),
+)
+
+# relatórios prontos do /compare, por hash dos dois uploads + opções, com ETag (ver cache.py)
+# CACHE_RELATORIOS_MB: limite em disco (DATA_DIR/relatorios), 0 desliga
+relatorios_cache = CacheRelatorios(
+    os.path.join(DATA_DIR, "relatorios"),
+    max_bytes=int(float(os.getenv("CACHE_RELATORIOS_MB", "1024")) * 2**20),
+)
+# entra na chave: mudança no formato do relatório invalida o que já está guardado
+VERSAO_RELATORIO = 1
+
+# jobs assíncronos (/jobs/...): SQLite + resultados em DATA_DIR/jobs; JOBS_TTL em segundos
+jobs_store = JobStore(os.path.join(DATA_DIR, "jobs"), ttl=float(os.getenv("JOBS_TTL", str(24 * 3600))))
+_jobs_ativos: set = set()  # referência às tasks em background (evita coleta pelo GC)
+
+# resultados navegáveis (/resultados/...): Parquet por execução em DATA_DIR/resultados
+resultados_store = ResultadoStore(
+    os.path.join(DATA_DIR, "resultados"), ttl=float(os.getenv("RESULTADOS_TTL", str(24 * 3600)))
+)
+
+# sessões de recontagem (/sessoes/...): WMS + último resultado em memória, log em DATA_DIR/sessoes
+sessoes_store = SessaoStore(
+    os.path.join(DATA_DIR, "sessoes"), ttl=float(os.getenv("SESSOES_TTL", str(12 * 3600)))
+)
+
 # Libera o front (Vite)
 app.add_middleware(
     CORSMiddleware,
@@ -35,55 +98,331 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Resultado-Id", "Server-Timing", "X-Perfil-Id", "ETag", "X-Cache", "Content-Location"],
 )
 
-_rx_loc = re.compile(r"^([A-Za-z]+)?(\d+)?([A-Za-z]+)?$")
+# cProfile de uma requisição: com PERFIL_REQUISICOES=1, ?perfil=1 em qualquer rota grava o
+# perfil dos jobs dela em DATA_DIR/perfis e devolve o id em X-Perfil-Id (ver GET /perfis/{id})
+PERFIL_REQUISICOES = os.getenv("PERFIL_REQUISICOES") == "1"
+PERFIS_DIR = os.path.join(DATA_DIR, "perfis")
+
+# uploads vão em blocos para arquivos temporários (ver uploads.py), não para a memória
+# UPLOAD_MAX_MB: limite por arquivo; UPLOAD_MAX_REQUISICAO_MB: corpo inteiro, recusado
+# pelo Content-Length antes de ler qualquer byte; UPLOAD_DIR: onde ficam durante a requisição
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "200")) * 2**20)
+UPLOAD_MAX_REQUISICAO_BYTES = int(float(os.getenv("UPLOAD_MAX_REQUISICAO_MB", "1024")) * 2**20)
+UPLOADS_DIR = os.getenv("UPLOAD_DIR") or os.path.join(DATA_DIR, "uploads")
+
+# ?externo=1: sort-merge em disco (ver externo.py) para planilhas maiores que a memória do worker
+# EXTERNO_LINHAS_RUN: linhas por run (memória de cada fase); runs e XLSX parcial em DATA_DIR/externo
+EXTERNO_LINHAS_RUN = int(os.getenv("EXTERNO_LINHAS_RUN", "200000"))
+EXTERNO_DIR = os.path.join(DATA_DIR, "externo")
+
+# ?particionar=almoxarifado&particionar=rua: reconcilia as partes em paralelo (ver compare.py)
+# PARTICOES_WORKERS: processos do pool de partições (padrão: um por CPU)
+PARTICOES_WORKERS = int(os.getenv("PARTICOES_WORKERS", "0")) or None
 
 
-def _sort_key_gaveta(s: str) -> Tuple[str, int, str]:
-    s = str(s).strip()
-    m = _rx_loc.match(s) or None
-    if not m:
-        return (s.lower(), 0, "")
-    g1, g2, g3 = m.groups()
-    letra = (g1 or "").lower()
-    numero = int(g2) if g2 and g2.isdigit() else 0
-    sufx = (g3 or "").lower()
-    return (letra, numero, sufx)
+@app.middleware("http")
+async def _medir_requisicao(request: Request, call_next):
+    """
+    Histograma por rota, header Server-Timing com as etapas medidas e, se pedido, o cProfile.
+    Também recusa corpo grande demais logo pelo Content-Length e apaga os uploads da requisição no fim.
+    """
+    tamanho = request.headers.get("content-length", "")
+    if tamanho.isdigit() and int(tamanho) > UPLOAD_MAX_REQUISICAO_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Requisição passa do limite de {UPLOAD_MAX_REQUISICAO_BYTES / 2**20:g} MB"},
+        )
+    pasta = None
+    if PERFIL_REQUISICOES and request.query_params.get("perfil") in ("1", "true"):
+        pasta = os.path.join(PERFIS_DIR, uuid.uuid4().hex)
+    eventos = metricas.iniciar_requisicao(pasta)
+    recebidos = uploads.iniciar_requisicao()
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        uploads.limpar(recebidos)
+    total = time.perf_counter() - t0
+    # rota como declarada (/resultados/{resultado_id}), para não abrir uma série por id
+    rota = getattr(request.scope.get("route"), "path", "desconhecida")
+    metricas.HTTP_SEGUNDOS.observar(total, request.method, rota, str(response.status_code))
+    response.headers["Server-Timing"] = metricas.server_timing(eventos, total)
+    if pasta and await asyncio.to_thread(metricas.juntar_perfis, pasta):
+        response.headers["X-Perfil-Id"] = os.path.basename(pasta)
+    return response
+
+# ----------------------------
+# Jobs (rodam no executor; precisam ser funções de módulo para o modo process)
+# ----------------------------
+
+def _job_carregar(caminho: str) -> pd.DataFrame:
+    return carregar_planilha(caminho)
+
+
+def _abas_relatorio(df_out: pd.DataFrame, abas_almoxarifado: bool,
+                    sugestoes: bool = False) -> Dict[str, pd.DataFrame]:
+    """
+    Aba Relatorio e, se pedido (e particionado por almoxarifado), uma aba por almoxarifado;
+    com `sugestoes`, uma aba Sugestoes com os pares aproximados entre as linhas órfãs.
+    """
+    abas = {"Relatorio": df_out}
+    if abas_almoxarifado and "almoxarifado" in df_out.columns:
+        for almox, parte in df_out.groupby("almoxarifado", sort=False, observed=True):
+            abas[str(almox) or "sem almoxarifado"] = parte.drop(columns="almoxarifado")
+    if sugestoes:
+        abas["Sugestoes"] = sugerir_pares(df_out)
+    return abas
+
+
+def _divergencias(df_out: pd.DataFrame) -> pd.DataFrame:
+    """Só as linhas com Status diferente de OK (?divergencias=true)."""
+    return df_out[df_out["Status"] != "OK"]
+
+
+def _job_compare(resultados: ResultadoStore, df_oficial: pd.DataFrame, df_div: pd.DataFrame,
+                 modo: str = "merge", por_lote: bool = False, particoes: Tuple[str, ...] = (),
+                 abas_almoxarifado: bool = False, sugestoes: bool = False, formato: str = "xlsx",
+                 compressao: Optional[str] = None, divergencias: bool = False) -> Tuple[BytesIO, Optional[str]]:
+    df_out: pd.DataFrame = comparar(df_oficial, df_div, modo=modo, por_lote=por_lote,
+                                    particoes=particoes, workers=PARTICOES_WORKERS)
+    # o resultado navegável guarda todas as linhas; o filtro vale só para o arquivo
+    df_rel = _divergencias(df_out) if divergencias else df_out
+    if formato == "xlsx":
+        buf = escrever_xlsx_abas(_abas_relatorio(df_rel, abas_almoxarifado, sugestoes))
+    else:
+        buf = escrever_blocos([df_rel], formato, compressao=compressao)
+    return buf, resultados.salvar(df_out)
+
+
+def _job_resumo(df_oficial: pd.DataFrame, df_div: pd.DataFrame, modo: str = "merge", por_lote: bool = False,
+                particoes: Tuple[str, ...] = (), top: int = 10) -> Dict[str, Any]:
+    """Só compara e resume (sem XLSX nem resultado guardado), para /compare/summary."""
+    df_out = comparar(df_oficial, df_div, modo=modo, por_lote=por_lote, particoes=particoes, workers=PARTICOES_WORKERS)
+    return resumir(df_out, top)
+
+
+def _job_resultado(resultados: ResultadoStore, df_oficial: pd.DataFrame, df_div: pd.DataFrame,
+                   modo: str = "merge", por_lote: bool = False) -> Optional[str]:
+    """Só compara e guarda o resultado (sem XLSX), para navegação via /resultados."""
+    return resultados.salvar(comparar(df_oficial, df_div, modo=modo, por_lote=por_lote))
+
+
+def _job_compare_arquivo(store: JobStore, resultados: ResultadoStore, job_id: str,
+                         df_oficial: pd.DataFrame, df_div: pd.DataFrame,
+                         modo: str = "merge", por_lote: bool = False, particoes: Tuple[str, ...] = (),
+                         abas_almoxarifado: bool = False, sugestoes: bool = False) -> None:
+    """
+    Versão do /compare para /jobs: registra as etapas no store e grava o XLSX em disco.
+    O resultado também fica navegável em /resultados/{job_id}.
+    """
+    df_out = comparar(df_oficial, df_div, progresso=lambda etapa: store.etapa(job_id, etapa),
+                      modo=modo, por_lote=por_lote, particoes=particoes, workers=PARTICOES_WORKERS)
+    if sugestoes:
+        store.etapa(job_id, "sugerindo")
+    abas = _abas_relatorio(df_out, abas_almoxarifado, sugestoes)
+    store.etapa(job_id, "escrevendo")
+    destino = store.caminho_resultado(job_id)
+    escrever_xlsx_abas(abas, destino + ".tmp")
+    os.replace(destino + ".tmp", destino)
+    resultados.salvar(df_out, job_id)
+    resumo = {
+        "linhas": int(len(df_out)),
+        "status": {str(k): int(v) for k, v in df_out["Status"].value_counts().items()},
+    }
+    store.concluir(job_id, destino, resumo)
+
+
+def _contar_status(blocos, resumo: Dict[str, Any]):
+    """Repassa os blocos do comparar_externo somando linhas e Status em `resumo`."""
+    for df_out in blocos:
+        resumo["linhas"] += len(df_out)
+        for k, v in df_out["Status"].value_counts().items():
+            resumo["status"][str(k)] = resumo["status"].get(str(k), 0) + int(v)
+        yield df_out
+
+
+def _job_compare_externo(caminho_oficial: str, caminho_div: str, modo: str = "merge",
+                         por_lote: bool = False, destino: Optional[str] = None, progresso=None,
+                         formato: str = "xlsx", compressao: Optional[str] = None,
+                         divergencias: bool = False) -> Dict[str, Any]:
+    """
+    /compare com ?externo=1: lê as planilhas do disco em blocos e grava o relatório em `destino`
+    conforme os blocos do resultado ficam prontos (nem entradas nem saída inteiras na memória).
+    """
+    resumo: Dict[str, Any] = {"linhas": 0, "status": {}}
+    blocos = _contar_status(
+        comparar_externo(caminho_oficial, caminho_div, modo=modo, por_lote=por_lote, progresso=progresso,
+                         linhas_run=EXTERNO_LINHAS_RUN, pasta=EXTERNO_DIR),
+        resumo,
+    )
+    if divergencias:
+        blocos = (_divergencias(df_out) for df_out in blocos)
+    escrever_blocos(blocos, formato, destino, compressao, sheet_name="Relatorio")
+    return resumo
+
 
+def _job_compare_externo_arquivo(store: JobStore, job_id: str, caminho_oficial: str, caminho_div: str,
+                                 modo: str = "merge", por_lote: bool = False) -> None:
+    """Versão do /jobs/compare para ?externo=1 (sem resultado navegável: ele nunca fica inteiro em memória)."""
+    destino = store.caminho_resultado(job_id)
+    resumo = _job_compare_externo(caminho_oficial, caminho_div, modo, por_lote, destino + ".tmp",
+                                  progresso=lambda etapa: store.etapa(job_id, etapa))
+    os.replace(destino + ".tmp", destino)
+    store.concluir(job_id, destino, resumo)
 
-def _auto_fit_and_center(xlsx_bytes: BytesIO, sheet_name: Optional[str] = None) -> BytesIO:
-    xlsx_bytes.seek(0)
-    wb = load_workbook(xlsx_bytes)
-    ws = wb[sheet_name] if (sheet_name and sheet_name in wb.sheetnames) else wb.active
 
-    center = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.alignment = center
+def _job_relatorio(df_out: pd.DataFrame) -> BytesIO:
+    return escrever_xlsx(df_out, sheet_name="Relatorio")
 
-    for col in ws.columns:
-        max_len = 0
-        letter = col[0].column_letter
-        for cell in col:
-            val = "" if cell.value is None else str(cell.value)
-            max_len = max(max_len, len(val))
-        ws.column_dimensions[letter].width = min(max(12, int(max_len * 1.2)), 60)
 
-    out = BytesIO()
-    wb.save(out)
-    out.seek(0)
-    return out
+FORMATOS_LOTE = ("xlsx", "zip")
 
 
-def _df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "Relatorio") -> BytesIO:
+def _job_compare_lote(df_oficial: pd.DataFrame, fisicos: Dict[str, pd.DataFrame],
+                      modo: str = "merge", por_lote: bool = False, formato: str = "xlsx") -> BytesIO:
+    """
+    Um WMS x várias contagens (comparar_many). 'xlsx': uma aba Consolidado + uma por equipe;
+    'zip': um relatório por equipe + consolidado.xlsx.
+    """
+    saidas = comparar_many(df_oficial, fisicos, modo=modo, por_lote=por_lote)
+    geral = consolidar(saidas)
+    if formato == "xlsx":
+        return escrever_xlsx_abas({"Consolidado": geral, **saidas})
     buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    # XLSX já é zip: guardar sem recomprimir
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("consolidado.xlsx", escrever_xlsx(geral, sheet_name="Consolidado").getvalue())
+        for equipe, df_out in saidas.items():
+            zf.writestr(f"{equipe}.xlsx", escrever_xlsx(df_out, sheet_name="Relatorio").getvalue())
     buf.seek(0)
     return buf
 
 
+def _gerar_as_cegas(df_wms: pd.DataFrame) -> pd.DataFrame:
+    """Uma linha por gaveta distinta, ordenada, com as demais colunas vazias."""
+    # df_wms pode vir do cache de planilhas (somente leitura): sem gaveta, não a cria nele
+    gaveta = df_wms["gaveta"] if "gaveta" in df_wms.columns else pd.Series([], dtype=object)
+    locais = extrai_local_vec(gaveta)
+    gavetas: List[str] = locais[locais.notna() & (locais != "")].unique().tolist()
+
+    # mesma ordem do relatório de comparação (gaveta.py)
+    gavetas_ordenadas = ordenar_gavetas(gavetas)
+
+    cols = ["gaveta", "cod", "produto", "lote", "quantidade", "observacao"]
+    df_out = pd.DataFrame({"gaveta": gavetas_ordenadas})
+    for c in cols[1:]:
+        df_out[c] = ""
+    return df_out
+
+
+def _job_planilha(df: pd.DataFrame, sheet_name: str, formato: str, compressao: Optional[str]) -> BytesIO:
+    if formato == "xlsx":
+        return escrever_xlsx(df, sheet_name=sheet_name)
+    return escrever_blocos([df], formato, compressao=compressao)
+
+
+def _job_blind(df_wms: pd.DataFrame, formato: str = "xlsx", compressao: Optional[str] = None) -> BytesIO:
+    return _job_planilha(_gerar_as_cegas(df_wms), "Relatorio_As_Cegas", formato, compressao)
+
+
+def _job_blank(df_wms: pd.DataFrame, formato: str = "xlsx", compressao: Optional[str] = None) -> BytesIO:
+    return _job_planilha(gerar_em_branco_df(df_wms), "relatorio", formato, compressao)
+
+
+async def _rodar(fn, *args):
+    """executor.rodar traduzindo fila cheia -> 503 e timeout -> 504."""
+    try:
+        return await executor.rodar(fn, *args)
+    except Saturado:
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado processando outras planilhas, tente novamente",
+            headers={"Retry-After": "5"},
+        )
+    except JobTimeout:
+        raise HTTPException(status_code=504, detail="Tempo limite excedido ao processar a planilha")
+
+
+async def _receber(arquivo: UploadFile) -> Upload:
+    """Upload copiado em blocos para DATA_DIR/uploads (apagado no fim da requisição); 413 acima do limite."""
+    try:
+        return await receber(arquivo, UPLOADS_DIR, UPLOAD_MAX_BYTES)
+    except UploadGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def _carregar_upload(up: Upload) -> pd.DataFrame:
+    """
+    carregar_planilha (no executor, lendo o arquivo recebido) com cache por hash do conteúdo.
+    Busca e gravação no cache também saem do event loop: com CACHE_PLANILHAS_DISCO=1 leem e
+    gravam Parquet, e guardar mede o frame com memory_usage(deep=True).
+    """
+    chave = up.hash
+    df = await asyncio.to_thread(planilhas_cache.buscar, chave)
+    if df is None:
+        df = await _rodar(_job_carregar, up.caminho)
+        await asyncio.to_thread(planilhas_cache.guardar, chave, df)
+    return df
+
+
+def _validar_modo(modo: str) -> None:
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"modo inválido: {modo} (use {', '.join(MODOS)})")
+
+
+def _validar_particoes(particionar: List[str], abas_almoxarifado: bool, externo: bool,
+                       sugestoes: bool = False) -> Tuple[str, ...]:
+    """Partições pedidas; abas por almoxarifado implicam particionar por almoxarifado."""
+    if externo and (particionar or abas_almoxarifado or sugestoes):
+        raise HTTPException(
+            status_code=400, detail="externo não combina com particionar, abas_almoxarifado nem sugestoes"
+        )
+    invalidas = [p for p in particionar if p not in PARTICOES]
+    if invalidas:
+        raise HTTPException(
+            status_code=400, detail=f"partição inválida: {', '.join(invalidas)} (use {', '.join(PARTICOES)})"
+        )
+    if abas_almoxarifado and "almoxarifado" not in particionar:
+        particionar = ["almoxarifado", *particionar]
+    return tuple(particionar)
+
+
+def _saida(request: Request, formato: str) -> Tuple[str, Optional[str]]:
+    """Formato pedido e, para CSV/NDJSON, a compressão aceita pelo cliente (Accept-Encoding; zstd antes de gzip)."""
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    if formato not in COMPRIMIVEIS:
+        return formato, None
+    aceitas = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        nome, _, params = item.partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if params and float(q) == 0:
+                continue
+        except ValueError:
+            pass
+        aceitas.add(nome.strip().lower())
+    return formato, next((c for c in COMPRESSOES if c in aceitas), None)
+
+
+def _pedacos(buf: BytesIO, tamanho: int = 1 << 20) -> Iterator[bytes]:
+    """Corpo em pedaços fixos: iterar o BytesIO direto daria uma linha por vez (CSV/NDJSON sem compressão)."""
+    return iter(lambda: buf.read(tamanho), b"")
+
+
+def _cabecalhos_saida(nome: str, formato: str, compressao: Optional[str]) -> Dict[str, str]:
+    headers = {"Content-Disposition": f'attachment; filename="{nome}.{formato}"'}
+    if formato in COMPRIMIVEIS:
+        headers["Vary"] = "Accept-Encoding"
+    if compressao:
+        headers["Content-Encoding"] = compressao
+    return headers
+
+
 async def _first_uploadfile_from_request(request: Request) -> Optional[UploadFile]:
     """
     Utility: pega o primeiro UploadFile presente no multipart/form-data
@@ -99,43 +438,477 @@ async def _first_uploadfile_from_request(request: Request) -> Optional[UploadFil
     return None
 
 
+_CHAVE_RELATORIO = re.compile(r"[0-9a-f]{40}")
+
+
+def _url_relatorio(chave: str) -> str:
+    return f"/relatorios/{chave}"
+
+
+async def _relatorio_em_cache(request: Request, chave: str) -> Optional[Response]:
+    """
+    Relatório guardado de `chave`: o próprio arquivo, ou, se o If-None-Match bate, 304 no GET
+    e 412 no POST (condição falsa em método inseguro, RFC 9110 13.1.2: 304 só vale para GET/HEAD;
+    o Content-Location aponta para o GET). None se não está guardado. Disco lido fora do event loop.
+    """
+    etag = relatorios_cache.etag(chave)
+    pedidos = [e.strip().removeprefix("W/") for e in request.headers.get("if-none-match", "").split(",")]
+    if etag in pedidos and await asyncio.to_thread(relatorios_cache.revalidar, chave):
+        if request.method in ("GET", "HEAD"):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(status_code=412, headers={"ETag": etag, "Content-Location": _url_relatorio(chave)})
+    achado = await asyncio.to_thread(relatorios_cache.buscar, chave)
+    if achado is None:
+        return None
+    caminho, meta = achado
+    headers = {"ETag": etag, "X-Cache": "hit", "Content-Location": _url_relatorio(chave)}
+    if meta.get("encoding"):
+        headers["Content-Encoding"] = meta["encoding"]
+    if meta["media_type"] in (MIDIA[f] for f in COMPRIMIVEIS):
+        headers["Vary"] = "Accept-Encoding"
+    rid = meta.get("resultado_id")
+    if rid and await asyncio.to_thread(resultados_store.existe, rid):
+        headers["X-Resultado-Id"] = rid
+    return FileResponse(caminho, media_type=meta["media_type"], filename=meta["filename"], headers=headers)
+
+
+async def _compare_externo(up_oficial: Upload, up_div: Upload, modo: str, por_lote: bool, chave: str,
+                           formato: str = "xlsx", compressao: Optional[str] = None,
+                           divergencias: bool = False) -> FileResponse:
+    """
+    Relatório do modo externo gravado em DATA_DIR/externo e movido para o cache de relatórios
+    (ou, se não couber, apagado depois de enviado).
+    """
+    os.makedirs(EXTERNO_DIR, exist_ok=True)
+    fd, destino = tempfile.mkstemp(suffix=f".{formato}", dir=EXTERNO_DIR)
+    os.close(fd)
+    t0 = time.perf_counter()
+    try:
+        await _rodar(_job_compare_externo, up_oficial.caminho, up_div.caminho, modo, por_lote, destino, None,
+                     formato, compressao, divergencias)
+    except BaseException:
+        os.remove(destino)
+        raise
+    filename = f"relatorio_auditoria_comparacao.{formato}"
+    meta = {"media_type": MIDIA[formato], "filename": filename, "encoding": compressao,
+            "segundos": time.perf_counter() - t0}
+    guardado = await asyncio.to_thread(relatorios_cache.guardar, chave, destino, meta)
+    headers = _cabecalhos_saida("relatorio_auditoria_comparacao", formato, compressao)
+    del headers["Content-Disposition"]  # o FileResponse monta a partir do filename
+    headers.update({"ETag": relatorios_cache.etag(chave), "X-Cache": "miss"})
+    if guardado:
+        headers["Content-Location"] = _url_relatorio(chave)
+        return FileResponse(guardado, media_type=MIDIA[formato], filename=filename, headers=headers)
+    return FileResponse(
+        destino,
+        media_type=MIDIA[formato],
+        filename=filename,
+        headers=headers,
+        background=BackgroundTask(os.remove, destino),
+    )
+
+
 @app.post("/compare")
 async def compare_endpoint(
+    request: Request,
     planilha_oficial: UploadFile = File(...),
     planilha_divergente: UploadFile = File(...),
+    modo: str = Query("merge", description="merge (linha a linha) | agregado (soma por chave antes de casar)"),
+    por_lote: bool = Query(False, description="inclui o lote na chave de comparação"),
+    externo: bool = Query(False, description="sort-merge em disco, para planilhas maiores que a memória"),
+    particionar: List[str] = Query([], description="almoxarifado e/ou rua: reconcilia as partes em paralelo"),
+    abas_almoxarifado: bool = Query(False, description="uma aba por almoxarifado além do Relatorio"),
+    sugestoes: bool = Query(False, description="aba Sugestoes: pares aproximados entre as linhas sem par"),
+    formato: str = Query("xlsx", description="xlsx | csv | ndjson | parquet (csv/ndjson comprimidos conforme Accept-Encoding)"),
+    divergencias: bool = Query(False, description="só linhas com Status diferente de OK"),
 ):
+    _validar_modo(modo)
+    particoes = _validar_particoes(particionar, abas_almoxarifado, externo, sugestoes)
+    formato, compressao = _saida(request, formato)
+    if formato != "xlsx" and (abas_almoxarifado or sugestoes):
+        raise HTTPException(status_code=400, detail="abas_almoxarifado e sugestoes só no formato xlsx")
     try:
-        oficial_bytes = BytesIO(await planilha_oficial.read())
-        divergente_bytes = BytesIO(await planilha_divergente.read())
+        up_oficial = await _receber(planilha_oficial)
+        up_div = await _receber(planilha_divergente)
+
+        # mesmas planilhas e opções de um /compare anterior: relatório guardado (ou 412, ver _relatorio_em_cache)
+        chave = relatorios_cache.chave(
+            "compare", VERSAO_RELATORIO, up_oficial.hash, up_div.hash, modo, por_lote, externo,
+            particoes, abas_almoxarifado, sugestoes, formato, compressao, divergencias,
+        )
+        em_cache = await _relatorio_em_cache(request, chave)
+        if em_cache is not None:
+            return em_cache
+
+        if externo:
+            return await _compare_externo(up_oficial, up_div, modo, por_lote, chave, formato, compressao, divergencias)
+
+        t0 = time.perf_counter()
+        # as duas leituras em paralelo
+        df_oficial, df_div = await asyncio.gather(
+            _carregar_upload(up_oficial), _carregar_upload(up_div)
+        )
+
+        buf, resultado_id = await _rodar(_job_compare, resultados_store, df_oficial, df_div, modo, por_lote,
+                                         particoes, abas_almoxarifado, sugestoes, formato, compressao, divergencias)
+
+        meta = {"media_type": MIDIA[formato], "filename": f"relatorio_auditoria_comparacao.{formato}",
+                "encoding": compressao, "resultado_id": resultado_id, "segundos": time.perf_counter() - t0}
+        guardado = await asyncio.to_thread(relatorios_cache.guardar, chave, buf.getbuffer(), meta)
+        headers = _cabecalhos_saida("relatorio_auditoria_comparacao", formato, compressao)
+        headers.update({"ETag": relatorios_cache.etag(chave), "X-Cache": "miss"})
+        if guardado:
+            headers["Content-Location"] = _url_relatorio(chave)
+        if resultado_id:
+            headers["X-Resultado-Id"] = resultado_id  # mesmo resultado em JSON: /resultados/{id}
+        return StreamingResponse(_pedacos(buf), media_type=MIDIA[formato], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /compare")
+        raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+
+
+@app.get("/relatorios/{chave}")
+async def relatorio_guardado(request: Request, chave: str):
+    """
+    Relatório de um /compare já feito, pelo Content-Location (a chave é o ETag sem aspas);
+    If-None-Match igual devolve 304.
+    """
+    em_cache = await _relatorio_em_cache(request, chave) if _CHAVE_RELATORIO.fullmatch(chave) else None
+    if em_cache is None:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado ou já removido do cache")
+    return em_cache
+
+
+@app.post("/compare/summary")
+async def compare_summary(
+    planilha_oficial: UploadFile = File(...),
+    planilha_divergente: UploadFile = File(...),
+    modo: str = Query("merge", description="merge (linha a linha) | agregado (soma por chave antes de casar)"),
+    por_lote: bool = Query(False, description="inclui o lote na chave de comparação"),
+    particionar: List[str] = Query([], description="almoxarifado e/ou rua: reconcilia as partes em paralelo"),
+    top: int = Query(10, ge=1, le=100, description="quantas ruas e produtos no ranking"),
+):
+    """
+    KPIs do /compare em JSON, sem gerar o XLSX: contagem por Status, divergências,
+    diferença absoluta e líquida, ruas com mais divergências e produtos com maior |diferença|.
+    """
+    _validar_modo(modo)
+    particoes = _validar_particoes(particionar, False, False)
+    try:
+        df_oficial, df_div = await asyncio.gather(
+            _carregar_upload(await _receber(planilha_oficial)), _carregar_upload(await _receber(planilha_divergente))
+        )
+        return await _rodar(_job_resumo, df_oficial, df_div, modo, por_lote, particoes, top)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /compare/summary")
+        raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+
 
-        df_oficial = carregar_planilha(oficial_bytes)
-        df_div = carregar_planilha(divergente_bytes)
+@app.post("/compare/lote")
+async def compare_lote_endpoint(
+    planilha_oficial: UploadFile = File(...),
+    planilhas_divergentes: List[UploadFile] = File(...),
+    modo: str = Query("merge", description="merge (linha a linha) | agregado (soma por chave antes de casar)"),
+    por_lote: bool = Query(False, description="inclui o lote na chave de comparação"),
+    formato: str = Query("xlsx", description="xlsx (uma aba por equipe + Consolidado) | zip (um relatório por equipe)"),
+):
+    """
+    Um relatório WMS contra as planilhas de várias equipes de contagem. O WMS é lido e
+    preparado uma vez só; cada equipe é identificada pelo nome do arquivo enviado.
+    """
+    _validar_modo(modo)
+    if formato not in FORMATOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"formato inválido: {formato} (use {', '.join(FORMATOS_LOTE)})")
+    try:
+        # "Consolidado" reservado para a aba geral; nomes repetidos ganham sufixo
+        nomes = [os.path.splitext(os.path.basename(f.filename or ""))[0] or "equipe" for f in planilhas_divergentes]
+        equipes = nomes_abas(["Consolidado"] + nomes)[1:]
 
-        df_out: pd.DataFrame = comparar(df_oficial, df_div)
+        recebidos = [await _receber(f) for f in [planilha_oficial, *planilhas_divergentes]]
+        df_oficial, *dfs = await asyncio.gather(*(_carregar_upload(up) for up in recebidos))
 
-        buf = _df_to_xlsx_bytes(df_out, sheet_name="Relatorio")
-        buf = _auto_fit_and_center(buf, sheet_name="Relatorio")
+        buf = await _rodar(_job_compare_lote, df_oficial, dict(zip(equipes, dfs)), modo, por_lote, formato)
 
-        filename = "relatorio_auditoria_comparacao.xlsx"
+        if formato == "zip":
+            filename, media_type = "relatorios_auditoria_comparacao.zip", "application/zip"
+        else:
+            filename = "relatorio_auditoria_comparacao_lote.xlsx"
+            media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         return StreamingResponse(
             buf,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            media_type=media_type,
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception("Error in /compare")
+        logger.exception("Error in /compare/lote")
+        raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+
+
+async def _executar_job_compare(job_id: str, up_oficial: Upload, up_div: Upload,
+                                modo: str = "merge", por_lote: bool = False, externo: bool = False,
+                                particoes: Tuple[str, ...] = (), abas_almoxarifado: bool = False,
+                                sugestoes: bool = False) -> None:
+    """Roda em background depois da resposta: os uploads vêm retidos e são apagados aqui."""
+    try:
+        jobs_store.etapa(job_id, "lendo")
+        while True:
+            try:
+                if externo:
+                    await _rodar(_job_compare_externo_arquivo, jobs_store, job_id,
+                                 up_oficial.caminho, up_div.caminho, modo, por_lote)
+                    return
+                df_oficial, df_div = await asyncio.gather(
+                    _carregar_upload(up_oficial), _carregar_upload(up_div)
+                )
+                await _rodar(_job_compare_arquivo, jobs_store, resultados_store, job_id,
+                             df_oficial, df_div, modo, por_lote, particoes, abas_almoxarifado, sugestoes)
+                return
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                # em background não há cliente para receber o 503: espera vaga na fila
+                await asyncio.sleep(1)
+    except HTTPException as e:
+        jobs_store.falhar(job_id, str(e.detail))
+    except Exception as e:
+        logger.exception("Error in job %s", job_id)
+        jobs_store.falhar(job_id, f"Erro ao processar: {e}")
+    finally:
+        up_oficial.apagar()
+        up_div.apagar()
+
+
+@app.post("/jobs/compare", status_code=202)
+async def jobs_compare(
+    planilha_oficial: UploadFile = File(...),
+    planilha_divergente: UploadFile = File(...),
+    modo: str = Query("merge"),
+    por_lote: bool = Query(False),
+    externo: bool = Query(False),
+    particionar: List[str] = Query([]),
+    abas_almoxarifado: bool = Query(False),
+    sugestoes: bool = Query(False),
+):
+    """Como /compare, mas devolve na hora um id de job; o resultado sai em /jobs/{id}/result."""
+    _validar_modo(modo)
+    particoes = _validar_particoes(particionar, abas_almoxarifado, externo, sugestoes)
+    jobs_store.expirar()
+    up_oficial = await _receber(planilha_oficial)
+    up_div = await _receber(planilha_divergente)
+    job_id = jobs_store.criar("compare_externo" if externo else "compare",
+                              [planilha_oficial.filename or "", planilha_divergente.filename or ""])
+    # o job continua depois da resposta: os arquivos ficam até ele terminar
+    task = asyncio.create_task(
+        _executar_job_compare(job_id, up_oficial.reter(), up_div.reter(), modo, por_lote, externo,
+                              particoes, abas_almoxarifado, sugestoes)
+    )
+    _jobs_ativos.add(task)
+    task.add_done_callback(_jobs_ativos.discard)
+    return {"id": job_id, "status": "pendente"}
+
+
+def _com_resultado(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job + resultado_id: id em /resultados quando o job concluído deixou resultado navegável
+    (o modo externo não deixa; sem pyarrow ou depois do RESULTADOS_TTL também não), senão None.
+    """
+    guardado = job["status"] == "concluido" and resultados_store.existe(job["id"])
+    return {**job, "resultado_id": job["id"] if guardado else None}
+
+
+def _listar_jobs(limite: int) -> List[Dict[str, Any]]:
+    jobs_store.expirar()
+    return [_com_resultado(job) for job in jobs_store.listar(limite)]
+
+
+def _obter_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = jobs_store.obter(job_id)
+    return _com_resultado(job) if job is not None else None
+
+
+@app.get("/jobs")
+async def jobs_listar(limite: int = 50):
+    """Jobs ainda não expirados, mais recentes primeiro (histórico)."""
+    return await asyncio.to_thread(_listar_jobs, limite)
+
+
+@app.get("/jobs/{job_id}")
+async def jobs_status(job_id: str):
+    job = await asyncio.to_thread(_obter_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def jobs_resultado(job_id: str):
+    job = jobs_store.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    if job["status"] != "concluido":
+        raise HTTPException(status_code=409, detail=f"Job ainda não concluído (status: {job['status']})")
+    arquivo = jobs_store.arquivo(job_id)
+    if arquivo is None:
+        raise HTTPException(status_code=404, detail="Resultado não encontrado")
+    return FileResponse(
+        arquivo,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename="relatorio_auditoria_comparacao.xlsx",
+    )
+
+
+@app.post("/resultados")
+async def resultados_criar(
+    planilha_oficial: UploadFile = File(...),
+    planilha_divergente: UploadFile = File(...),
+    modo: str = Query("merge"),
+    por_lote: bool = Query(False),
+):
+    """Como /compare, mas devolve o resumo do resultado guardado (JSON) em vez do XLSX."""
+    _validar_modo(modo)
+    resultados_store.expirar()
+    try:
+        df_oficial, df_div = await asyncio.gather(
+            _carregar_upload(await _receber(planilha_oficial)), _carregar_upload(await _receber(planilha_divergente))
+        )
+        resultado_id = await _rodar(_job_resultado, resultados_store, df_oficial, df_div, modo, por_lote)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /resultados")
         raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+    if resultado_id is None:
+        raise HTTPException(status_code=503, detail="Não foi possível guardar o resultado (requer pyarrow)")
+    return await asyncio.to_thread(resultados_store.resumo, resultado_id)
+
+
+# consultas rodam em thread (não no executor): o índice em memória precisa ser o do próprio processo
+
+@app.get("/resultados/{resultado_id}")
+async def resultados_resumo(resultado_id: str):
+    """Total de linhas, contagem por Status e por rua."""
+    resumo = await asyncio.to_thread(resultados_store.resumo, resultado_id)
+    if resumo is None:
+        raise HTTPException(status_code=404, detail="Resultado não encontrado ou expirado")
+    return resumo
+
+
+@app.get("/resultados/{resultado_id}/linhas")
+async def resultados_linhas(
+    resultado_id: str,
+    status: Optional[List[str]] = Query(None, description="Status exato (pode repetir)"),
+    divergencias: bool = Query(False, description="só linhas com Status diferente de OK"),
+    rua: Optional[str] = Query(None, description="letra da rua (ex.: G)"),
+    gaveta: Optional[str] = None,
+    cod: Optional[str] = None,
+    busca: Optional[str] = Query(None, description="texto em produto ou cod"),
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(100, ge=1, le=1000),
+):
+    """Página de linhas do resultado, com os filtros combinados (E)."""
+    pagina_json = await asyncio.to_thread(
+        resultados_store.consultar, resultado_id,
+        status, divergencias, rua, gaveta, cod, busca, pagina, por_pagina,
+    )
+    if pagina_json is None:
+        raise HTTPException(status_code=404, detail="Resultado não encontrado ou expirado")
+    return pagina_json
+
+
+# sessões: a comparação inicial vai para o executor; as recontagens rodam em thread
+# porque alteram a sessão guardada em memória neste processo
+
+@app.post("/sessoes")
+async def sessoes_criar(
+    planilha_oficial: UploadFile = File(...),
+    planilha_divergente: UploadFile = File(...),
+    modo: str = Query("merge"),
+    por_lote: bool = Query(False),
+):
+    """Abre uma sessão de recontagem com a comparação completa inicial."""
+    _validar_modo(modo)
+    sessoes_store.expirar()
+    try:
+        df_oficial, df_div = await asyncio.gather(
+            _carregar_upload(await _receber(planilha_oficial)), _carregar_upload(await _receber(planilha_divergente))
+        )
+        df_out = await _rodar(comparar, df_oficial, df_div, None, modo, por_lote)
+        sessao = SessaoRecontagem(df_oficial, df_out, modo, por_lote)
+        sessao_id = await asyncio.to_thread(sessoes_store.criar, sessao, df_div)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /sessoes")
+        raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+    return {"id": sessao_id, **sessao.resumo()}
+
+
+@app.post("/sessoes/{sessao_id}/recontagem")
+async def sessoes_recontagem(sessao_id: str, planilha_divergente: UploadFile = File(...)):
+    """
+    Recebe o físico só das gavetas recontadas (substituem o que havia nelas) e
+    devolve as linhas recalculadas e o novo resumo da sessão.
+    """
+    if await asyncio.to_thread(sessoes_store.obter, sessao_id) is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada")
+    try:
+        parcial = await _carregar_upload(await _receber(planilha_divergente))
+        recontada = await asyncio.to_thread(sessoes_store.recontar, sessao_id, parcial)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /sessoes/%s/recontagem", sessao_id)
+        raise HTTPException(status_code=400, detail=f"Erro ao processar: {e}")
+    if recontada is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada")
+    sessao, novas = recontada
+    return {
+        "id": sessao_id,
+        "gavetas": int(parcial["gaveta"].nunique()),
+        "recalculadas": _para_json(novas),
+        **sessao.resumo(),
+    }
+
+
+@app.get("/sessoes/{sessao_id}")
+async def sessoes_resumo(sessao_id: str):
+    sessao = await asyncio.to_thread(sessoes_store.obter, sessao_id)
+    if sessao is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada")
+    return {"id": sessao_id, **sessao.resumo()}
+
+
+@app.get("/sessoes/{sessao_id}/relatorio")
+async def sessoes_relatorio(sessao_id: str):
+    """XLSX com o resultado atual da sessão (todas as recontagens aplicadas)."""
+    sessao = await asyncio.to_thread(sessoes_store.obter, sessao_id)
+    if sessao is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada")
+    buf = await _rodar(_job_relatorio, sessao.resultado)
+    return StreamingResponse(
+        buf,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": 'attachment; filename="relatorio_auditoria_comparacao.xlsx"'},
+    )
 
 
 @app.post("/blind-template")
 async def blind_template(
     request: Request,
     planilha_oficial: UploadFile = File(None),
+    formato: str = Query("xlsx", description="xlsx | csv | ndjson | parquet"),
 ):
     """
     Recebe uma planilha WMS (aceita campo 'planilha_oficial' ou qualquer arquivo multipart)
     e devolve um XLSX 'às cegas' com apenas a coluna 'gaveta' preenchida.
     """
+    formato, compressao = _saida(request, formato)
     try:
         # Primeiro tenta o UploadFile explicitamente nomeado
         planilha = planilha_oficial if (planilha_oficial and getattr(planilha_oficial, "filename", None)) else None
@@ -150,37 +923,10 @@ async def blind_template(
 
         logger.info("Received file for blind-template: %s", getattr(planilha, "filename"))
 
-        oficial_bytes = BytesIO(await planilha.read())
-        df_wms = carregar_planilha(oficial_bytes)
-
-        if "gaveta" not in df_wms.columns:
-            df_wms["gaveta"] = ""
-
-        gavetas: List[str] = (
-            df_wms["gaveta"]
-            .astype(str)
-            .map(lambda x: _extrai_local(x).strip())
-            .replace("", pd.NA)
-            .dropna()
-            .unique()
-            .tolist()
-        )
-
-        gavetas_ordenadas = sorted(gavetas, key=_sort_key_gaveta)
-
-        cols = ["gaveta", "cod", "produto", "lote", "quantidade", "observacao"]
-        df_out = pd.DataFrame({"gaveta": gavetas_ordenadas})
-        for c in cols[1:]:
-            df_out[c] = ""
-
-        buf = _df_to_xlsx_bytes(df_out, sheet_name="Relatorio_As_Cegas")
-        buf = _auto_fit_and_center(buf, sheet_name="Relatorio_As_Cegas")
-
-        filename = "relatorio_as_cegas.xlsx"
+        df_wms = await _carregar_upload(await _receber(planilha))
+        buf = await _rodar(_job_blind, df_wms, formato, compressao)
         return StreamingResponse(
-            buf,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            _pedacos(buf), media_type=MIDIA[formato], headers=_cabecalhos_saida("relatorio_as_cegas", formato, compressao)
         )
 
     except HTTPException:
@@ -192,31 +938,62 @@ async def blind_template(
 
 
 @app.post("/blank")
-async def blank_endpoint(request: Request):
-    if gerar_em_branco is None:
+async def blank_endpoint(
+    request: Request,
+    formato: str = Query("xlsx", description="xlsx | csv | ndjson | parquet"),
+):
+    if gerar_em_branco_df is None:
         raise HTTPException(status_code=404, detail="Endpoint /blank não disponível (blank.gerar_em_branco ausente)")
+    formato, compressao = _saida(request, formato)
 
     try:
         wms = await _first_uploadfile_from_request(request)
         if not wms or not getattr(wms, "filename", None):
             raise HTTPException(status_code=400, detail="Arquivo inválido")
 
-        wms_path = os.path.join(DATA_DIR, "wms_upload.xlsx")
-        with open(wms_path, "wb") as f:
-            f.write(await wms.read())
-
-        df_blank = gerar_em_branco(wms_path)
-
-        buf = _df_to_xlsx_bytes(df_blank, sheet_name="relatorio")
-        buf = _auto_fit_and_center(buf, sheet_name="relatorio")
-
-        filename = "relatorio_em_branco.xlsx"
+        df_wms = await _carregar_upload(await _receber(wms))
+        buf = await _rodar(_job_blank, df_wms, formato, compressao)
         return StreamingResponse(
-            buf,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            _pedacos(buf), media_type=MIDIA[formato], headers=_cabecalhos_saida("relatorio_em_branco", formato, compressao)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error in /blank")
-        raise HTTPException(status_code=400, detail=f"Erro ao processar planilha: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Erro ao processar planilha: {e}")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Contadores do cache de planilhas (hits, misses, evictions, memória ocupada) e, em
+    "relatorios", os do cache de relatórios (inclui 304 e bytes/segundos economizados).
+    """
+    return {**planilhas_cache.stats(), "relatorios": relatorios_cache.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Histogramas por etapa e por rota no formato texto do Prometheus."""
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/perfis/{perfil_id}")
+async def perfis_obter(perfil_id: str, formato: str = Query("txt", description="txt (resumo) | prof (pstats)")):
+    """Perfil gravado por uma requisição com ?perfil=1 (requer PERFIL_REQUISICOES=1)."""
+    if not PERFIL_REQUISICOES or not re.fullmatch(r"[0-9a-f]{32}", perfil_id) or formato not in ("txt", "prof"):
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    arquivo = os.path.join(PERFIS_DIR, f"{perfil_id}.{formato}")
+    if not os.path.exists(arquivo):
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if formato == "prof":
+        return FileResponse(arquivo, media_type="application/octet-stream", filename=f"{perfil_id}.prof")
+    with open(arquivo) as f:
+        return PlainTextResponse(f.read())
+
+
+@app.get("/executor/stats")
+async def executor_stats():
+    """Estado do executor (jobs ativos, rejeitados por fila cheia, timeouts)."""
+    return executor.stats()
@@ -0,0 +1,253 @@
+"""
+Sessões de recontagem: durante a auditoria só algumas gavetas são recontadas,
+então a sessão guarda o lado WMS e o último resultado e, a cada upload parcial
+do físico, recompara apenas as gavetas enviadas.
+
+Regra: a recontagem de uma gaveta substitui tudo o que o físico tinha nela.
+O recálculo roda só sobre as linhas do WMS dessas gavetas e o resultado novo
+é emendado no lugar dos blocos antigos, sem reordenar o relatório inteiro.
+
+Em disco (DATA_DIR/sessoes/<id>/) ficam as planilhas iniciais e um log das
+recontagens em Parquet (requer pyarrow); depois de um restart a sessão é
+remontada a partir deles. As sessões vivas ficam em memória (LRU).
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from compare import _alinhar_categorias, comparar
+from gaveta import ordenar_df, parse_gaveta
+
+logger = logging.getLogger("uvicorn.error")
+
+# acima disso a coluna categórica do resultado vira texto (ver _texto_simples)
+_MAX_CATEGORIAS = 1024
+
+
+def _resumo_status(df: pd.DataFrame) -> Dict[str, int]:
+    return {str(k): int(v) for k, v in df["Status"].value_counts().items()}
+
+
+def _texto_simples(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Categorias -> texto. O resultado da sessão é filtrado e concatenado a cada
+    recontagem, e com categóricas isso custaria O(nº de categorias) por coluna
+    (cod/produto têm quase uma categoria por linha).
+    """
+    return df.apply(
+        lambda s: s.astype(s.cat.categories.dtype)
+        if isinstance(s.dtype, pd.CategoricalDtype) and len(s.cat.categories) > _MAX_CATEGORIAS else s
+    )
+
+
+def _enxugar(df: pd.DataFrame) -> pd.DataFrame:
+    """Subconjunto com só as categorias usadas, para o comparar() da recontagem não carregar as do armazém todo."""
+    return df.apply(lambda s: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s)
+
+
+def _emendar(mantidas: pd.DataFrame, novas: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Insere `novas` (ordenadas como em comparar) em `mantidas` (idem), bloco a bloco
+    de gaveta, com busca binária pela posição. Devolve None se alguma gaveta nova tem
+    a mesma chave de ordenação de uma mantida (ex.: 'A01' x 'A1'): aí quem chama reordena tudo.
+    """
+    mantidas = mantidas.reset_index(drop=True)
+    if novas.empty:
+        return mantidas
+    _alinhar_categorias(mantidas, novas, [c for c in novas.columns if c in mantidas.columns])
+
+    gav = mantidas["gaveta"].array
+    n = len(mantidas)
+
+    def chave(i):
+        return parse_gaveta(gav[i])
+
+    g_novas = novas["gaveta"].astype(object).to_numpy()
+    inicios = np.flatnonzero(np.r_[True, g_novas[1:] != g_novas[:-1]]).tolist() + [len(novas)]
+
+    pedacos, anterior = [], 0
+    for ini, fim in zip(inicios, inicios[1:]):
+        alvo = parse_gaveta(g_novas[ini])
+        pos = bisect_left(range(n), alvo, key=chave)
+        if pos < n and chave(pos) == alvo:
+            logger.info("Recontagem: gaveta com chave de ordenação repetida, reordenando o relatório")
+            return None
+        pedacos += [mantidas.iloc[anterior:pos], novas.iloc[ini:fim]]
+        anterior = pos
+    pedacos.append(mantidas.iloc[anterior:])
+    return pd.concat(pedacos, ignore_index=True)
+
+
+def _substituir_gavetas(fisico: pd.DataFrame, parcial: pd.DataFrame) -> pd.DataFrame:
+    """Físico com as gavetas de `parcial` trocadas pelas linhas recontadas."""
+    gavetas = parcial["gaveta"].astype(str).unique().tolist()
+    fora = fisico[~fisico["gaveta"].isin(gavetas)].copy()
+    parcial = parcial.copy()
+    _alinhar_categorias(fora, parcial, [c for c in parcial.columns if c in fora.columns])
+    return pd.concat([fora, parcial], ignore_index=True)
+
+
+class SessaoRecontagem:
+    def __init__(self, wms: pd.DataFrame, resultado: pd.DataFrame, modo: str = "merge", por_lote: bool = False):
+        """`resultado` = comparar(wms, fisico, modo=modo, por_lote=por_lote) (ver comparando())."""
+        self.wms = wms
+        self.modo = modo
+        self.por_lote = por_lote
+        self.resultado = _texto_simples(resultado)
+        self.recontagens = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def comparando(cls, wms: pd.DataFrame, fisico: pd.DataFrame, modo: str = "merge",
+                   por_lote: bool = False) -> "SessaoRecontagem":
+        return cls(wms, comparar(wms, fisico, modo=modo, por_lote=por_lote), modo, por_lote)
+
+    def recontar(self, parcial: pd.DataFrame,
+                 registrar: Optional[Callable[[int], None]] = None) -> pd.DataFrame:
+        """
+        Aplica a recontagem `parcial` (planilha normalizada com só algumas gavetas)
+        e devolve as linhas recalculadas. O custo depende do tamanho da recontagem;
+        do relatório inteiro só há cópias vetorizadas (filtro e concatenação).
+        `registrar(n)` roda ainda sob o lock, com o número desta recontagem: o log em
+        disco fica na mesma ordem em que as recontagens foram aplicadas.
+        """
+        gavetas = parcial["gaveta"].astype(str).unique().tolist()
+        with self.lock:
+            wms_g = _enxugar(self.wms[self.wms["gaveta"].isin(gavetas)])
+            novas = comparar(wms_g, _enxugar(parcial), modo=self.modo, por_lote=self.por_lote)
+            mantidas = self.resultado[~self.resultado["gaveta"].isin(gavetas)]
+            emendado = _emendar(mantidas, _texto_simples(novas))
+            if emendado is None:
+                chaves = list(self.resultado.columns[:self.resultado.columns.get_loc("quantidade_wms")])
+                juntas = pd.concat([mantidas, _texto_simples(novas)], ignore_index=True)
+                emendado = ordenar_df(juntas, chaves)
+            self.resultado = emendado
+            self.recontagens += 1
+            if registrar is not None:
+                registrar(self.recontagens)
+        return novas
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "linhas": int(len(self.resultado)),
+            "status": _resumo_status(self.resultado),
+            "recontagens": self.recontagens,
+            "modo": self.modo,
+            "por_lote": self.por_lote,
+        }
+
+
+class SessaoStore:
+    def __init__(self, diretorio: str, ttl: float, max_memoria: int = 4):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.max_memoria = max_memoria
+        os.makedirs(diretorio, exist_ok=True)
+        self._memoria: "OrderedDict[str, SessaoRecontagem]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _dir(self, sid: str) -> str:
+        return os.path.join(self.diretorio, sid)
+
+    def _guardar_memoria(self, sid: str, sessao: SessaoRecontagem) -> None:
+        with self._lock:
+            self._memoria[sid] = sessao
+            self._memoria.move_to_end(sid)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def criar(self, sessao: SessaoRecontagem, fisico: pd.DataFrame) -> str:
+        """Registra a sessão (já comparada) e grava as planilhas iniciais para remontá-la."""
+        sid = uuid.uuid4().hex
+        pasta = self._dir(sid)
+        os.makedirs(pasta)
+        try:
+            sessao.wms.to_parquet(os.path.join(pasta, "wms.parquet"), index=False)
+            fisico.to_parquet(os.path.join(pasta, "fisico.parquet"), index=False)
+            with open(os.path.join(pasta, "sessao.json"), "w") as f:
+                json.dump({"modo": sessao.modo, "por_lote": sessao.por_lote}, f)
+        except Exception as e:  # sem pyarrow/disco: a sessão vale só enquanto estiver em memória
+            logger.warning("Sessões: não foi possível gravar %s em disco (%s)", sid, e)
+            shutil.rmtree(pasta, ignore_errors=True)
+        self._guardar_memoria(sid, sessao)
+        return sid
+
+    def obter(self, sid: str) -> Optional[SessaoRecontagem]:
+        with self._lock:
+            sessao = self._memoria.get(sid)
+            if sessao is not None:
+                self._memoria.move_to_end(sid)
+                return sessao
+        sessao = self._remontar(sid)
+        if sessao is not None:
+            self._guardar_memoria(sid, sessao)
+        return sessao
+
+    def recontar(self, sid: str, parcial: pd.DataFrame) -> Optional[Tuple[SessaoRecontagem, pd.DataFrame]]:
+        """
+        Aplica a recontagem e a acrescenta ao log em disco. Devolve a sessão junto com as
+        linhas recalculadas (quem chamou não precisa obtê-la de novo); None se ela não existe.
+        """
+        sessao = self.obter(sid)
+        if sessao is None:
+            return None
+        pasta = self._dir(sid)
+
+        def registrar(n: int) -> None:
+            # sob o lock da sessão: duas recontagens simultâneas não disputam o mesmo número
+            if not os.path.isdir(pasta):
+                return
+            try:
+                parcial.to_parquet(os.path.join(pasta, f"recontagem_{n:05d}.parquet"), index=False)
+                os.utime(pasta)  # renova o TTL
+            except Exception as e:
+                logger.warning("Sessões: recontagem de %s não gravada em disco (%s)", sid, e)
+
+        novas = sessao.recontar(parcial, registrar)
+        return sessao, novas
+
+    def _remontar(self, sid: str) -> Optional[SessaoRecontagem]:
+        """Refaz a sessão a partir do disco: comparação inicial + recontagens na ordem."""
+        pasta = self._dir(sid)
+        try:
+            if time.time() - os.path.getmtime(pasta) > self.ttl:
+                return None
+            with open(os.path.join(pasta, "sessao.json")) as f:
+                params = json.load(f)
+            wms = pd.read_parquet(os.path.join(pasta, "wms.parquet"))
+            fisico = pd.read_parquet(os.path.join(pasta, "fisico.parquet"))
+            logs = sorted(n for n in os.listdir(pasta) if n.startswith("recontagem_"))
+            parciais = [pd.read_parquet(os.path.join(pasta, n)) for n in logs]
+        except (OSError, ImportError, ValueError):
+            return None
+        # recontagem substitui a gaveta inteira: aplica no físico e compara uma vez só
+        for parcial in parciais:
+            fisico = _substituir_gavetas(fisico, parcial)
+        sessao = SessaoRecontagem.comparando(wms, fisico, params["modo"], params["por_lote"])
+        sessao.recontagens = len(parciais)
+        return sessao
+
+    def expirar(self) -> int:
+        """Apaga do disco as sessões vencidas; devolve quantas saíram."""
+        agora, n = time.time(), 0
+        for nome in os.listdir(self.diretorio):
+            pasta = self._dir(nome)
+            try:
+                if agora - os.path.getmtime(pasta) > self.ttl:
+                    shutil.rmtree(pasta)
+                    n += 1
+                    with self._lock:
+                        self._memoria.pop(nome, None)
+            except OSError:
+                pass
+        return n
@@ -0,0 +1,121 @@
+"""
+Uploads recebidos em blocos direto para arquivos temporários por requisição,
+em vez de `await arquivo.read()` (que punha o arquivo inteiro na memória, os
+dois de uma vez no /compare, antes mesmo de montar o DataFrame).
+
+Enquanto copia, `receber` calcula o hash do conteúdo (mesmo valor de
+cache.hash_conteudo, então o cache de planilhas continua valendo). A leitura
+(carregar_planilha) abre o arquivo pelo caminho, o que também serve para os
+workers do modo process (nada de bytes serializados entre processos).
+
+Quando o endpoint roda, o Starlette já recebeu o corpo inteiro e guardou cada
+arquivo num SpooledTemporaryFile (memória até 1 MB, depois um temporário sem
+nome): o limite por arquivo é checado pelo tamanho dele antes de copiar, ou
+seja, depois do recebimento. O que barra o corpo antes de ler qualquer byte é o
+limite da requisição pelo Content-Length (server._medir_requisicao). A cópia
+para um caminho nomeado continua necessária (o temporário do Starlette não tem
+nome), mas roda numa thread, fora do event loop.
+
+Os arquivos da requisição são apagados no fim dela (ver server._medir_requisicao);
+quem precisa deles depois, como os jobs em background, chama `reter()` e apaga
+por conta própria.
+"""
+from contextvars import ContextVar
+from typing import BinaryIO, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from fastapi import UploadFile
+
+from metricas import medir
+
+BLOCO = 1024 * 1024
+
+_recebidos: ContextVar[Optional[List["Upload"]]] = ContextVar("uploads_recebidos", default=None)
+
+
+class UploadGrande(Exception):
+    """Arquivo maior que o limite configurado."""
+
+    def __init__(self, nome: str, limite: int):
+        super().__init__(f"{nome or 'arquivo'} passa do limite de {limite / 2**20:g} MB")
+        self.nome = nome
+        self.limite = limite
+
+
+class Upload:
+    def __init__(self, caminho: str, nome: str, tamanho: int, hash: str):
+        self.caminho = caminho
+        self.nome = nome
+        self.tamanho = tamanho
+        self.hash = hash
+        self.retido = False
+
+    def reter(self) -> "Upload":
+        """Não apaga no fim da requisição (quem reteve chama apagar())."""
+        self.retido = True
+        return self
+
+    def apagar(self) -> None:
+        try:
+            os.remove(self.caminho)
+        except OSError:
+            pass
+
+
+def _copiar(origem: BinaryIO, fd: int, nome: str, limite: int) -> Tuple[int, str]:
+    """Copia `origem` em blocos de 1 MB para `fd` calculando o hash; (tamanho, hash)."""
+    h = hashlib.blake2b(digest_size=20)
+    tamanho = 0
+    origem.seek(0)
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            bloco = origem.read(BLOCO)
+            if not bloco:
+                break
+            tamanho += len(bloco)
+            if tamanho > limite:  # sem tamanho informado pelo Starlette
+                raise UploadGrande(nome, limite)
+            h.update(bloco)
+            f.write(bloco)
+    return tamanho, h.hexdigest()
+
+
+async def receber(arquivo: UploadFile, pasta: str, limite: int) -> Upload:
+    """
+    Copia o upload (numa thread) para um arquivo em `pasta`; levanta UploadGrande
+    se passar de `limite` bytes, sem copiar nada quando o tamanho já é conhecido.
+    """
+    nome = arquivo.filename or ""
+    if arquivo.size is not None and arquivo.size > limite:
+        raise UploadGrande(nome, limite)
+    os.makedirs(pasta, exist_ok=True)
+    # sufixo neutro: o formato é detectado pelos bytes iniciais, como era com o BytesIO
+    fd, caminho = tempfile.mkstemp(suffix=".upload", dir=pasta)
+    try:
+        with medir("upload") as m:
+            tamanho, hash = await asyncio.to_thread(_copiar, arquivo.file, fd, nome, limite)
+            m["bytes"] = tamanho
+    except BaseException:
+        os.remove(caminho)
+        raise
+    up = Upload(caminho, nome, tamanho, hash)
+    recebidos = _recebidos.get()
+    if recebidos is not None:
+        recebidos.append(up)
+    return up
+
+
+def iniciar_requisicao() -> List[Upload]:
+    recebidos: List[Upload] = []
+    _recebidos.set(recebidos)
+    return recebidos
+
+
+def limpar(recebidos: List[Upload]) -> None:
+    """Apaga os uploads da requisição que ninguém reteve."""
+    for up in recebidos:
+        if not up.retido:
+            up.apagar()
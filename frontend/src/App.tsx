@@ -3,6 +3,7 @@ import Sidebar from "./components/Sidebar";
 import ComparePage from "./pages/comparepage";
 import BlankReportPage from "./pages/BlankReportPage";
 import HistoryPage from "./pages/HistoryPage";
+import ResultPage from "./pages/ResultPage";
 
 function App() {
   return (
@@ -13,6 +14,7 @@ function App() {
           <Route path="/" element={<ComparePage />} />
           <Route path="/blank-report" element={<BlankReportPage />} />
           <Route path="/history" element={<HistoryPage />} />
+          <Route path="/resultados/:id" element={<ResultPage />} />
         </Routes>
       </div>
     </div>
@@ -8,21 +8,6 @@ const api = axios.create({
   timeout: 60000,
 });
 
-export async function postCompare(wms: File, fisico: File): Promise<Blob> {
-  const form = new FormData();
-  form.append("planilha_oficial", wms);
-  form.append("planilha_divergente", fisico);
-
-  const res = await api.post("/compare", form, {
-    responseType: "blob",
-    headers: {
-      "Accept":
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    },
-  });
-  return res.data;
-}
-
 export async function postBlindTemplate(file: File): Promise<Blob> {
   const form = new FormData();
   // O backend que a branch frontend usa expõe /blind-template e espera 'planilha_oficial'
@@ -52,6 +37,116 @@ export async function postBlank(wms: File): Promise<Blob> {
   return res.data;
 }
 
+// ---- Jobs assíncronos (/jobs): comparação longa sem segurar a conexão ----
+
+export type JobStatus = "pendente" | "rodando" | "concluido" | "erro";
+
+export interface Job {
+  id: string;
+  tipo: string;
+  status: JobStatus;
+  etapa: string;
+  progresso: number;
+  entradas: string[];
+  resumo: { linhas: number; status: Record<string, number> } | null;
+  erro: string | null;
+  resultado_id: string | null; // navegável em /resultados/{id}; null no modo externo ou já expirado
+  criado: number;
+  atualizado: number;
+  expira: number;
+}
+
+export async function postCompareJob(wms: File, fisico: File): Promise<string> {
+  const form = new FormData();
+  form.append("planilha_oficial", wms);
+  form.append("planilha_divergente", fisico);
+  const res = await api.post("/jobs/compare", form);
+  return res.data.id;
+}
+
+export async function getJob(id: string): Promise<Job> {
+  const res = await api.get(`/jobs/${id}`);
+  return res.data;
+}
+
+// consulta o job até terminar (concluido ou erro), avisando cada atualização;
+// `signal` abortado (ex.: página desmontada) interrompe a espera
+export async function aguardarJob(
+  id: string,
+  onUpdate?: (job: Job) => void,
+  { intervalo = 1000, signal }: { intervalo?: number; signal?: AbortSignal } = {}
+): Promise<Job> {
+  for (;;) {
+    const job = await getJob(id);
+    if (signal?.aborted) throw new Error("cancelado");
+    onUpdate?.(job);
+    if (job.status === "concluido" || job.status === "erro") return job;
+    await new Promise((resolve) => setTimeout(resolve, intervalo));
+  }
+}
+
+export async function listJobs(limite = 50): Promise<Job[]> {
+  const res = await api.get("/jobs", { params: { limite } });
+  return res.data;
+}
+
+export async function getJobResult(id: string): Promise<Blob> {
+  const res = await api.get(`/jobs/${id}/result`, { responseType: "blob" });
+  return res.data;
+}
+
+// ---- Resultados navegáveis (/resultados): páginas em JSON, sem baixar o XLSX ----
+
+export interface ResultadoResumo {
+  id: string;
+  linhas: number;
+  colunas: string[];
+  status: Record<string, number>;
+  ruas: Record<string, number>;
+}
+
+export interface FiltrosResultado {
+  status?: string[];
+  divergencias?: boolean;
+  rua?: string;
+  gaveta?: string;
+  cod?: string;
+  busca?: string;
+  pagina?: number;
+  por_pagina?: number;
+}
+
+export interface PaginaResultado {
+  id: string;
+  total: number;
+  pagina: number;
+  por_pagina: number;
+  paginas: number;
+  linhas: Record<string, string | number | null>[];
+}
+
+export async function postResultado(wms: File, fisico: File): Promise<ResultadoResumo> {
+  const form = new FormData();
+  form.append("planilha_oficial", wms);
+  form.append("planilha_divergente", fisico);
+  const res = await api.post("/resultados", form);
+  return res.data;
+}
+
+export async function getResultado(id: string): Promise<ResultadoResumo> {
+  const res = await api.get(`/resultados/${id}`);
+  return res.data;
+}
+
+export async function getResultadoLinhas(id: string, filtros: FiltrosResultado = {}): Promise<PaginaResultado> {
+  const res = await api.get(`/resultados/${id}/linhas`, {
+    params: filtros,
+    // status repetido (?status=a&status=b), como o FastAPI espera
+    paramsSerializer: { indexes: null },
+  });
+  return res.data;
+}
+
 export function downloadBlob(blob: Blob, filename: string) {
   const url = URL.createObjectURL(blob);
   const a = document.createElement("a");
@@ -1,26 +1,50 @@
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import Card from "../components/Card";
 import DropZone from "../components/DropZone";
-import { postCompare, downloadBlob } from "../lib/api";
+import { Link, useNavigate } from "react-router-dom";
+import {
+  Job,
+  postCompareJob,
+  aguardarJob,
+  getJobResult,
+  postResultado,
+  downloadBlob,
+} from "../lib/api";
 
 export default function ComparePage() {
   const [wmsFile, setWmsFile] = useState<File | null>(null);
   const [fisicoFile, setFisicoFile] = useState<File | null>(null);
   const [loading, setLoading] = useState(false);
+  const [job, setJob] = useState<Job | null>(null);
+  const navigate = useNavigate();
   const canSubmit = Boolean(wmsFile && fisicoFile && !loading);
 
+  // para de consultar o job se o usuário sair da página (ele continua no Histórico)
+  const espera = useRef<AbortController | null>(null);
+  useEffect(() => () => espera.current?.abort(), []);
+
   async function handleGenerate() {
     if (!wmsFile || !fisicoFile) return;
     try {
       setLoading(true);
-      const blob = await postCompare(wmsFile, fisicoFile);
+      setJob(null);
+      // job assíncrono: a conexão não fica presa durante a comparação e o progresso aparece aqui
+      const id = await postCompareJob(wmsFile, fisicoFile);
+      espera.current = new AbortController();
+      const fim = await aguardarJob(id, setJob, { signal: espera.current.signal });
+      if (fim.status === "erro") {
+        alert(`Falha ao gerar o relatório: ${fim.erro}`);
+        return;
+      }
 
       const ok = window.confirm("Relatório gerado com sucesso. Deseja baixar agora?");
       if (!ok) return;
 
+      const blob = await getJobResult(id);
       const ts = new Date().toISOString().slice(0,19).replace(/[:T]/g, "-");
       downloadBlob(blob, `relatorio_auditoria_comparacao-${ts}.xlsx`);
     } catch (e) {
+      if (espera.current?.signal.aborted) return;
       alert("Falha ao gerar/baixar o relatório. Verifique o backend e tente novamente.");
       console.error(e);
     } finally {
@@ -28,6 +52,20 @@ export default function ComparePage() {
     }
   }
 
+  async function handleView() {
+    if (!wmsFile || !fisicoFile) return;
+    try {
+      setLoading(true);
+      const resumo = await postResultado(wmsFile, fisicoFile);
+      navigate(`/resultados/${resumo.id}`);
+    } catch (e) {
+      alert("Falha ao comparar as planilhas. Verifique o backend e tente novamente.");
+      console.error(e);
+    } finally {
+      setLoading(false);
+    }
+  }
+
   return (
     <div className="space-y-6">
       <Card title="Comparar Planilhas (WMS x Físico)">
@@ -49,12 +87,41 @@ export default function ComparePage() {
           >
             {loading ? "Gerando..." : "Gerar Relatório de Comparação"}
           </button>
+          <button
+            disabled={!canSubmit}
+            onClick={handleView}
+            className={[
+              "ml-3 px-4 py-2 rounded-xl",
+              canSubmit
+                ? "bg-zinc-200 text-zinc-900 hover:bg-zinc-300"
+                : "bg-zinc-100 text-zinc-400 cursor-not-allowed",
+            ].join(" ")}
+          >
+            Ver na tela
+          </button>
           {!wmsFile || !fisicoFile ? (
             <span className="ml-3 text-sm text-zinc-500">
               Envie as duas planilhas para habilitar.
             </span>
           ) : null}
         </div>
+
+        {job && (job.status === "pendente" || job.status === "rodando") ? (
+          <div className="mt-4">
+            <div className="h-2 w-full rounded bg-zinc-200">
+              <div
+                className="h-2 rounded bg-zinc-900 transition-all"
+                style={{ width: `${Math.round(job.progresso * 100)}%` }}
+              />
+            </div>
+            <p className="mt-1 text-sm text-zinc-500">
+              {job.etapa} ({Math.round(job.progresso * 100)}%) — acompanhe também no{" "}
+              <Link to="/history" className="underline">
+                Histórico
+              </Link>
+            </p>
+          </div>
+        ) : null}
       </Card>
     </div>
   );
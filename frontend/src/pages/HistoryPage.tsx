@@ -1,9 +1,109 @@
+import { useEffect, useState } from "react";
+import { Link } from "react-router-dom";
 import Card from "../components/Card";
+import { Job, listJobs, getJobResult, downloadBlob } from "../lib/api";
+
+function formatDate(ts: number) {
+  return new Date(ts * 1000).toLocaleString("pt-BR");
+}
+
+function resumoTexto(job: Job) {
+  if (!job.resumo) return "-";
+  const divergentes = Object.entries(job.resumo.status)
+    .filter(([status]) => status !== "OK")
+    .reduce((acc, [, n]) => acc + n, 0);
+  return `${job.resumo.linhas} linhas, ${divergentes} divergências`;
+}
 
 export default function HistoryPage() {
+  const [jobs, setJobs] = useState<Job[]>([]);
+  const [loading, setLoading] = useState(true);
+
+  async function refresh() {
+    try {
+      setJobs(await listJobs());
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setLoading(false);
+    }
+  }
+
+  useEffect(() => {
+    refresh();
+  }, []);
+
+  // atualiza só enquanto houver job em andamento
+  const emAndamento = jobs.some((job) => job.status === "pendente" || job.status === "rodando");
+  useEffect(() => {
+    if (!emAndamento) return;
+    const timer = setInterval(refresh, 3000);
+    return () => clearInterval(timer);
+  }, [emAndamento]);
+
+  async function handleDownload(job: Job) {
+    try {
+      const blob = await getJobResult(job.id);
+      downloadBlob(blob, `relatorio_auditoria_comparacao-${job.id.slice(0, 8)}.xlsx`);
+    } catch (e) {
+      alert("Falha ao baixar o relatório. Ele pode ter expirado.");
+      console.error(e);
+    }
+  }
+
   return (
     <Card title="Histórico">
-      <p>Aqui ficará o histórico de relatórios gerados.</p>
+      {loading ? (
+        <p>Carregando...</p>
+      ) : jobs.length === 0 ? (
+        <p>Nenhum relatório gerado ainda.</p>
+      ) : (
+        <table className="w-full border-collapse border border-gray-300">
+          <thead>
+            <tr className="bg-gray-200">
+              <th className="border px-4 py-2 text-left">Data</th>
+              <th className="border px-4 py-2 text-left">Arquivos</th>
+              <th className="border px-4 py-2 text-left">Status</th>
+              <th className="border px-4 py-2 text-left">Resumo</th>
+              <th className="border px-4 py-2 text-left"></th>
+            </tr>
+          </thead>
+          <tbody>
+            {jobs.map((job) => (
+              <tr key={job.id} className="hover:bg-gray-100">
+                <td className="border px-4 py-2">{formatDate(job.criado)}</td>
+                <td className="border px-4 py-2">{job.entradas.join(" x ")}</td>
+                <td className="border px-4 py-2">
+                  {job.status === "rodando"
+                    ? `${job.etapa} (${Math.round(job.progresso * 100)}%)`
+                    : job.status === "erro"
+                    ? `erro: ${job.erro}`
+                    : job.status}
+                </td>
+                <td className="border px-4 py-2">{resumoTexto(job)}</td>
+                <td className="border px-4 py-2">
+                  {job.status === "concluido" ? (
+                    <button
+                      onClick={() => handleDownload(job)}
+                      className="px-3 py-1 rounded-xl bg-zinc-900 text-white hover:bg-zinc-800"
+                    >
+                      Baixar
+                    </button>
+                  ) : null}
+                  {job.resultado_id ? (
+                    <Link
+                      to={`/resultados/${job.resultado_id}`}
+                      className="ml-2 px-3 py-1 rounded-xl bg-zinc-200 hover:bg-zinc-300"
+                    >
+                      Ver
+                    </Link>
+                  ) : null}
+                </td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      )}
     </Card>
   );
-}
\ No newline at end of file
+}
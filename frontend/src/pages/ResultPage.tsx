@@ -0,0 +1,125 @@
+import { useEffect, useState } from "react";
+import { useParams } from "react-router-dom";
+import Card from "../components/Card";
+import Table from "../components/Table";
+import Searchbar from "../components/Searchbar";
+import {
+  ResultadoResumo,
+  PaginaResultado,
+  getResultado,
+  getResultadoLinhas,
+} from "../lib/api";
+
+const COLUNAS = [
+  { key: "gaveta", label: "Gaveta" },
+  { key: "cod", label: "Código" },
+  { key: "produto", label: "Produto" },
+  { key: "quantidade_wms", label: "Qtd WMS" },
+  { key: "quantidade_fisico", label: "Qtd Físico" },
+  { key: "diferenca", label: "Diferença" },
+  { key: "lote_wms", label: "Lote WMS" },
+  { key: "lote_fisico", label: "Lote Físico" },
+  { key: "Status", label: "Status" },
+];
+
+const POR_PAGINA = 100;
+
+export default function ResultPage() {
+  const { id = "" } = useParams();
+  const [resumo, setResumo] = useState<ResultadoResumo | null>(null);
+  const [pagina, setPagina] = useState<PaginaResultado | null>(null);
+  const [status, setStatus] = useState("");
+  const [rua, setRua] = useState("");
+  const [busca, setBusca] = useState("");
+  const [numPagina, setNumPagina] = useState(1);
+  const [erro, setErro] = useState("");
+
+  useEffect(() => {
+    getResultado(id)
+      .then(setResumo)
+      .catch(() => setErro("Resultado não encontrado ou expirado."));
+  }, [id]);
+
+  // filtros mudaram: volta para a 1ª página
+  useEffect(() => setNumPagina(1), [status, rua, busca]);
+
+  useEffect(() => {
+    // espera o usuário parar de digitar antes de consultar
+    const timer = setTimeout(() => {
+      getResultadoLinhas(id, {
+        status: status && status !== "divergencias" ? [status] : undefined,
+        divergencias: status === "divergencias" || undefined,
+        rua: rua || undefined,
+        busca: busca || undefined,
+        pagina: numPagina,
+        por_pagina: POR_PAGINA,
+      })
+        .then(setPagina)
+        .catch((e) => console.error(e));
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [id, status, rua, busca, numPagina]);
+
+  if (erro) {
+    return <Card title="Resultado">{erro}</Card>;
+  }
+
+  return (
+    <Card title={`Resultado ${id.slice(0, 8)}`}>
+      <div className="grid grid-cols-1 md:grid-cols-3 gap-3 mb-4">
+        <select
+          className="border rounded px-3 py-2"
+          value={status}
+          onChange={(e) => setStatus(e.target.value)}
+        >
+          <option value="">Todos os status</option>
+          <option value="divergencias">Só divergências</option>
+          {resumo &&
+            Object.entries(resumo.status).map(([s, n]) => (
+              <option key={s} value={s}>
+                {s} ({n})
+              </option>
+            ))}
+        </select>
+        <select
+          className="border rounded px-3 py-2"
+          value={rua}
+          onChange={(e) => setRua(e.target.value)}
+        >
+          <option value="">Todas as ruas</option>
+          {resumo &&
+            Object.entries(resumo.ruas).map(([r, n]) => (
+              <option key={r} value={r}>
+                Rua {r} ({n})
+              </option>
+            ))}
+        </select>
+        <Searchbar placeholder="Buscar produto ou código..." onChange={setBusca} />
+      </div>
+
+      <Table data={pagina?.linhas ?? []} columns={COLUNAS} />
+
+      {pagina && (
+        <div className="mt-4 flex items-center gap-3">
+          <button
+            disabled={numPagina <= 1}
+            onClick={() => setNumPagina(numPagina - 1)}
+            className="px-3 py-1 rounded-xl bg-zinc-200 disabled:text-zinc-400"
+          >
+            Anterior
+          </button>
+          <span className="text-sm">
+            Página {pagina.pagina} de {Math.max(pagina.paginas, 1)} ({pagina.total} linhas)
+          </span>
+          <button
+            disabled={numPagina >= pagina.paginas}
+            onClick={() => setNumPagina(numPagina + 1)}
+            className="px-3 py-1 rounded-xl bg-zinc-200 disabled:text-zinc-400"
+          >
+            Próxima
+          </button>
+        </div>
+      )}
+    </Card>
+  );
+}